@@ -2,6 +2,12 @@
 # see: https://github.com/benoitc/gunicorn/blob/master/examples/example_config.py
 
 import os
+import shutil
+import tempfile
+import time
+
+
+_loaded = time.perf_counter()
 
 
 prefix = 'PCC'
@@ -16,8 +22,25 @@ if LOG_LEVEL is None:
 
 TIMEOUT = os.getenv(f'{prefix}_TIMEOUT', 300)
 
+# one pool of solver processes shared by all workers, see pcc.pool; 0 solves in the workers themselves
+SOLVER_PROCESSES = int(os.getenv(f'{prefix}_SOLVER_PROCESSES', os.cpu_count()))
+
+# import the app once in the master, before the workers are forked, so that they share its memory copy-on-write and
+# start without importing it; not with reload, which needs the workers to import the app themselves
+PRELOAD = os.getenv(f'{prefix}_PRELOAD', '0' if _is_dev_mode else '1') != '0'
+
+# solve the example payloads in every new worker before it accepts requests, see pcc.webapp.warm_up
+WARMUP = os.getenv(f'{prefix}_WARMUP', '1') != '0'
+
+# threads per worker; a worker takes this many requests at once and its admission control, see
+# pcc.webapp.admission, sheds the solves it can not finish in time
+THREADS = int(os.getenv(f'{prefix}_THREADS', 8))
+
 bind = '0.0.0.0:8000'
 workers = 4
+worker_class = 'gthread'
+threads = THREADS
+preload_app = PRELOAD
 
 if ENV == 'development':
     reload = True
@@ -34,3 +57,63 @@ errorlog = '-'
 loglevel = LOG_LEVEL
 accesslog = '-'
 access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+
+
+def on_starting(server):
+    if not os.getenv(f'{prefix}_METRICS_DIR'):
+        # the metrics of all workers and solvers, see pcc.metrics; set before anything is forked
+        server.metrics_dir = tempfile.mkdtemp(prefix='pcc-metrics-')
+        os.environ[f'{prefix}_METRICS_DIR'] = server.metrics_dir
+    if not os.getenv(f'{prefix}_BUS_DIR'):
+        # the sockets of the websocket broadcast of this deployment only, see pcc.webapp.broadcast
+        server.bus_dir = tempfile.mkdtemp(prefix='pcc-bus-')
+        os.environ[f'{prefix}_BUS_DIR'] = server.bus_dir
+    if not os.getenv(f'{prefix}_RESULT_CACHE_PATH'):
+        # the /productionplan responses shared by all workers, see pcc.cache.SharedCache
+        server.result_cache = os.path.join(tempfile.gettempdir(), f'pcc-results-{os.getpid()}.db')
+        os.environ[f'{prefix}_RESULT_CACHE_PATH'] = server.result_cache
+    if SOLVER_PROCESSES > 0:
+        from pcc import pool
+        path = os.path.join(tempfile.gettempdir(), f'pcc-solver-{os.getpid()}.sock')
+        server.solver_pool = pool.start_server(path, SOLVER_PROCESSES)
+        # the workers are forked after this, and find the pool through the environment
+        os.environ[f'{prefix}_SOLVER_SOCKET'] = path
+
+
+def when_ready(server):
+    server.log.info('master ready in %.3f s (preload_app=%s)', time.perf_counter() - _loaded, PRELOAD)
+
+
+def post_fork(server, worker):
+    worker.pcc_forked = time.perf_counter()
+
+
+def post_worker_init(worker):
+    # the time to ready of a new worker: importing the app unless it was preloaded, and the warm-up
+    from pcc import metrics
+    from pcc.webapp import warm_up
+    count = warm_up() if WARMUP else 0
+    elapsed = time.perf_counter() - worker.pcc_forked
+    metrics.worker_ready.labels().observe(elapsed)
+    worker.log.info('worker %s ready in %.3f s, %s warm-up payloads', worker.pid, elapsed, count)
+
+
+def child_exit(server, worker):
+    # fold the metrics of the worker into the archive of the processes that are gone, see pcc.metrics
+    from pcc import metrics
+    metrics.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    process = getattr(server, 'solver_pool', None)
+    if process is not None:
+        process.terminate()
+        process.wait()
+    for directory in (getattr(server, 'metrics_dir', None), getattr(server, 'bus_dir', None)):
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+    result_cache = getattr(server, 'result_cache', None)
+    if result_cache is not None:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(result_cache + suffix):
+                os.unlink(result_cache + suffix)
@@ -0,0 +1,178 @@
+"""Speed and memory benchmark of the engines on synthetic fleets.
+
+    python -m pcc.benchmark --sizes 10 100 1000 --loads 0.3 0.7 --wind 0 60 --engines naive bounded
+
+runs every engine on every combination of fleet size, load level (a fraction of the capacity of the fleet) and wind%,
+and writes one json object per run to stdout, or a table with --table. Every run reports the best and median wall
+time of --repeat solves and the peak memory of one solve, measured with tracemalloc in a separate solve.
+
+The fleets come from `generate_fleet`, which is seeded, so the same arguments give the same fleets on every machine.
+Solves are cold: the prepare caches are cleared before every solve, so the times include building the plant table.
+Pass --warm to keep them.
+
+The dense simplex engine and the parametric curve get slow quickly, so every engine has a maximum fleet size in
+`MAX_SIZE`; bigger fleets are skipped unless --no-limit is given.
+"""
+import argparse
+import importlib
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ('naive', 'bnb', 'bounded', 'parametric', 'simplex', 'simplex_numpy')
+
+MAX_SIZE = {
+    'simplex': 5000,
+    'simplex_numpy': 300,
+    'parametric': 1000,
+}
+
+FUELS = {
+    'gas(euro/MWh)': 13.4,
+    'kerosine(euro/MWh)': 50.8,
+    'co2(euro/ton)': 20,
+}
+
+# kind: type, share of the fleet, efficiency range, pmax range, pmin as a fraction of pmax
+PLANT_KINDS = (
+    ('ccgt', 'gasfired', 0.25, (0.50, 0.60), (250, 500), (0.3, 0.5)),
+    ('ocgt', 'gasfired', 0.15, (0.33, 0.40), (50, 250), (0.15, 0.3)),
+    ('tj', 'turbojet', 0.2, (0.28, 0.32), (10, 60), (0.0, 0.0)),
+    ('wind', 'windturbine', 0.4, (1.0, 1.0), (5, 200), (0.0, 0.0)),
+)
+
+
+def generate_fleet(size, seed=0, wind=50):
+    """Return the fuels and powerplants of a fleet of size plants, like a /productionplan payload without load.
+
+    The mix follows `PLANT_KINDS`: big efficient gas plants with a high pmin, smaller peaker gas plants, turbojets and
+    wind parks. Efficiency, pmax and pmin are drawn within the ranges of the kind, pmax rounded to the MW.
+    """
+    rng = random.Random(seed)
+    weights = [kind[2] for kind in PLANT_KINDS]
+    powerplants = []
+    for i, (name, type_, _, efficiency, pmax, pmin) in enumerate(rng.choices(PLANT_KINDS, weights, k=size)):
+        p = float(rng.randint(*pmax))
+        powerplants.append({
+            'name': f'{name}{i}',
+            'type': type_,
+            'efficiency': round(rng.uniform(*efficiency), 2),
+            'pmin': round(p * rng.uniform(*pmin)),
+            'pmax': p,
+        })
+    return {'fuels': dict(FUELS, **{'wind(%)': wind}), 'powerplants': powerplants}
+
+
+def capacity(config):
+    """The maximum load of the fleet of config, with the wind parks derated."""
+    fraction = config['fuels']['wind(%)'] / 100.0
+    return sum(d['pmax'] * fraction if d['type'] == 'windturbine' else d['pmax'] for d in config['powerplants'])
+
+
+def clear_caches():
+    from . import naive, parametric, simplex
+    for cache in (naive.prepare_cache, naive.fleet_cache, simplex.prepare_cache, parametric.curve_cache):
+        cache.clear()
+
+
+def measure(distribute_load, config, repeat=5, warm=False):
+    """Return a dict with the times and peak memory of solving config, and the outcome."""
+    times = []
+    error = None
+    result = None
+    for _ in range(repeat):
+        if not warm:
+            clear_caches()
+        start = time.perf_counter()
+        try:
+            result = distribute_load(config)
+        except Exception as e:
+            error = str(e)
+        times.append(time.perf_counter() - start)
+
+    if not warm:
+        clear_caches()
+    tracemalloc.start()
+    try:
+        distribute_load(config)
+    except Exception:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    record = {
+        'best': min(times),
+        'median': statistics.median(times),
+        'peak_memory': peak,
+        'ok': error is None,
+    }
+    if error is None:
+        record['allocated'] = sum(d['p'] for d in result)
+    else:
+        record['error'] = error
+    return record
+
+
+def run(engines=ENGINES, sizes=(10, 100, 1000), loads=(0.5,), winds=(50,), seed=0, repeat=5, warm=False,
+        limit=True):
+    """Yield a record for every engine, fleet size, load level and wind%."""
+    modules = {engine: importlib.import_module(f'pcc.{engine}') for engine in engines}
+    for size in sizes:
+        for wind in winds:
+            config = generate_fleet(size, seed, wind)
+            for level in loads:
+                config['load'] = round(level * capacity(config), 1)
+                for engine in engines:
+                    record = {'engine': engine, 'size': size, 'load_level': level, 'load': config['load'],
+                              'wind': wind, 'seed': seed}
+                    if limit and size > MAX_SIZE.get(engine, size):
+                        record['skipped'] = f'size > {MAX_SIZE[engine]}'
+                    else:
+                        logger.debug('run: %s', record)
+                        record.update(measure(modules[engine].distribute_load, config, repeat, warm))
+                    yield record
+
+
+def format_table(records):
+    lines = [f'{"engine":<14} {"size":>6} {"load":>5} {"wind":>5} {"best ms":>10} {"median ms":>10} {"peak KiB":>9}  ']
+    for r in records:
+        if 'skipped' in r:
+            timing = f'{"skipped":>43}'
+        else:
+            timing = f'{r["best"] * 1000:>10.3f} {r["median"] * 1000:>10.3f} {r["peak_memory"] / 1024:>9.0f}  '
+            timing += '' if r['ok'] else 'error'
+        lines.append(f'{r["engine"]:<14} {r["size"]:>6} {r["load_level"]:>5} {r["wind"]:>5} {timing}')
+    return '\n'.join(line.rstrip() for line in lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the engines on synthetic fleets.')
+    parser.add_argument('--engines', nargs='+', default=ENGINES, choices=ENGINES)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000])
+    parser.add_argument('--loads', nargs='+', type=float, default=[0.5], help='load as a fraction of the capacity')
+    parser.add_argument('--wind', nargs='+', type=float, default=[50], help='wind%%')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warm', action='store_true', help='keep the prepare caches between solves')
+    parser.add_argument('--no-limit', dest='limit', action='store_false', help='ignore the maximum sizes')
+    parser.add_argument('--table', action='store_true', help='print a table instead of json lines')
+    args = parser.parse_args(argv)
+
+    logging.getLogger('pcc').setLevel(logging.WARNING)
+    records = run(args.engines, args.sizes, args.loads, args.wind, args.seed, args.repeat, args.warm, args.limit)
+    if args.table:
+        print(format_table(records))
+    else:
+        for record in records:
+            print(json.dumps(record), flush=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
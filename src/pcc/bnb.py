@@ -0,0 +1,133 @@
+import logging
+import math
+
+from .naive import prepare_input
+
+
+logger = logging.getLogger(__name__)
+
+
+OFF, ON = 0, 1
+
+
+def distribute_load(config):
+    load, plants, merit_order = prepare_input(config)
+    logger.debug('distribute_load: load=%s\nmerit_order=%s', load, merit_order)
+    load_plan = allocate_load(load, plants, merit_order)
+    allocated = sum(load_plan.values())
+    if not math.isclose(allocated, load):
+        raise Exception('Unable to distribute load: load=%s, allocated=%s' % (load, allocated))
+    return [{'name': name, 'p': load_plan[name]} for name in plants]
+
+
+def distribute_fleet(load, fleet):
+    """`distribute_load` for a `pcc.util.Fleet`, solved on its columns without building a `Plant` per plant."""
+    pmin, pmax, cost = fleet.pmin, fleet.pmax, fleet.cost
+    order = [k for k in fleet.merit_order() if pmax[k] > 0]
+    best_p = _branch_and_bound(load, [pmin[k] for k in order], [pmax[k] for k in order], [cost[k] for k in order])
+    load_plan = [0.0] * len(fleet)
+    if best_p is not None:
+        for k, p in zip(order, best_p):
+            load_plan[k] = p
+    allocated = sum(load_plan)
+    if not math.isclose(allocated, load):
+        raise Exception('Unable to distribute load: load=%s, allocated=%s' % (load, allocated))
+    return [{'name': name, 'p': p} for name, p in zip(fleet.names, load_plan)]
+
+
+def allocate_load(load, plants, merit_order):
+    """Solve the unit-commitment problem exactly with a depth first branch and bound.
+
+    Every plant is either off (p = 0) or on (pmin <= p <= pmax). The LP relaxation of a node, where the undecided
+    plants may produce anything in [0, pmax], is solved by filling the merit order, so it costs O(n). In that solution at
+    most one plant - the marginal one - violates its pmin, and that is the plant we branch on.
+
+    Identical plants (same cost, pmin and pmax) are interchangeable, so when a plant is switched off all identical
+    plants after it in the merit order are switched off as well: any plan that uses the later one can use this one
+    instead at the same cost.
+    """
+    units = [plants[name] for name in merit_order if plants[name].pmax > 0]
+    best_p = _branch_and_bound(load, [float(u.pmin) for u in units], [u.pmax for u in units], [u.cost for u in units])
+    load_plan = {name: 0.0 for name in plants}
+    if best_p is not None:
+        for unit, p in zip(units, best_p):
+            load_plan[unit.name] = p
+    return load_plan
+
+
+def _branch_and_bound(load, pmin, pmax, cost):
+    """The p of the cheapest plan for the plants with these columns, in merit order, or None if there is none."""
+    n = len(cost)
+    group = _identical_groups(pmin, pmax, cost)
+
+    best_cost = math.inf
+    best_p = None
+    nodes = 0
+    stack = [[None] * n]
+    while stack:
+        status = stack.pop()
+        nodes += 1
+        relaxation = _relax(load, pmin, pmax, cost, status)
+        if relaxation is None:
+            continue
+        total, p, fractional = relaxation
+        if total > best_cost or math.isclose(total, best_cost):
+            continue
+        if fractional is None:
+            if total < best_cost:
+                best_cost, best_p = total, p
+            continue
+        on = status[:]
+        on[fractional] = ON
+        off = status[:]
+        for i in range(fractional, n):
+            if off[i] is None and group[i] == group[fractional]:
+                off[i] = OFF
+        # explore the "on" branch first: the relaxation wants this plant to run
+        stack.append(off)
+        stack.append(on)
+
+    logger.debug('allocate_load: explored %s nodes, cost=%s', nodes, best_cost)
+    return best_p
+
+
+def _relax(load, pmin, pmax, cost, status):
+    """Solve the LP relaxation of a node.
+
+    Returns None if the node is infeasible, else (cost, p, fractional), where fractional is the index of the plant
+    that runs below its pmin without being committed, or None if there is no such plant.
+    """
+    p = []
+    upper = []
+    committed = 0.0
+    capacity = 0.0
+    for lo, hi, s in zip(pmin, pmax, status):
+        lo = lo if s == ON else 0.0
+        hi = 0.0 if s == OFF else hi
+        p.append(lo)
+        upper.append(hi)
+        committed += lo
+        capacity += hi
+    if committed > load and not math.isclose(committed, load):
+        return None
+    if capacity < load and not math.isclose(capacity, load):
+        return None
+
+    remaining = load - committed
+    fractional = None
+    total = 0.0
+    for i, c in enumerate(cost):
+        if remaining > 0:
+            quote = min(remaining, upper[i] - p[i])
+            if quote > 0:
+                p[i] += quote
+                remaining -= quote
+                if status[i] is None and p[i] < pmin[i] and fractional is None:
+                    fractional = i
+        total += c * p[i]
+    return total, p, fractional
+
+
+def _identical_groups(pmin, pmax, cost):
+    groups = {}
+    return [groups.setdefault(key, len(groups)) for key in zip(cost, pmin, pmax)]
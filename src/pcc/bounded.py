@@ -0,0 +1,469 @@
+"""Bounded-variable revised simplex.
+
+`pcc.simplex` turns every pmin and pmax into a constraint row of the tableau. Here they are bounds on the variables,
+handled implicitly by the ratio test, so the load balance sum(p_i) = load is the only constraint row: the basis is
+1 x 1 and most iterations are bound flips.
+"""
+import logging
+import math
+
+from . import metrics, trace
+from .naive import prepare_fleet
+from .simplex import prepare_input
+
+
+logger = logging.getLogger(__name__)
+
+
+TOL = 1e-9
+
+AT_LOWER, AT_UPPER, BASIC = 0, 1, 2
+
+
+def distribute_load(config, stats=None):
+    load, fleet, _ = prepare_fleet(config)
+    return distribute_fleet(load, fleet, stats)
+
+
+def distribute_fleet(load, fleet, stats=None):
+    """`distribute_load` for a `pcc.util.Fleet`."""
+    stats = trace.SolveStats() if stats is None else stats
+    logger.debug('distribute_load: load=%s', load)
+    load_plan = allocate_fleet(load, fleet, stats=stats)
+    metrics.simplex_pivots.labels('bounded').observe(stats.pivots)
+    logger.debug('load_plan = %s', load_plan)
+    allocated = sum(load_plan)
+    if not math.isclose(allocated, load):
+        raise Exception('Unable to distribute load: load=%s, allocated=%s' % (load, allocated))
+    return [{'name': name, 'p': p} for name, p in zip(fleet.names, load_plan)]
+
+
+def allocate_load(load, plants, stats=None):
+    """Minimize sum(cost_i * p_i) s.t. sum(p_i) = load and pmin_i <= p_i <= pmax_i.
+
+    Like `pcc.simplex.allocate_load` all plants are committed, i.e. they produce at least their pmin.
+    """
+    plant_list = [p for p in plants.values() if p.pmax > 0]
+    lp = RevisedSimplex(
+        c=[p.cost for p in plant_list],
+        columns=[[(0, 1.0)] for _ in plant_list],
+        b=[load],
+        lower=[p.pmin for p in plant_list],
+        upper=[p.pmax for p in plant_list],
+    )
+    x = lp.solve(stats=stats)
+    load_plan = {name: 0.0 for name in plants}
+    for p, x_i in zip(plant_list, x):
+        load_plan[p.name] = x_i
+    return load_plan
+
+
+def allocate_fleet(load, fleet, stats=None):
+    """`allocate_load` on the columns of a `pcc.util.Fleet`, returns the p of every plant number."""
+    index = [k for k, hi in enumerate(fleet.pmax) if hi > 0]
+    lp = RevisedSimplex(
+        c=[fleet.cost[k] for k in index],
+        columns=[[(0, 1.0)] for _ in index],
+        b=[load],
+        lower=[fleet.pmin[k] for k in index],
+        upper=[fleet.pmax[k] for k in index],
+    )
+    x = lp.solve(stats=stats)
+    load_plan = [0.0] * len(fleet)
+    for k, x_i in zip(index, x):
+        load_plan[k] = x_i
+    return load_plan
+
+
+class Session:
+    """Solve the same fleet for a sequence of loads.
+
+    The session keeps the optimal basis of the last solve. A new load only changes the right hand side, so that basis
+    stays dual feasible and `resolve` continues from it with the dual simplex, instead of rebuilding the problem and
+    running phase 1 again:
+
+        session = Session(*prepare_input(config))
+        session.resolve(new_load)
+    """
+
+    def __init__(self, load, plants, stats=None):
+        self.plants = plants
+        self.plant_list = [p for p in plants.values() if p.pmax > 0]
+        self.lp = RevisedSimplex(
+            c=[p.cost for p in self.plant_list],
+            columns=[[(0, 1.0)] for _ in self.plant_list],
+            b=[load],
+            lower=[p.pmin for p in self.plant_list],
+            upper=[p.pmax for p in self.plant_list],
+        )
+        self.lp.solve(stats=stats)
+        self.load = load
+
+    def resolve(self, load, stats=None):
+        """Return the load plan for another load, in the format of `distribute_load`."""
+        x = self.lp.resolve([load], stats=stats)
+        self.load = load
+        load_plan = {name: 0.0 for name in self.plants}
+        for p, x_i in zip(self.plant_list, x):
+            load_plan[p.name] = x_i
+        allocated = sum(load_plan.values())
+        if not math.isclose(allocated, load):
+            raise Exception('Unable to distribute load: load=%s, allocated=%s' % (load, allocated))
+        return [{'name': name, 'p': p} for name, p in load_plan.items()]
+
+
+class RevisedSimplex:
+    """Minimize c x s.t. A x = b and lower <= x <= upper.
+
+    A is given column wise and sparse: columns[j] is a list of (row, value) tuples. Every variable needs at least one
+    finite bound.
+
+    The basis inverse is kept in product form, as a list of eta vectors, and is rebuilt from scratch every
+    `refactor_interval` basis changes. The vectors of the basis - the columns after `_ftran` - are sparse too, dicts
+    of row: value, so the work of an iteration follows the number of nonzeros instead of the number of rows.
+
+    Phase 1 starts from a basis of artificial variables, one per row; in phase 2 those are fixed at 0. basis is an
+    optional list of (row, j) pairs of structural variables that only appear in their row, like a slack: j starts
+    basic in row instead of the artificial variable, when its value there is within its bounds. A large problem
+    with a slack in most rows then only needs phase 1 for the remaining rows. The nonbasic variables start at their
+    lower bound, or at their upper bound when they are in at_upper, e.g. the cheap ones.
+    """
+
+    refactor_interval = 50
+
+    def __init__(self, c, columns, b, lower, upper, basis=None, at_upper=()):
+        self.n = n = len(c)
+        self.m = m = len(b)
+        self.b = [float(b_i) for b_i in b]
+        self.lower = [float(v) for v in lower] + [0.0] * m
+        self.upper = [float(v) for v in upper] + [math.inf] * m
+        self.cost = [float(c_j) for c_j in c] + [0.0] * m
+        self.columns = list(columns)
+        self.iterations = 0
+
+        self.status = []
+        self.x = []
+        at_upper = set(at_upper)
+        for j in range(n):
+            if self.lower[j] > -math.inf and not (j in at_upper and self.upper[j] < math.inf):
+                self.status.append(AT_LOWER)
+                self.x.append(self.lower[j])
+            elif self.upper[j] < math.inf:
+                self.status.append(AT_UPPER)
+                self.x.append(self.upper[j])
+            else:
+                raise Exception('Free variables are not supported: x_%s' % (j + 1))
+
+        # the artificial variables get the sign of the residual, so that they start out nonnegative
+        residual = self._residual()
+        slacks = self._crash(basis, residual) if basis else {}
+        self.heading = []
+        for i in range(m):
+            self.columns.append([(i, 1.0 if residual[i] >= 0 else -1.0)])
+            self.x.append(0.0)
+            if i in slacks:
+                self.status.append(AT_LOWER)
+                self.heading.append(slacks[i])
+            else:
+                self.status.append(BASIC)
+                self.heading.append(n + i)
+        self._reinvert()
+
+    def _crash(self, basis, residual):
+        """Make the variables of basis that fit basic, return {row: j} of them."""
+        slacks = {}
+        for i, j in basis:
+            (row, v), = self.columns[j]
+            value = self.x[j] + residual[i] / v
+            if row == i and i not in slacks and self.lower[j] <= value <= self.upper[j]:
+                slacks[i] = j
+                self.status[j] = BASIC
+                residual[i] = 0.0
+        return slacks
+
+    def solve(self, stats=None):
+        """Run phase 1 and phase 2, return the values of the (non artificial) variables.
+
+        stats is an optional trace.SolveStats that gets the iteration counters and timings of the solve. Bound flips
+        count as iterations, but not as pivots.
+        """
+        n, m = self.n, self.m
+        phase1_cost = [0.0] * n + [1.0] * m
+        with trace.Timer(stats, phase=1):
+            self._iterate(phase1_cost, tie_cost=self.cost, stats=stats, phase=1)
+        infeasibility = sum(self.x[n:])
+        if infeasibility > TOL * max(1.0, max(abs(b_i) for b_i in self.b)):
+            raise Exception('No initial feasible solution found, problem set is empty')
+        # fix the artificial variables at 0
+        for j in range(n, n + m):
+            self.upper[j] = 0.0
+            if self.status[j] != BASIC:
+                self.x[j] = 0.0
+        with trace.Timer(stats, phase=2):
+            self._iterate(self.cost, stats=stats)
+        return self.x[:n]
+
+    def resolve(self, b, stats=None):
+        """Solve again for another right hand side b, starting from the current basis.
+
+        The basis of an optimal solution is dual feasible whatever b is, so the dual simplex can restore primal
+        feasibility without a phase 1. Dual simplex iterations are counted as phase 2 iterations.
+        """
+        self.b = [float(b_i) for b_i in b]
+        self._update_basic()
+        with trace.Timer(stats, phase=2):
+            self._dual_iterate(stats=stats)
+        return self.x[:self.n]
+
+    @property
+    def objective(self):
+        return sum(c_j * x_j for c_j, x_j in zip(self.cost, self.x))
+
+    def _iterate(self, cost, tie_cost=None, stats=None, phase=2):
+        x, status, heading = self.x, self.status, self.heading
+        lower, upper = self.lower, self.upper
+        candidates = []
+        while True:
+            if not candidates:
+                y = self._btran([cost[j] for j in heading])
+                candidates = self._price(cost, y, tie_cost)
+                if not candidates:
+                    return
+            q = candidates.pop()
+            w = self._ftran(self.columns[q])
+            direction = 1 if status[q] == AT_LOWER else -1
+
+            # ratio test: how far can x_q move before it or a basic variable hits a bound
+            t = upper[q] - lower[q]
+            leave = None
+            to_upper = False
+            for r, w_r in w.items():
+                if abs(w_r) <= TOL:
+                    continue
+                j = heading[r]
+                rate = -direction * w_r
+                if rate < 0:
+                    limit = (x[j] - lower[j]) / -rate
+                else:
+                    limit = (upper[j] - x[j]) / rate
+                limit = max(limit, 0.0)
+                if limit < t or (leave is not None and limit == t and abs(w_r) > abs(w[leave])):
+                    t = limit
+                    leave = r
+                    to_upper = rate > 0
+            if t == math.inf:
+                raise Exception('Problem is unbounded')
+
+            x[q] += direction * t
+            for r, w_r in w.items():
+                x[heading[r]] -= direction * t * w_r
+            self.iterations += 1
+            if stats is not None:
+                stats.count_iteration(phase)
+
+            if leave is None:
+                # bound flip: the basis and so the reduced costs do not change, the next candidate is still valid
+                status[q] = AT_UPPER if direction == 1 else AT_LOWER
+                x[q] = upper[q] if direction == 1 else lower[q]
+                continue
+            j = heading[leave]
+            status[j] = AT_UPPER if to_upper else AT_LOWER
+            x[j] = upper[j] if to_upper else lower[j]
+            status[q] = BASIC
+            heading[leave] = q
+            self._add_eta(leave, w)
+            self.updates += 1
+            candidates = []
+            if stats is not None:
+                stats.pivots += 1
+                stats.degenerate_pivots += t == 0
+            if self.updates > self.refactor_interval:
+                self._reinvert()
+
+    def _dual_iterate(self, stats=None):
+        x, status, heading = self.x, self.status, self.heading
+        lower, upper, cost = self.lower, self.upper, self.cost
+        while True:
+            # leaving variable: the basic variable with the largest bound violation
+            leave = None
+            violation = TOL
+            for r, j in enumerate(heading):
+                v = max(lower[j] - x[j], x[j] - upper[j])
+                if v > violation:
+                    leave = r
+                    violation = v
+            if leave is None:
+                return
+            j_out = heading[leave]
+            to_upper = x[j_out] > upper[j_out]
+
+            # entering variable: the ratio test keeps the reduced costs dual feasible
+            y = self._btran([cost[j] for j in heading])
+            rho = self._btran([1.0 if r == leave else 0.0 for r in range(self.m)])
+            candidates = []
+            for j, column in enumerate(self.columns):
+                if status[j] == BASIC or lower[j] == upper[j]:
+                    continue
+                if len(column) == 1:
+                    (i, v), = column
+                    alpha = rho[i] * v
+                else:
+                    alpha = sum(rho[i] * v for i, v in column)
+                if -TOL <= alpha <= TOL:
+                    continue
+                # moving x_j changes x_out by -direction * alpha per unit, it has to go towards the violated bound
+                if status[j] == AT_LOWER:
+                    if (alpha > 0) != to_upper:
+                        continue
+                elif (alpha < 0) != to_upper:
+                    continue
+                d_j = cost[j] - sum(y[i] * v for i, v in column)
+                candidates.append((abs(d_j / alpha), -abs(alpha), j))
+            candidates.sort()
+
+            # bound flipping: a boxed candidate that cannot remove the violation on its own is flipped to its other
+            # bound and the next ratio is tried, so a single basis change can absorb a large change of b
+            q = None
+            flips = []
+            for _, minus_alpha, j in candidates:
+                span = (upper[j] - lower[j]) * -minus_alpha
+                if span < violation - TOL:
+                    flips.append(j)
+                    violation -= span
+                    continue
+                q = j
+                break
+            if q is None:
+                raise Exception('No feasible solution found, problem set is empty')
+            if flips:
+                for j in flips:
+                    if status[j] == AT_LOWER:
+                        status[j] = AT_UPPER
+                        x[j] = upper[j]
+                    else:
+                        status[j] = AT_LOWER
+                        x[j] = lower[j]
+                self._update_basic()
+                self.iterations += len(flips)
+                if stats is not None:
+                    stats.phase2_iterations += len(flips)
+
+            w = self._ftran(self.columns[q])
+            direction = 1 if status[q] == AT_LOWER else -1
+            bound = upper[j_out] if to_upper else lower[j_out]
+            t = (x[j_out] - bound) / (direction * w[leave])
+            x[q] += direction * t
+            for r, w_r in w.items():
+                x[heading[r]] -= direction * t * w_r
+            x[j_out] = bound
+            status[j_out] = AT_UPPER if to_upper else AT_LOWER
+            status[q] = BASIC
+            heading[leave] = q
+            self._add_eta(leave, w)
+            self.updates += 1
+            if self.updates > self.refactor_interval:
+                self._reinvert()
+            self.iterations += 1
+            if stats is not None:
+                stats.count_iteration(2)
+                stats.pivots += 1
+                stats.degenerate_pivots += t == 0
+
+    def _price(self, cost, y, tie_cost=None):
+        """Dantzig's rule: return the nonbasic variables that can improve the objective, best one last.
+
+        Candidates are ranked on the size of their reduced cost; ties are broken on tie_cost, preferring to increase
+        the cheapest and decrease the most expensive variable.
+        """
+        candidates = []
+        for j, column in enumerate(self.columns):
+            status = self.status[j]
+            if status == BASIC or self.lower[j] == self.upper[j]:
+                continue
+            d_j = cost[j] - sum(y[i] * v for i, v in column)
+            if status == AT_LOWER:
+                score = -d_j
+                tie = -tie_cost[j] if tie_cost else 0.0
+            else:
+                score = d_j
+                tie = tie_cost[j] if tie_cost else 0.0
+            if score > TOL:
+                candidates.append((score, tie, -j))
+        candidates.sort()
+        return [-j for _, _, j in candidates]
+
+    def _residual(self):
+        """b - N x_N for the nonbasic variables."""
+        residual = self.b[:]
+        for j, column in enumerate(self.columns):
+            if self.status[j] == BASIC:
+                continue
+            x_j = self.x[j]
+            if x_j:
+                for i, v in column:
+                    residual[i] -= v * x_j
+        return residual
+
+    def _ftran(self, column):
+        """Solve B w = a for a sparse column a, return w as a dict {row: value} of its nonzeros."""
+        w = {}
+        for i, v in column:
+            w[i] = w.get(i, 0.0) + v
+        for r, d_r, others in self.etas:
+            w_r = w.get(r)
+            if not w_r:
+                continue
+            w_r /= d_r
+            w[r] = w_r
+            for i, d_i in others:
+                w[i] = w.get(i, 0.0) - d_i * w_r
+        return {i: w_i for i, w_i in w.items() if w_i}
+
+    def _btran(self, c_B):
+        """Solve y B = c_B."""
+        y = c_B[:]
+        for r, d_r, others in reversed(self.etas):
+            s = y[r]
+            for i, d_i in others:
+                s -= y[i] * d_i
+            y[r] = s / d_r
+        return y
+
+    def _add_eta(self, r, w):
+        others = [(i, w_i) for i, w_i in w.items() if i != r]
+        if w[r] == 1.0 and not others:
+            return
+        self.etas.append((r, w[r], others))
+
+    def _reinvert(self):
+        """Rebuild the eta file from the current basis and recompute the basic variables."""
+        self.etas = []
+        self.updates = 0
+        free = set(range(self.m))
+        heading = [None] * self.m
+        # unit columns first: they pivot on their own row and need no eta when the sign is +1. As long as all etas
+        # come from single entry columns, the ftran of another single entry column is that column itself.
+        basic = sorted(self.heading, key=lambda j: len(self.columns[j]))
+        diagonal = True
+        for j in basic:
+            column = self.columns[j]
+            if diagonal and len(column) == 1 and column[0][0] in free:
+                (r, v), = column
+                w = {r: v}
+            else:
+                diagonal = False
+                w = self._ftran(column)
+                r = max((i for i in w if i in free), key=lambda i: abs(w[i]), default=None)
+            if r is None or abs(w[r]) <= TOL:
+                raise Exception('Basis is singular')
+            free.remove(r)
+            heading[r] = j
+            self._add_eta(r, w)
+        self.heading[:] = heading
+        self._update_basic()
+
+    def _update_basic(self):
+        """Recompute the basic variables from the nonbasic ones."""
+        x_B = self._ftran(list(enumerate(self._residual())))
+        for r, j in enumerate(self.heading):
+            self.x[j] = x_B.get(r, 0.0)
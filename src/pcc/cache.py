@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def fleet_key(fuels, powerplants):
+    """A canonical key for a fleet: equal fuels and powerplants give equal keys, whatever the key order of the dicts.
+
+    This is much cheaper than a `fingerprint`, but only valid within a process. It only looks at the fields of
+    `pcc.util.Plant`; the number of keys of a plant is part of the key, so that unknown fields still make a difference.
+    """
+    return (
+        tuple(sorted(fuels.items())),
+        tuple((len(d), d.get('name'), d.get('type'), d.get('efficiency'), d.get('pmin'), d.get('pmax'), d.get('cost'))
+              for d in powerplants),
+    )
+
+
+def fingerprint(*objects):
+    """A canonical hash of json serializable objects: equal objects give equal fingerprints, whatever the key order."""
+    return digest(json.dumps(objects, sort_keys=True, separators=(',', ':')).encode())
+
+
+def fleet_fingerprint(load, fleet):
+    """A canonical hash of a load and a `pcc.util.Fleet`, the input of `pcc.naive.distribute_fleet`.
+
+    Payloads that only differ in key order, in 1 vs 1.0, or in the price of a fuel that none of the plants burns, give
+    the same fleet and so the same fingerprint. Hashing the columns is much cheaper than a `fingerprint` of the payload.
+    """
+    h = hashlib.blake2b(repr(float(load)).encode(), digest_size=16)
+    h.update(json.dumps(fleet.names).encode())
+    for column in (fleet.types, fleet.efficiency, fleet.pmin, fleet.pmax, fleet.cost):
+        h.update(column.tobytes())
+    return h.hexdigest()
+
+
+def digest(data):
+    """A hash of bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache:
+    """A bounded least recently used cache where every entry expires `ttl` seconds after it was put.
+
+    get() returns None on a miss, so None can not be cached. A cache with a name also counts its hits and misses in
+    the `pcc.metrics.cache_lookups` of all processes.
+    """
+
+    def __init__(self, maxsize=128, ttl=None, clock=time.monotonic, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.name = name
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, prefix, maxsize=128, ttl=None, name=None):
+        """Take the size and ttl from the environment variables <prefix>_SIZE and <prefix>_TTL, if set."""
+        maxsize = int(os.getenv(f'{prefix}_SIZE', maxsize))
+        ttl = os.getenv(f'{prefix}_TTL', ttl)
+        return cls(maxsize=maxsize, ttl=float(ttl) if ttl is not None else None, name=name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        value = self._get(key)
+        if self.name is not None:
+            metrics.cache_lookups.labels(self.name, 'miss' if value is None else 'hit').inc()
+        return value
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            value, expires = entry
+            if expires is not None and self.clock() >= expires:
+                del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def put(self, key, value):
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.stats = CacheStats()
+
+    def info(self):
+        return dict(asdict(self.stats), hit_rate=self.stats.hit_rate, size=len(self), maxsize=self.maxsize)
+
+
+class SharedCache:
+    """A cache of bytes shared by all processes on the host, in a sqlite database at path.
+
+    Every entry expires `ttl` seconds after it was put, and when there are more than `maxsize` entries the oldest are
+    removed: a hit does not make an entry younger, so a get is a single read and never waits for a writer. Every
+    process and thread has a connection of its own. When the database is busy for more than `busy_timeout` seconds a
+    get is a miss and a put is skipped, so the cache never holds up a request.
+    """
+
+    def __init__(self, path, maxsize=1024, ttl=60, name=None, clock=time.time, busy_timeout=0.05):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.clock = clock
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._execute(self._create)
+
+    @classmethod
+    def from_env(cls, prefix, maxsize=1024, ttl=60, name=None):
+        """Take the path, size and ttl from <prefix>_PATH, <prefix>_SIZE and <prefix>_TTL; None without a path."""
+        path = os.getenv(f'{prefix}_PATH')
+        maxsize = int(os.getenv(f'{prefix}_SIZE', maxsize))
+        if not path or maxsize <= 0:
+            return None
+        return cls(path, maxsize=maxsize, ttl=float(os.getenv(f'{prefix}_TTL', ttl)), name=name)
+
+    def get(self, key):
+        row = self._execute(lambda db: db.execute('SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone())
+        value = row[0] if row is not None and row[1] > self.clock() else None
+        if self.name is not None:
+            metrics.cache_lookups.labels(self.name, 'miss' if value is None else 'hit').inc()
+        return value
+
+    def put(self, key, value):
+        def put(db):
+            cursor = db.execute('INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)',
+                                (key, value, self.clock() + self.ttl))
+            db.execute('DELETE FROM entries WHERE id <= ?', (cursor.lastrowid - self.maxsize,))
+        self._execute(put)
+        return value
+
+    def clear(self):
+        self._execute(lambda db: db.execute('DELETE FROM entries'))
+
+    def __len__(self):
+        return self._execute(lambda db: db.execute('SELECT count(*) FROM entries').fetchone()[0]) or 0
+
+    @staticmethod
+    def _create(db):
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, key TEXT UNIQUE, value BLOB, '
+                   'expires REAL)')
+
+    def _execute(self, function):
+        try:
+            return function(self._connection())
+        except sqlite3.OperationalError as e:
+            logger.warning('SharedCache %s: %s', self.path, e)
+            return None
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            # a connection must not be used after a fork
+            local.db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                       check_same_thread=False)
+            local.db.execute('PRAGMA synchronous = OFF')
+            local.pid = os.getpid()
+        return local.db
@@ -0,0 +1,135 @@
+"""The registry of the engines, and the choice of the engine for a payload.
+
+Every engine in `ENGINES` has a `distribute_fleet(load, fleet)` and a small model of what it can solve and how long it
+takes. `select` sorts a payload into one of three kinds with a single merit order pass over the fleet:
+
+- NO_PMIN: no plant has a pmin, every engine finds the optimum
+- MERIT_ORDER: filling the merit order - the cheapest plants first, each up to its pmax - gives the marginal plant at
+  least its pmin, so that fill is the optimum and no pmin binds
+- BINDING_PMIN: the marginal plant of the fill gets less than its pmin, and only an exact unit commitment finds the
+  optimum
+
+and picks the engine with the lowest expected time among the engines that are correct for the kind: the naive merit
+order pass when no pmin binds, the branch and bound otherwise. The bounded simplex commits every plant, so it is only
+correct without pmin. `pcc.simplex` is not an engine here: its LP has no load balance row.
+
+The "engine" of a payload, or else the environment variable PCC_ENGINE, overrides the choice with the name of an
+engine; "auto", the default, leaves it to `select`. Every choice is counted in the pcc_engine_selections_total metric,
+by engine, kind and reason.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from importlib import import_module
+
+from . import metrics
+from .naive import prepare_fleet
+
+
+logger = logging.getLogger(__name__)
+
+NO_PMIN, MERIT_ORDER, BINDING_PMIN = 'no-pmin', 'merit-order', 'binding-pmin'
+
+AUTO = 'auto'
+
+
+@dataclass(frozen=True)
+class Engine:
+    """An engine and the model of its capabilities and its cost.
+
+    The expected time in seconds for n plants is overhead + per_plant * n, fitted on the synthetic fleets of
+    `pcc.benchmark` of 10 to 10000 plants at half their capacity.
+    """
+    name: str
+    binding_pmin: bool  # finds the optimum when a pmin binds
+    commits_all: bool  # runs every plant at least at its pmin, so it is only correct without pmin
+    overhead: float
+    per_plant: float
+
+    @property
+    def function(self):
+        """The `distribute_fleet(load, fleet)` of the engine, its module is imported on first use."""
+        return import_module(f'{__package__}.{self.name}').distribute_fleet
+
+    def handles(self, kind):
+        if kind == BINDING_PMIN:
+            return self.binding_pmin
+        if kind == MERIT_ORDER:
+            return not self.commits_all
+        return True
+
+    def expected_time(self, n):
+        return self.overhead + self.per_plant * n
+
+
+ENGINES = {engine.name: engine for engine in (
+    Engine('naive', binding_pmin=False, commits_all=False, overhead=5e-6, per_plant=2.4e-7),
+    Engine('bnb', binding_pmin=True, commits_all=False, overhead=2e-5, per_plant=1.9e-6),
+    Engine('bounded', binding_pmin=False, commits_all=True, overhead=5e-5, per_plant=2.2e-6),
+)}
+
+
+@dataclass(frozen=True)
+class Selection:
+    engine: Engine
+    kind: str
+    reason: str  # 'auto', 'request' or 'env'
+
+
+def _check_name(where, name):
+    if not isinstance(name, str) or name != AUTO and name not in ENGINES:
+        raise ValueError(f'{where}: must be one of {", ".join((AUTO, *ENGINES))}, got {name!r}')
+    return name
+
+
+ENGINE = _check_name('PCC_ENGINE', os.getenv('PCC_ENGINE', AUTO))
+
+
+def classify(load, fleet):
+    """The kind of the payload, see the module docstring."""
+    pmin = fleet.pmin
+    pmax = fleet.pmax
+    if not any(lo > 0 for lo, hi in zip(pmin, pmax) if hi > 0):
+        return NO_PMIN
+    remaining = load
+    for k in fleet.merit_order():
+        if remaining <= pmax[k]:
+            return BINDING_PMIN if 0 < remaining < pmin[k] else MERIT_ORDER
+        remaining -= pmax[k]
+    # the load exceeds the capacity: no engine meets it, the naive one fails fastest
+    return MERIT_ORDER
+
+
+def select(load, fleet, name=None, record=True):
+    """Return the `Selection` of the engine for a load and `pcc.util.Fleet`.
+
+    name is the "engine" of the payload, None if it has none. Raises a ValueError for an unknown name. With record
+    False the choice is not counted in the metrics, e.g. for a warm-up.
+    """
+    kind = classify(load, fleet)
+    if name is not None:
+        reason = 'request'
+        _check_name('engine', name)
+    else:
+        name, reason = ENGINE, 'env'
+    if name == AUTO:
+        reason = 'auto'
+        n = len(fleet)
+        engine = min((e for e in ENGINES.values() if e.handles(kind)), key=lambda e: e.expected_time(n))
+    else:
+        engine = ENGINES[name]
+    logger.debug('select: %s plants, %s, engine %s (%s)', len(fleet), kind, engine.name, reason)
+    if record:
+        metrics.engine_selections.labels(engine.name, kind, reason).inc()
+    return Selection(engine, kind, reason)
+
+
+def distribute_fleet(load, fleet, name=None):
+    """Solve with the engine `select` picks, in the format of `pcc.naive.distribute_load`."""
+    return select(load, fleet, name).engine.function(load, fleet)
+
+
+def distribute_load(config, name=None):
+    """`distribute_fleet` for a /productionplan payload, name defaults to its "engine"."""
+    load, fleet, _ = prepare_fleet(config)
+    return distribute_fleet(load, fleet, config.get('engine') if name is None else name)
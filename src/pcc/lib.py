@@ -2,9 +2,8 @@ import logging
 from operator import attrgetter
 from dataclasses import dataclass, InitVar
 
-from .naive import distribute_load
-# from .simplex import distribute_load
+from .engines import distribute_fleet, distribute_load
+from .naive import distribute_loads
 
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -0,0 +1,317 @@
+"""HTTP load test of the api, run on the same machine as the server.
+
+    python -m pcc.loadtest --workers 1 2 4 --worker-class sync uvicorn.workers.UvicornWorker --concurrency 16
+
+For every combination of --workers and --worker-class it starts gunicorn with the settings of `gunicorn_conf.py` on a
+free local port, waits until it answers, sends requests for --duration seconds and stops it again. Use --url to load
+an already running server instead.
+
+The requests cycle through the payloads in doc/example_payloads and --synthetic fleets of `pcc.benchmark`, posted to
+/productionplan, plus a /productionplan/batch request per fleet with --batch. --concurrency connections each send their
+next request as soon as the previous one is answered. With --rate the requests are instead started at a fixed rate,
+spread over the connections, and the latency is counted from the moment the request should have started, so a server
+that falls behind is not hidden by the load test slowing down with it.
+
+Every run reports, per endpoint, the number of requests, the requests per second, the p50, p95 and p99 latency and the
+error rate, as a table or as json lines with --json. A request is an error when the status is not 200 or the
+connection failed.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+import pcc
+from .benchmark import capacity, generate_fleet
+
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_DIR = os.path.join('doc', 'example_payloads')
+
+APPS = {
+    'sync': 'pcc.webapp:create_app()',
+    'asgi': 'pcc.webapp.asgi:app',
+}
+
+
+def app_for(worker_class):
+    return APPS['asgi'] if worker_class and 'uvicorn' in worker_class.lower() else APPS['sync']
+
+
+def make_requests(payload_dir=PAYLOAD_DIR, synthetic=(), batch=False, seed=0):
+    """Return the (path, body) of the requests to cycle through.
+
+    synthetic is a list of fleet sizes, every one is posted at 3 load levels.
+    """
+    payloads = []
+    for path in sorted(glob.glob(os.path.join(payload_dir, '*.json'))):
+        with open(path) as f:
+            payloads.append(json.load(f))
+    for size in synthetic:
+        config = generate_fleet(size, seed)
+        for level in (0.2, 0.5, 0.8):
+            payloads.append(dict(config, load=round(level * capacity(config), 1)))
+
+    requests = [('/productionplan', json.dumps(payload).encode()) for payload in payloads]
+    if batch:
+        for payload in payloads:
+            loads = [round(payload['load'] * f, 1) for f in (0.5, 0.75, 1, 1.25)]
+            body = {'fuels': payload['fuels'], 'powerplants': payload['powerplants'], 'loads': loads}
+            requests.append(('/productionplan/batch', json.dumps(body).encode()))
+    return requests
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 connection that reconnects when the server closes it."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b''):
+        """Return the status and body of the response."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n')
+        try:
+            self.writer.write(head.encode() + body)
+            await self.writer.drain()
+            status, headers = await self._read_head()
+            if headers.get('transfer-encoding') == 'chunked':
+                data = await self._read_chunked()
+            else:
+                data = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        except BaseException:
+            self.close()
+            raise
+        if headers.get('connection') == 'close':
+            self.close()
+        return status, data
+
+    async def _read_head(self):
+        lines = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip().lower()
+        return status, headers
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            chunks.append(await self.reader.readexactly(size + 2))
+            if size == 0:
+                return b''.join(chunks)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class Stats:
+    """The latencies and outcomes of the requests to one endpoint."""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+
+    def add(self, latency, status):
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+
+    @property
+    def errors(self):
+        return sum(n for status, n in self.statuses.items() if status != 200)
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            'requests': count,
+            'rps': count / elapsed if elapsed else 0.0,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'error_rate': self.errors / count if count else 0.0,
+            'statuses': {str(status): n for status, n in sorted(self.statuses.items(), key=str)},
+        }
+
+
+def percentile(ordered, p):
+    """The nearest-rank percentile p of the sorted list ordered, None if it is empty."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+async def load(host, port, requests, concurrency=8, duration=10.0, rate=None):
+    """Send requests to host:port for duration seconds and return the `Stats` per path and the elapsed time."""
+    stats = defaultdict(Stats)
+    start = time.perf_counter()
+    end = start + duration
+    schedule = asyncio.Queue(concurrency * 2) if rate else None
+
+    async def client(k):
+        connection = Connection(host, port)
+        i = k
+        try:
+            while True:
+                if rate:
+                    item = await schedule.get()
+                    if item is None:
+                        return
+                    t0, (path, body) = item
+                else:
+                    t0 = time.perf_counter()
+                    if t0 >= end:
+                        return
+                    path, body = requests[i % len(requests)]
+                    i += concurrency
+                try:
+                    status, _ = await connection.request('POST', path, body)
+                except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                    logger.debug('%s: %r', path, e)
+                    status = 'connection error'
+                stats[path].add(time.perf_counter() - t0, status)
+        finally:
+            connection.close()
+
+    async def scheduler():
+        interval = 1.0 / rate
+        i = 0
+        while True:
+            t = start + i * interval
+            if t >= end:
+                break
+            delay = t - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await schedule.put((t, requests[i % len(requests)]))
+            i += 1
+        for _ in range(concurrency):
+            await schedule.put(None)
+
+    tasks = [client(k) for k in range(concurrency)]
+    if rate:
+        tasks.append(scheduler())
+    await asyncio.gather(*tasks)
+    return dict(stats), time.perf_counter() - start
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers, worker_class=None, config='gunicorn_conf.py', env=None, timeout=30.0):
+    """Start gunicorn on 127.0.0.1:port and wait until it answers GET /. Stop it with `stop_server`.
+
+    worker_class None is the one of config.
+    """
+    args = [sys.executable, '-m', 'gunicorn', '-c', config, '-b', f'127.0.0.1:{port}', '-w', str(workers),
+            *(['-k', worker_class] if worker_class else []), '--pythonpath',
+            os.path.dirname(os.path.dirname(pcc.__file__)), app_for(worker_class)]
+    process = subprocess.Popen(args, env=dict(os.environ, PCC_LOG_LEVEL='warning', **(env or {})),
+                               stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise Exception(f'gunicorn did not start, exit code {process.returncode}')
+        try:
+            status, _ = asyncio.run(Connection('127.0.0.1', port).request('GET', '/'))
+            if status == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.1)
+    stop_server(process)
+    raise Exception(f'gunicorn did not answer within {timeout} s')
+
+
+def stop_server(process):
+    process.terminate()
+    process.wait()
+
+
+def run(requests, workers=(4,), worker_classes=('sync',), concurrency=8, duration=10.0, rate=None, url=None,
+        config='gunicorn_conf.py', env=None):
+    """Yield a record per run and endpoint, see the module docstring."""
+    if url:
+        host, _, port = url.rpartition('//')[2].partition(':')
+        setups = [(None, None, host, int(port or 80))]
+    else:
+        setups = [(w, k, '127.0.0.1', None) for k in worker_classes for w in workers]
+
+    for n, worker_class, host, port in setups:
+        process = None
+        if port is None:
+            port = free_port()
+            process = start_server(port, n, worker_class, config, env)
+        try:
+            stats, elapsed = asyncio.run(load(host, port, requests, concurrency, duration, rate))
+        finally:
+            if process is not None:
+                stop_server(process)
+        for path, s in sorted(stats.items()):
+            yield dict({'workers': n, 'worker_class': worker_class, 'concurrency': concurrency, 'rate': rate,
+                        'endpoint': path}, **s.report(elapsed))
+
+
+def format_table(records):
+    def ms(value):
+        return f'{value * 1000:>8.1f}' if value is not None else f'{"-":>8}'
+
+    lines = [f'{"worker class":<30} {"workers":>7} {"endpoint":<22} {"requests":>8} {"req/s":>8} {"p50 ms":>8} '
+             f'{"p95 ms":>8} {"p99 ms":>8} {"errors":>7}']
+    for r in records:
+        lines.append(f'{r["worker_class"] or "-":<30} {r["workers"] or "-":>7} {r["endpoint"]:<22} {r["requests"]:>8} '
+                     f'{r["rps"]:>8.0f} {ms(r["p50"])} {ms(r["p95"])} {ms(r["p99"])} {r["error_rate"]:>7.1%}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the api under gunicorn.')
+    parser.add_argument('--workers', nargs='+', type=int, default=[4])
+    parser.add_argument('--worker-class', nargs='+', default=['sync'],
+                        help='gunicorn worker classes, e.g. sync gthread uvicorn.workers.UvicornWorker')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--rate', type=float, default=None, help='requests per second, default as fast as possible')
+    parser.add_argument('--synthetic', nargs='*', type=int, default=[100, 1000],
+                        help='sizes of synthetic fleets to add to the example payloads')
+    parser.add_argument('--batch', action='store_true', help='also post every fleet to /productionplan/batch')
+    parser.add_argument('--payloads', default=PAYLOAD_DIR, help='directory of json payloads')
+    parser.add_argument('--config', default='gunicorn_conf.py', help='the gunicorn configuration file')
+    parser.add_argument('--url', help='load this server, e.g. http://127.0.0.1:8000, instead of starting gunicorn')
+    parser.add_argument('--json', action='store_true', help='print json lines instead of a table')
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    requests = make_requests(args.payloads, args.synthetic, args.batch)
+    records = run(requests, args.workers, args.worker_class, args.concurrency, args.duration, args.rate, args.url,
+                  args.config)
+    if args.json:
+        for record in records:
+            print(json.dumps(record), flush=True)
+    else:
+        print(format_table(records))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
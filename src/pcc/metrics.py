@@ -0,0 +1,364 @@
+"""Metrics of the service, added up over all its processes, in the Prometheus text format.
+
+Every process - the gunicorn workers and the solvers of `pcc.pool` - keeps the values of its metrics in a memory mapped
+file of doubles in the directory PCC_METRICS_DIR, next to a json index of the series in it, and `exposition` adds up
+the files of all processes. `gunicorn_conf.py` creates the directory before it starts the workers and removes it when
+it stops. When a process is gone - a worker that exits, a solver that is replaced - `mark_process_dead` adds its
+values to one archive file and removes its files, so a counter never goes down and the directory does not grow with
+every replaced process. Without PCC_METRICS_DIR the values are kept in anonymous memory and only this process is
+reported.
+
+The metrics are counters and histograms with fixed buckets. An update is a dict lookup of the series, a bisect and
+two additions into the memory map under a lock, well below a microsecond; the files are only read by `exposition`. A
+series gets its place in the file on first use; when the file is full, new series are counted in a scratch area that
+is not reported.
+"""
+import bisect
+import fcntl
+import json
+import logging
+import mmap
+import os
+import threading
+from array import array
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SIZE = 8192  # doubles per process
+SCRATCH = 64  # doubles at the end of the file for the series that do not fit
+ARCHIVE = 'archive'  # the values of the processes that are gone, as json {series key: values}
+LOCK = 'lock'
+
+registry = {}
+
+
+class Store:
+    """The values of the metrics of this process."""
+
+    def __init__(self, directory=None, size=SIZE):
+        self.directory = directory
+        self.size = size
+        self.index = {}
+        self.used = 0
+        self.lock = threading.Lock()
+        self.path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, f'{os.getpid()}-{os.urandom(4).hex()}')
+            with open(self.path + '.db', 'w+b') as f:
+                f.truncate(size * 8)
+                self.mmap = mmap.mmap(f.fileno(), size * 8)
+        else:
+            self.mmap = mmap.mmap(-1, size * 8)
+        self.values = memoryview(self.mmap).cast('d')
+
+    def allocate(self, key, width):
+        """Return the position of the width values of the series key, placing them on first use."""
+        with self.lock:
+            position = self.index.get(key)
+            if position is None:
+                if self.used + width > self.size - SCRATCH:
+                    logger.warning('metrics: no room for %s', key)
+                    return self.size - SCRATCH
+                position = self.index[key] = self.used
+                self.used += width
+                if self.path:
+                    self._write_index()
+            return position
+
+    def _write_index(self):
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(self.path + '.tmp', self.path + '.json')
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = Store(os.getenv('PCC_METRICS_DIR'))
+    return _store
+
+
+def _reset():
+    # a forked process gets a file of its own
+    global _store, _store_lock
+    _store = None
+    _store_lock = threading.Lock()
+    for metric in registry.values():
+        metric._children = {}
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+class Metric:
+    type = None
+    width = 1
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        registry[name] = self
+
+    def labels(self, *values):
+        """The series with these label values, in the order of labelnames."""
+        child = self._children.get(values)
+        if child is None:
+            store = get_store()
+            key = json.dumps([self.name, [str(v) for v in values]])
+            child = self._children[values] = self._child(store, store.allocate(key, self.width))
+        return child
+
+    def samples(self, labels, values):
+        raise NotImplementedError
+
+
+class CounterChild:
+    __slots__ = ('values', 'lock', 'position')
+
+    def __init__(self, store, position):
+        self.values = store.values
+        self.lock = store.lock
+        self.position = position
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.values[self.position] += amount
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _child(self, store, position):
+        return CounterChild(store, position)
+
+    def samples(self, labels, values):
+        yield self.name, labels, values[0]
+
+
+class HistogramChild:
+    __slots__ = ('values', 'lock', 'position', 'buckets')
+
+    def __init__(self, store, position, buckets):
+        self.values = store.values
+        self.lock = store.lock
+        self.position = position
+        self.buckets = buckets
+
+    def observe(self, value):
+        i = self.position + bisect.bisect_left(self.buckets, value)
+        total = self.position + len(self.buckets) + 1
+        with self.lock:
+            self.values[i] += 1
+            self.values[total] += value
+
+
+class Histogram(Metric):
+    """Counts of the observations per bucket, and their sum; the values are [count per bucket..., count > last, sum]."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.width = len(self.buckets) + 2
+
+    def _child(self, store, position):
+        return HistogramChild(store, position, self.buckets)
+
+    def samples(self, labels, values):
+        count = 0
+        for bound, n in zip(self.buckets + (float('inf'),), values):
+            count += n
+            yield f'{self.name}_bucket', labels + [('le', _format_value(bound))], count
+        yield f'{self.name}_sum', labels, values[-1]
+        yield f'{self.name}_count', labels, count
+
+
+def collect(directory=None):
+    """Return {(name, label values): values} added up over the processes that write to directory, or this process."""
+    totals = {}
+    if directory is None:
+        store = get_store()
+        with store.lock:
+            sources = [(dict(store.index), store.values.tolist())]
+    else:
+        sources = _read_directory(directory)
+    for index, values in sources:
+        for key, position in index.items():
+            name, label_values = json.loads(key)
+            metric = registry.get(name)
+            if metric is None:
+                continue
+            series = values[position:position + metric.width]
+            total = totals.setdefault((name, tuple(label_values)), [0.0] * metric.width)
+            for i, value in enumerate(series):
+                total[i] += value
+    return totals
+
+
+def _read_directory(directory):
+    try:
+        with _locked(directory, fcntl.LOCK_SH):
+            paths = [entry.path[:-len('.json')] for entry in os.scandir(directory) if entry.name.endswith('.json')]
+            sources = list(_read_files(paths))
+            archive = _read_archive(directory)
+    except FileNotFoundError:
+        return []
+    index = {}
+    values = []
+    for key, series in archive.items():
+        index[key] = len(values)
+        values.extend(series)
+    sources.append((index, values))
+    return sources
+
+
+def _read_files(paths):
+    for path in paths:
+        try:
+            with open(path + '.json') as f:
+                index = json.load(f)
+            values = array('d')
+            with open(path + '.db', 'rb') as f:
+                values.frombytes(f.read(SIZE * 8))
+        except (OSError, ValueError) as e:
+            logger.warning('metrics: unable to read %s: %s', path, e)
+            continue
+        yield index, values
+
+
+def _read_archive(directory):
+    try:
+        with open(os.path.join(directory, ARCHIVE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+@contextmanager
+def _locked(directory, operation):
+    """An flock on the lock file of directory: shared to read the files, exclusive to merge them into the archive."""
+    fd = os.open(os.path.join(directory, LOCK), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, operation)
+        yield
+    finally:
+        os.close(fd)
+
+
+def mark_process_dead(pid, directory=None):
+    """Add the values of the process pid, which is gone, to the archive and remove its files. Returns their number.
+
+    Called by `gunicorn_conf.py` when a worker exits and by `pcc.pool` when it replaces a solver.
+    """
+    directory = directory or os.getenv('PCC_METRICS_DIR')
+    if not directory:
+        return 0
+    prefix = f'{pid}-'
+    try:
+        with _locked(directory, fcntl.LOCK_EX):
+            paths = [entry.path[:-len('.json')] for entry in os.scandir(directory)
+                     if entry.name.startswith(prefix) and entry.name.endswith('.json')]
+            if not paths:
+                return 0
+            archive = _read_archive(directory)
+            for index, values in _read_files(paths):
+                for key, position in index.items():
+                    metric = registry.get(json.loads(key)[0])
+                    if metric is None:
+                        continue
+                    total = archive.setdefault(key, [0.0] * metric.width)
+                    for i, value in enumerate(values[position:position + metric.width]):
+                        total[i] += value
+            path = os.path.join(directory, ARCHIVE)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(archive, f)
+            os.replace(path + '.tmp', path)
+            for path in paths:
+                for suffix in ('.json', '.db'):
+                    try:
+                        os.unlink(path + suffix)
+                    except FileNotFoundError:
+                        pass
+    except FileNotFoundError:
+        return 0
+    return len(paths)
+
+
+def exposition():
+    """The metrics of all processes in the Prometheus text format, as bytes."""
+    totals = collect(os.getenv('PCC_METRICS_DIR') or None)
+    series = {}
+    for (name, label_values), values in sorted(totals.items()):
+        series.setdefault(name, []).append((label_values, values))
+    lines = []
+    for name, metric in registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for label_values, values in series.get(name, ()):
+            labels = list(zip(metric.labelnames, label_values))
+            for sample, sample_labels, value in metric.samples(labels, values):
+                lines.append(f'{sample}{_format_labels(sample_labels)} {_format_value(value)}')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+request_duration = Histogram(
+    'pcc_request_duration_seconds', 'Time to answer a request, by endpoint.', ('endpoint',), LATENCY_BUCKETS)
+solve_duration = Histogram(
+    'pcc_solve_duration_seconds', 'Time to solve, including the round trip to the solver pool, by engine.',
+    ('engine',), LATENCY_BUCKETS)
+request_size = Histogram(
+    'pcc_request_size_bytes', 'Size of the request body, by endpoint.', ('endpoint',),
+    (1e3, 3e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6, 1e7))
+fleet_plants = Histogram(
+    'pcc_fleet_plants', 'Number of powerplants of the validated payloads.', (),
+    (3, 10, 30, 100, 300, 1000, 3000, 10000))
+simplex_pivots = Histogram(
+    'pcc_simplex_pivots', 'Pivots of a simplex solve, by engine.', ('engine',),
+    (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000))
+engine_selections = Counter(
+    'pcc_engine_selections_total', 'Engines chosen for the payloads, by engine, payload kind and reason (auto, request '
+    'or env).', ('engine', 'kind', 'reason'))
+cache_lookups = Counter(
+    'pcc_cache_lookups_total', 'Lookups in the caches of the engines, by cache and result (hit or miss).',
+    ('cache', 'result'))
+worker_ready = Histogram(
+    'pcc_worker_ready_seconds', 'Time from the fork of a worker until it is warmed up and accepts requests.', (),
+    (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+admission_limit = Histogram(
+    'pcc_admission_limit', 'The adaptive limit of the solves in flight of a worker, at every admitted solve.', (),
+    (1, 2, 4, 8, 16, 32, 64, 128))
+admission_rejections = Counter(
+    'pcc_admission_rejections_total', 'Solves shed by the admission control, by status code (429 or 503).',
+    ('status',))
+errors = Counter('pcc_errors_total', 'Error responses, by status code.', ('status',))
@@ -0,0 +1,191 @@
+"""Dispatch over a horizon of periods with ramp limits, as one sparse LP.
+
+Solving every period on its own - e.g. with `pcc.naive.distribute_loads` - lets a plant jump from pmin to pmax from
+one quarter-hour to the next. Here a plant can have "rampup" and "rampdown" limits, the MW its output may rise or fall
+from one period to the next, and the periods are solved together:
+
+    minimize    sum_t sum_k cost_k * p_tk
+    subject to  sum_k p_tk = load_t                                     for every period t
+                -rampdown_k <= p_tk - p_(t-1)k <= rampup_k              for t > 0
+                pmin_k <= p_tk <= pmax_tk
+
+pmax_tk is the pmax of the plant derated by the wind(%) of period t. Like `pcc.bounded` all plants are committed in
+every period: they produce at least their pmin.
+
+For T periods and n plants this has T * n variables, and a dense tableau would have (T * n)^2 entries. The LP is built
+column wise and sparse for `pcc.bounded.RevisedSimplex`. A column has at most 3 nonzeros. The ramp of plant k into
+period t is a variable r_tk = p_tk - p_(t-1)k bounded by the ramp limits, with a row r_tk - p_tk + p_(t-1)k = 0. It
+only appears in its row, so it starts out basic as the slack of that row and only the T load rows need a phase 1. A
+plant with ramp limits that can never bind - at least its pmax - pmin - gets no ramp rows.
+
+Pricing - the reduced cost of every column - is the bulk of the work of an iteration with that many columns, so
+`HorizonSimplex` does it with NumPy on the nonzeros of the columns as coordinate arrays.
+"""
+import logging
+import math
+
+import numpy as np
+
+from . import metrics, trace
+from .bounded import BASIC, TOL, AT_LOWER, RevisedSimplex
+from .naive import prepare_fleet
+from .util import RAMP_KEYS, fuel_key
+
+
+logger = logging.getLogger(__name__)
+
+
+def distribute_loads(config, periods, stats=None):
+    """Distribute a sequence of loads over the same fleet, within the ramp limits of the plants.
+
+    periods is a list of loads, or of (load, wind%) pairs that override the "wind(%)" of config['fuels'], like
+    `pcc.naive.distribute_loads`. The powerplants can have "rampup" and "rampdown" limits in MW per period, a missing
+    limit is no limit. Returns a list with a load plan per period, in the format of `distribute_load`.
+    """
+    stats = trace.SolveStats() if stats is None else stats
+    loads, fleets = prepare_periods(config, periods)
+    rampup, rampdown = ramp_limits(config['powerplants'])
+    logger.debug('distribute_loads: %s periods, %s plants', len(loads), len(rampup))
+    load_plans = allocate_horizon(loads, fleets, rampup, rampdown, stats=stats)
+    metrics.simplex_pivots.labels('multiperiod').observe(stats.pivots)
+    plans = []
+    for load, fleet, load_plan in zip(loads, fleets, load_plans):
+        allocated = sum(load_plan)
+        if not math.isclose(allocated, load):
+            raise Exception('Unable to distribute load: load=%s, allocated=%s' % (load, allocated))
+        plans.append([{'name': name, 'p': p} for name, p in zip(fleet.names, load_plan)])
+    return plans
+
+
+def prepare_periods(config, periods):
+    """Return the load and the `pcc.util.Fleet` of every period; the periods with the same wind(%) share a Fleet."""
+    loads = []
+    fleets = []
+    for period in periods:
+        if isinstance(period, (list, tuple)):
+            load, wind = period
+        else:
+            load, wind = period, config['fuels'].get(fuel_key['windturbine'])
+        fuels = dict(config['fuels'])
+        fuels[fuel_key['windturbine']] = wind
+        _, fleet, _ = prepare_fleet({'load': load, 'fuels': fuels, 'powerplants': config['powerplants']})
+        loads.append(load)
+        fleets.append(fleet)
+    return loads, fleets
+
+
+def ramp_limits(powerplants):
+    """The rampup and rampdown limits of every plant, math.inf for no limit."""
+    limits = {key: [d.get(key, math.inf) for d in powerplants] for key in RAMP_KEYS}
+    return limits['rampup'], limits['rampdown']
+
+
+def allocate_horizon(loads, fleets, rampup, rampdown, stats=None):
+    """Solve the LP of the module docstring, return a load plan - the p of every plant number - per period."""
+    periods = len(loads)
+    plants = [k for k in range(len(fleets[0])) if any(fleet.pmax[k] > 0 for fleet in fleets)]
+    lower = [[min(fleet.pmin[k], fleet.pmax[k]) for k in plants] for fleet in fleets]
+    upper = [[fleet.pmax[k] for k in plants] for fleet in fleets]
+
+    # the row of the ramp of plant i into period t is ramp_rows[i] + t - 1
+    ramp_rows = {}
+    for i, k in enumerate(plants):
+        span = max(hi[i] for hi in upper) - min(lo[i] for lo in lower)
+        if rampup[k] < span or rampdown[k] < span:
+            ramp_rows[i] = periods + len(ramp_rows) * (periods - 1)
+
+    c = []
+    columns = []
+    b = [float(load) for load in loads] + [0.0] * len(ramp_rows) * (periods - 1)
+    lo_bounds = []
+    hi_bounds = []
+    for t, fleet in enumerate(fleets):
+        for i, k in enumerate(plants):
+            column = [(t, 1.0)]
+            row = ramp_rows.get(i)
+            if row is not None:
+                if t > 0:
+                    column.append((row + t - 1, -1.0))
+                if t < periods - 1:
+                    column.append((row + t, 1.0))
+            c.append(fleet.cost[k])
+            columns.append(column)
+            lo_bounds.append(lower[t][i])
+            hi_bounds.append(upper[t][i])
+    basis = []
+    for i, row in ramp_rows.items():
+        k = plants[i]
+        for t in range(1, periods):
+            basis.append((row + t - 1, len(columns)))
+            c.append(0.0)
+            columns.append([(row + t - 1, 1.0)])
+            lo_bounds.append(-rampdown[k])
+            hi_bounds.append(rampup[k])
+    logger.debug('allocate_horizon: %s variables, %s rows', len(columns), len(b))
+
+    lp = HorizonSimplex(c, columns, b, lo_bounds, hi_bounds, basis=basis,
+                        at_upper=merit_order_fill(loads, fleets, plants, lower, upper))
+    x = lp.solve(stats=stats)
+    load_plans = []
+    for t, fleet in enumerate(fleets):
+        load_plan = [0.0] * len(fleet)
+        offset = t * len(plants)
+        for i, k in enumerate(plants):
+            load_plan[k] = x[offset + i]
+        load_plans.append(load_plan)
+    return load_plans
+
+
+def merit_order_fill(loads, fleets, plants, lower, upper):
+    """The variables of the plants that can run at pmax in every period, cheapest first, without exceeding any load.
+
+    Starting the LP from there instead of from all plants at pmin saves most of the iterations of phase 1.
+    """
+    room = [load - sum(lo) for load, lo in zip(loads, lower)]
+    cost = fleets[0].cost
+    at_upper = []
+    for i in sorted(range(len(plants)), key=lambda i: cost[plants[i]]):
+        extra = [hi[i] - lo[i] for lo, hi in zip(lower, upper)]
+        if all(e <= r for e, r in zip(extra, room)):
+            room = [r - e for e, r in zip(extra, room)]
+            at_upper.extend(t * len(plants) + i for t in range(len(loads)))
+    return at_upper
+
+
+class HorizonSimplex(RevisedSimplex):
+    """`RevisedSimplex` with the pricing vectorized over the nonzeros of all columns.
+
+    The status of the variables is kept in a bytearray, so that NumPy reads it without a copy, and the arrays of the
+    costs and the fixed variables are built once per phase.
+    """
+
+    refactor_interval = 200
+
+    def __init__(self, c, columns, b, lower, upper, basis=None, at_upper=()):
+        super().__init__(c, columns, b, lower, upper, basis, at_upper)
+        self.status = bytearray(self.status)
+        self._nonzeros = (
+            np.array([j for j, column in enumerate(self.columns) for _ in column], dtype=np.intp),
+            np.array([i for column in self.columns for i, _ in column], dtype=np.intp),
+            np.array([v for column in self.columns for _, v in column], dtype=float),
+        )
+        self._phase = None
+
+    def _price(self, cost, y, tie_cost=None):
+        if self._phase is not cost:
+            self._phase = cost
+            self._cost = np.array(cost)
+            self._tie_cost = np.array(tie_cost) if tie_cost else np.zeros(len(cost))
+            self._fixed = np.array(self.lower) == np.array(self.upper)
+        cols, rows, values = self._nonzeros
+        reduced = self._cost - np.bincount(cols, values * np.array(y)[rows], minlength=len(self.columns))
+        status = np.frombuffer(self.status, dtype=np.uint8)
+        at_lower = status == AT_LOWER
+        score = np.where(at_lower, -reduced, reduced)
+        score[(status == BASIC) | self._fixed] = 0.0
+        candidates = np.flatnonzero(score > TOL)
+        tie = self._tie_cost[candidates]
+        tie = np.where(at_lower[candidates], -tie, tie)
+        # best last, ties on tie and then on the lowest j, like `RevisedSimplex._price`
+        order = np.lexsort((-candidates, tie, score[candidates]))
+        return candidates[order].tolist()
@@ -1,12 +1,17 @@
 import logging
 import math
+from array import array
 from operator import attrgetter
 
-from .util import Plant
+from .cache import LRUCache, fleet_key
+from .util import Fleet, Plant, fuel_key
 
 
 logger = logging.getLogger(__name__)
 
+prepare_cache = LRUCache.from_env('PCC_PREPARE_CACHE', maxsize=64, ttl=300, name='naive.prepare')
+fleet_cache = LRUCache.from_env('PCC_FLEET_CACHE', maxsize=64, ttl=300, name='naive.fleet')
+
 
 def distribute_load(config):
     """
@@ -20,23 +25,79 @@ def distribute_load(config):
         { 'name': 'tj2', 'p': 0 }
     ]
     """
-    load, plants, merit_order = prepare_input(config)
+    load, fleet, merit_order = prepare_fleet(config)
+    return distribute_fleet(load, fleet, merit_order)
+
+
+def distribute_fleet(load, fleet, merit_order=None):
+    """`distribute_load` for a `Fleet`, e.g. the one `pcc.webapp.schema` builds while it validates a payload."""
+    if merit_order is None:
+        merit_order = fleet.merit_order()
     logger.debug('distribute_load: load=%s\nmerit_order=%s', load, merit_order)
-    load_plan = {name: 0.0 for name in plants}
-    allocated = allocate_load(load, load_plan, plants, merit_order)
+    load_plan = array('d', bytes(8 * len(fleet)))
+    allocated = allocate_fleet(load, load_plan, fleet, merit_order)
     if not math.isclose(allocated, load):
         raise Exception('Unable to distribute load: load=%s, allocated=%s' % (load, allocated))
-    return [{'name': name, 'p': p} for name, p in load_plan.items()]
+    return [{'name': name, 'p': p} for name, p in zip(fleet.names, load_plan)]
+
+
+def distribute_loads(config, periods):
+    """Distribute a sequence of loads over the same fleet, e.g. the 96 quarter-hours of a day.
+
+    periods is a list of loads, or of (load, wind%) pairs that override the "wind(%)" of config['fuels'].
+    The plant table is prepared once per distinct wind%, and every period is solved with the `Session` of its wind%.
+    Returns a list with a load plan per period, in the format of `distribute_load`.
+    """
+    sessions = {}
+    plans = []
+    for period in periods:
+        if isinstance(period, (list, tuple)):
+            load, wind = period
+        else:
+            load, wind = period, config['fuels'].get(fuel_key['windturbine'])
+        session = sessions.get(wind)
+        if session is None:
+            fuels = dict(config['fuels'])
+            fuels[fuel_key['windturbine']] = wind
+            _, plants, merit_order = prepare_input({'load': load, 'fuels': fuels, 'powerplants': config['powerplants']})
+            sessions[wind] = Session(load, plants, merit_order)
+            # the session has just solved this load
+            plans.append(sessions[wind].plan())
+        else:
+            plans.append(session.resolve(load))
+    return plans
 
 
 def prepare_input(config):
+    """Return the load, the plant table and the merit order of config.
+
+    The plant table and merit order are cached on the fuels and powerplants, so they are shared
+    between calls and must not be modified.
+    """
     fuels = config['fuels']
-    plants = {d['name']: Plant(**d, fuels=fuels) for d in config['powerplants']}
-    logger.debug('plants: %s', plants)
-    merit_order = [p.name for p in sorted(plants.values(), key=attrgetter('cost'))]
+    key = fleet_key(fuels, config['powerplants'])
+    prepared = prepare_cache.get(key)
+    if prepared is None:
+        plants = {d['name']: Plant(**d, fuels=fuels) for d in config['powerplants']}
+        logger.debug('plants: %s', plants)
+        merit_order = [p.name for p in sorted(plants.values(), key=attrgetter('cost'))]
+        prepared = prepare_cache.put(key, (plants, merit_order))
+    plants, merit_order = prepared
     return config['load'], plants, merit_order
 
 
+def prepare_fleet(config):
+    """Like `prepare_input`, but with the plants as a `Fleet` and the merit order as plant numbers."""
+    fuels = config['fuels']
+    key = fleet_key(fuels, config['powerplants'])
+    prepared = fleet_cache.get(key)
+    if prepared is None:
+        fleet = Fleet.from_powerplants(config['powerplants'], fuels)
+        prepared = fleet_cache.put(key, (fleet, fleet.merit_order()))
+    fleet, merit_order = prepared
+    return config['load'], fleet, merit_order
+
+
 def allocate_load(load, load_plan, powerplants, merit_order):
     remaining = load
     for i, plant_id in enumerate(merit_order):
@@ -63,3 +124,86 @@ def allocate_load(load, load_plan, powerplants, merit_order):
         if not remaining:
             break
     return load - remaining
+
+
+def allocate_fleet(load, load_plan, fleet, merit_order):
+    """`allocate_load` on the columns of a `Fleet`: load_plan is an array with the p of every plant number."""
+    pmin = fleet.pmin
+    pmax = fleet.pmax
+    remaining = load
+    for i, k in enumerate(merit_order):
+        quote = 0.0
+        if pmin[k] <= remaining:
+            quote = min(remaining, pmax[k])
+        else:
+            # redistribute: we try to take the least load from a less expensive plant to fulfill pmin
+            required_load = pmin[k] - remaining
+            j = i
+            while j > 0:
+                j -= 1
+                prev = merit_order[j]
+                if load_plan[prev] - required_load > pmin[prev]:
+                    load_plan[prev] -= required_load
+                    remaining += required_load
+                    quote = pmin[k]
+                    break
+        load_plan[k] += quote
+        remaining -= quote
+        if not remaining:
+            break
+    return load - remaining
+
+
+class Session:
+    """Solve the same fleet for a sequence of loads.
+
+    The session keeps the plants and merit order of `prepare_input` and the last load plan. When that plan is a plain
+    merit order fill - the cheapest plants at pmax, one marginal plant in between its pmin and pmax and the rest off -
+    and the new load can be absorbed by the marginal plant, `resolve` only moves that plant:
+
+        session = Session(*prepare_input(config))
+        session.resolve(new_load)
+    """
+
+    def __init__(self, load, plants, merit_order):
+        self.plants = plants
+        self.merit_order = merit_order
+        self.marginal = None
+        self.resolve(load)
+
+    def resolve(self, load):
+        """Return the load plan for another load, in the format of `distribute_load`."""
+        if self.marginal is not None:
+            name, before = self.marginal
+            quote = load - before
+            plant = self.plants[name]
+            if 0 < quote and plant.pmin <= quote <= plant.pmax:
+                self.load_plan[name] = quote
+                self.load = load
+                return self.plan()
+
+        self.marginal = None
+        self.load_plan = {name: 0.0 for name in self.plants}
+        allocated = allocate_load(load, self.load_plan, self.plants, self.merit_order)
+        if not math.isclose(allocated, load):
+            raise Exception('Unable to distribute load: load=%s, allocated=%s' % (load, allocated))
+        self.load = load
+        self.marginal = self._find_marginal()
+        return self.plan()
+
+    def plan(self):
+        """Return the load plan of the last load, in the format of `distribute_load`."""
+        return [{'name': name, 'p': p} for name, p in self.load_plan.items()]
+
+    def _find_marginal(self):
+        before = 0.0
+        for i, name in enumerate(self.merit_order):
+            plant = self.plants[name]
+            p = self.load_plan[name]
+            if p == plant.pmax:
+                before += p
+                continue
+            if p > 0 and p >= plant.pmin and not any(self.load_plan[n] for n in self.merit_order[i + 1:]):
+                return name, before
+            return None
+        return None
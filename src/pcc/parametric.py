@@ -0,0 +1,174 @@
+"""Parametric version of the naive engine: the load plan as a function of the load.
+
+For a fixed fleet and fuels every decision `naive.allocate_load` takes is a comparison of an affine function of the
+load with a constant, so the load plan is piecewise linear in the load. `DispatchCurve` runs the algorithm once per
+interval with affine quantities `(a, b)` = a + b * load, and splits an interval wherever one of the comparisons changes
+sign inside it, until no interval has to be split anymore. Because pmin commitments make the curve jump, the plan at
+the breakpoints themselves is solved separately with the naive algorithm.
+
+Afterwards any load is answered with a bisect over the breakpoints and the affine plan of its interval:
+
+    curve = DispatchCurve(*prepare_input(config)[1:])
+    curve.dispatch(load)
+    curve.cost(load)
+"""
+import logging
+import math
+from bisect import bisect_left
+from dataclasses import dataclass
+
+from .cache import LRUCache, fleet_key
+from .naive import allocate_load, prepare_input
+
+
+logger = logging.getLogger(__name__)
+
+curve_cache = LRUCache.from_env('PCC_CURVE_CACHE', maxsize=16, ttl=300, name='parametric.curve')
+
+ZERO = (0.0, 0.0)
+
+
+def distribute_load(config):
+    """Same result as `naive.distribute_load`, answered from the cached dispatch curve of the fleet."""
+    load, plants, merit_order = prepare_input(config)
+    key = fleet_key(config['fuels'], config['powerplants'])
+    curve = curve_cache.get(key)
+    if curve is None:
+        curve = curve_cache.put(key, DispatchCurve(plants, merit_order))
+    return curve.dispatch(load)
+
+
+@dataclass
+class Segment:
+    """The open interval (lo, hi) of the load, with the plan p = a + b * load of every plant in it."""
+    lo: float
+    hi: float
+    a: list
+    b: list
+    feasible: bool
+    cost_a: float = 0.0
+    cost_b: float = 0.0
+
+
+class DispatchCurve:
+
+    def __init__(self, plants, merit_order):
+        self.plants = plants
+        self.merit_order = merit_order
+        self.names = list(plants)
+        self.capacity = sum(p.pmax for p in plants.values())
+        self.segments = self._build_segments(0.0, self.capacity)
+        self.breakpoints = [s.lo for s in self.segments] + [self.capacity]
+        self.points = [self._solve_point(load) for load in self.breakpoints]
+        logger.debug('DispatchCurve: %s plants, %s segments', len(plants), len(self.segments))
+
+    def dispatch(self, load):
+        """Return the load plan for load, in the format of `naive.distribute_load`."""
+        plan = self._plan(load)
+        return [{'name': name, 'p': p} for name, p in zip(self.names, plan)]
+
+    def cost(self, load):
+        """Return the total cost of the load plan for load, O(log n) in between the breakpoints."""
+        i = bisect_left(self.breakpoints, load)
+        if 0 < i < len(self.breakpoints) and self.breakpoints[i] != load and self.segments[i - 1].feasible:
+            segment = self.segments[i - 1]
+            return segment.cost_a + segment.cost_b * load
+        plan = self._plan(load)
+        return sum(self.plants[name].cost * p for name, p in zip(self.names, plan))
+
+    def _plan(self, load):
+        i = bisect_left(self.breakpoints, load)
+        if i < len(self.breakpoints) and self.breakpoints[i] == load:
+            plan = self.points[i]
+        elif 0 < i < len(self.breakpoints):
+            segment = self.segments[i - 1]
+            plan = [a + b * load for a, b in zip(segment.a, segment.b)] if segment.feasible else None
+        else:
+            plan = None
+        if plan is None:
+            raise Exception('Unable to distribute load: load=%s, allocated=%s' % (load, self._allocated(load)))
+        return plan
+
+    def _allocated(self, load):
+        load_plan = {name: 0.0 for name in self.plants}
+        return allocate_load(load, load_plan, self.plants, self.merit_order)
+
+    def _solve_point(self, load):
+        load_plan = {name: 0.0 for name in self.plants}
+        allocated = allocate_load(load, load_plan, self.plants, self.merit_order)
+        if not math.isclose(allocated, load):
+            return None
+        return [load_plan[name] for name in self.names]
+
+    def _build_segments(self, lo, hi):
+        segments = []
+        intervals = [(lo, hi)]
+        while intervals:
+            lo, hi = intervals.pop()
+            roots = []
+            plan, remaining = self._allocate(lo, hi, roots)
+            if roots:
+                bounds = [lo] + sorted(set(roots)) + [hi]
+                intervals.extend(zip(bounds[:-1], bounds[1:]))
+                continue
+            a = [plan[name][0] for name in self.names]
+            b = [plan[name][1] for name in self.names]
+            feasible = remaining[1] == 0 and math.isclose(remaining[0], 0.0, abs_tol=1e-9)
+            segment = Segment(lo, hi, a, b, feasible)
+            if feasible:
+                segment.cost_a = sum(self.plants[name].cost * p for name, p in zip(self.names, a))
+                segment.cost_b = sum(self.plants[name].cost * p for name, p in zip(self.names, b))
+            segments.append(segment)
+        segments.sort(key=lambda s: s.lo)
+        return segments
+
+    def _allocate(self, lo, hi, roots):
+        """`naive.allocate_load` with affine quantities, for the loads in between lo and hi.
+
+        Every comparison is decided at the middle of the interval. When the compared quantity changes sign in the
+        interval, the load where it does is added to roots.
+        """
+        mid = (lo + hi) / 2.0
+
+        def sign(x):
+            a, b = x
+            if b:
+                t = -a / b
+                if lo + 1e-9 * max(1.0, abs(lo)) < t < hi - 1e-9 * max(1.0, abs(hi)):
+                    roots.append(t)
+            return a + b * mid
+
+        load_plan = {name: ZERO for name in self.plants}
+        remaining = (0.0, 1.0)
+        for i, plant_id in enumerate(self.merit_order):
+            plant = self.plants[plant_id]
+            quote = ZERO
+            if sign(_sub(remaining, (plant.pmin, 0.0))) >= 0:
+                quote = remaining if sign(_sub(remaining, (plant.pmax, 0.0))) <= 0 else (plant.pmax, 0.0)
+            else:
+                required_load = _sub((plant.pmin, 0.0), remaining)
+                j = i
+                while j > 0:
+                    j -= 1
+                    id_ = self.merit_order[j]
+                    prev_plant = self.plants[id_]
+                    prev_allocation = load_plan[id_]
+                    if sign(_sub(_sub(prev_allocation, required_load), (prev_plant.pmin, 0.0))) > 0:
+                        load_plan[id_] = _sub(prev_allocation, required_load)
+                        remaining = _add(remaining, required_load)
+                        quote = (plant.pmin, 0.0)
+                        break
+            load_plan[plant_id] = _add(load_plan[plant_id], quote)
+            remaining = _sub(remaining, quote)
+            if remaining[1] == 0 and math.isclose(remaining[0], 0.0, abs_tol=1e-9):
+                break
+            sign(remaining)
+        return load_plan, remaining
+
+
+def _add(x, y):
+    return x[0] + y[0], x[1] + y[1]
+
+
+def _sub(x, y):
+    return x[0] - y[0], x[1] - y[1]
@@ -0,0 +1,286 @@
+"""Solve in a pool of pre-forked solver processes, with a deadline per solve.
+
+A solver that misses its deadline is killed and replaced, so a solve that hangs - e.g. a cycling simplex - costs one
+solver process for `timeout` seconds instead of a whole HTTP worker until gunicorn kills it.
+
+`SolverPool` is a pool in the current process. To share one pool between all HTTP workers, `gunicorn_conf.py` starts
+`serve` in a separate process before the workers are forked, and the workers send their solves to it with a
+`PoolClient` over the unix socket PCC_SOLVER_SOCKET. `get_pool` returns whatever is configured:
+
+- PCC_SOLVER_SOCKET: the socket of a shared pool, set by `gunicorn_conf.py`
+- PCC_SOLVER_PROCESSES: the size of the pool, default the number of cores; 0 solves in the request thread
+- PCC_SOLVE_TIMEOUT: the deadline of a solve in seconds, default 30
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.reduction import ForkingPickler
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+SOLVE_TIMEOUT = float(os.getenv('PCC_SOLVE_TIMEOUT', 30))
+
+# imported once by the forkserver and shared by all solvers, instead of on the first solve of every solver
+PRELOAD = ['pcc.lib', 'pcc.bnb', 'pcc.bounded', 'pcc.multiperiod', 'pcc.scenarios']
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolBusy(PoolError):
+    """No solver became available before the deadline."""
+
+
+class SolveTimeout(PoolError):
+    """The solver did not finish before the deadline, it has been killed."""
+
+
+class Solver:
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class SolverPool:
+    """A fixed number of solver processes; `solve` may be called from many threads at once."""
+
+    def __init__(self, size=None, timeout=SOLVE_TIMEOUT):
+        self.size = size or os.cpu_count()
+        self.timeout = timeout
+        self._context = multiprocessing.get_context('forkserver')
+        self._context.set_forkserver_preload(PRELOAD)
+        self._idle = queue.Queue()
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+        logger.debug('SolverPool: started %s solvers', self.size)
+
+    def solve(self, function, *args, timeout=None):
+        """Return function(*args), computed by one of the solvers. function must be importable by its name.
+
+        Every solver that is taken from the pool goes back to it, or is replaced when it may be out of step: after a
+        timeout, a broken pipe, or any other error while the solve is underway.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        # pickled before a solver is taken: an argument that can not be pickled does not cost a solver
+        data = ForkingPickler.dumps((function, args))
+        try:
+            solver = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolBusy(f'No solver available within {timeout} s')
+        try:
+            solver.conn.send_bytes(data)
+            if not solver.conn.poll(max(0.0, deadline - time.monotonic())):
+                logger.warning('SolverPool: solver %s missed its deadline of %s s', solver.process.pid, timeout)
+                raise SolveTimeout(f'Solve did not finish within {timeout} s')
+            data = solver.conn.recv_bytes()
+        except BaseException as e:
+            self._replace(solver)
+            if isinstance(e, (EOFError, OSError)):
+                raise PoolError(f'Solver died: {e!r}')
+            raise
+        self._idle.put(solver)
+        try:
+            status, value = pickle.loads(data)
+        except Exception as e:
+            # e.g. an exception whose __init__ takes other arguments than its args
+            raise Exception(f'Unable to unpickle the result of {function.__name__}: {e!r}')
+        if status == 'error':
+            raise value
+        return value
+
+    def close(self):
+        while True:
+            try:
+                solver = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            solver.process.kill()
+            solver.process.join()
+            solver.conn.close()
+            metrics.mark_process_dead(solver.process.pid)
+
+    def _spawn(self):
+        conn, child_conn = self._context.Pipe()
+        level = logging.getLogger('pcc').getEffectiveLevel()
+        process = self._context.Process(target=_run_solver, args=(child_conn, level), daemon=True)
+        process.start()
+        child_conn.close()
+        return Solver(process, conn)
+
+    def _replace(self, solver):
+        solver.process.kill()
+        solver.process.join()
+        solver.conn.close()
+        metrics.mark_process_dead(solver.process.pid)
+        self._idle.put(self._spawn())
+
+
+def _run_solver(conn, level=logging.WARNING):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # log at the level of the pool
+    logging.getLogger('pcc').setLevel(level)
+    while True:
+        try:
+            function, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = ('ok', function(*args))
+        except Exception as e:
+            result = ('error', e)
+        try:
+            conn.send(result)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            conn.send(('error', Exception(str(result[1]))))
+
+
+class PoolClient:
+    """Solves in the shared pool of `serve`, with the same `solve` as `SolverPool`."""
+
+    # seconds past the deadline of a solve to wait for the answer of the pool
+    grace = 5
+
+    def __init__(self, path, timeout=SOLVE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+
+    def solve(self, function, *args, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                # the pool enforces the deadline, this only guards against a pool that does not answer at all
+                sock.settimeout(timeout + self.grace)
+                sock.connect(self.path)
+                _send(sock, (function, args, timeout))
+                status, value = _recv(sock)
+        except socket.timeout:
+            raise SolveTimeout(f'Solver pool did not answer within {timeout + self.grace} s')
+        except OSError as e:
+            raise PoolBusy(f'Solver pool unavailable: {e!r}')
+        if status == 'error':
+            raise value
+        return value
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        function, args, timeout = _recv(self.request)
+        try:
+            result = ('ok', self.server.pool.solve(function, *args, timeout=timeout))
+        except Exception as e:
+            result = ('error', e)
+        _send(self.request, result)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path, size=None, timeout=SOLVE_TIMEOUT):
+    """Run a `SolverPool` behind the unix socket path until SIGTERM."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pool = SolverPool(size, timeout)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = _Server(path, _Handler)
+    os.chmod(path, 0o600)
+    server.pool = pool
+    signal.signal(signal.SIGTERM, lambda *args: threading.Thread(target=server.shutdown).start())
+    logger.info('solver pool of %s processes listening on %s', pool.size, path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+        pool.close()
+
+
+def start_server(path, size=None, timeout=SOLVE_TIMEOUT):
+    """Start `serve` in a new process and wait until it accepts solves. Stop it with `terminate()`."""
+    if os.path.exists(path):
+        os.unlink(path)
+    args = [sys.executable, '-m', 'pcc.pool', path, '--timeout', str(timeout)]
+    if size:
+        args += ['--processes', str(size)]
+    process = subprocess.Popen(args)
+    while not os.path.exists(path):
+        if process.poll() is not None:
+            raise PoolError(f'Solver pool did not start, exit code {process.returncode}')
+        time.sleep(0.05)
+    return process
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The pool configured in the environment, see the module docstring, or None to solve in the request thread."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                path = os.getenv('PCC_SOLVER_SOCKET')
+                size = os.getenv('PCC_SOLVER_PROCESSES')
+                if path:
+                    _pool = PoolClient(path)
+                elif size is not None and int(size) > 0:
+                    _pool = SolverPool(int(size))
+                else:
+                    _pool = False
+    return _pool or None
+
+
+def _send(sock, obj):
+    data = pickle.dumps(obj)
+    sock.sendall(struct.pack('!I', len(data)) + data)
+
+
+def _recv(sock):
+    size, = struct.unpack('!I', _recv_exactly(sock, 4))
+    return pickle.loads(_recv_exactly(sock, size))
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError('connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a pool of solver processes behind a unix socket.')
+    parser.add_argument('path', help='the unix socket')
+    parser.add_argument('--processes', type=int, default=None, help='number of solvers, default the number of cores')
+    parser.add_argument('--timeout', type=float, default=SOLVE_TIMEOUT, help='default deadline of a solve, in s')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args.path, args.processes, args.timeout)
+
+
+if __name__ == '__main__':
+    # run the pcc.pool module, not __main__, so that its exceptions can be unpickled by the clients
+    from pcc import pool
+    pool.main()
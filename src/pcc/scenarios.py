@@ -0,0 +1,302 @@
+"""Monte Carlo sweep of the dispatch cost of one fleet over many fuel price and wind scenarios.
+
+A sweep takes the powerplants and load of a /productionplan payload plus, instead of "fuels", either a list of
+scenarios - fuels dicts, optionally with their own "load" - or a sampler that draws them:
+
+    {
+        "load": 910,
+        "powerplants": [...],
+        "sampler": {
+            "n": 10000,
+            "seed": 1,
+            "gas(euro/MWh)": {"normal": [13.4, 2]},
+            "kerosine(euro/MWh)": {"uniform": [40, 60]},
+            "co2(euro/ton)": 20,
+            "wind(%)": {"triangular": [0, 60, 100]}
+        },
+        "plans": false
+    }
+
+A value of the sampler is a number, or one of {"uniform": [low, high]}, {"normal": [mean, std]},
+{"lognormal": [mean, sigma]} (of the log) or {"triangular": [left, mode, right]}; samples are clipped to >= 0 and the
+wind(%) to <= 100.
+
+The scenarios are solved in chunks. For a chunk the cost and wind derating of `pcc.util.Plant` are computed for all
+scenarios at once with NumPy, and every scenario is then dispatched with `pcc.naive.allocate_fleet`. `sweep` yields the
+result of every scenario as soon as its chunk is done - in no particular order - with its cost and, with "plans", its
+production plan; `Summary` gives the statistics of the costs. Run it from the command line with a process pool:
+
+    python -m pcc.scenarios sweep.json --processes 4 --summary
+
+or post the same json to /productionplan/scenarios, which solves the chunks in the solver pool, see `pcc.pool`.
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .naive import allocate_fleet
+from .util import Fleet, fuel_key, plant_types
+
+
+logger = logging.getLogger(__name__)
+
+FUELS = tuple(fuel_key.values())
+# the column of the price of every plant type in the scenario matrix
+TYPE_COLUMNS = [FUELS.index(fuel_key[t]) for t in plant_types]
+WIND = plant_types.index('windturbine')
+
+CHUNK_SIZE = 256
+
+DISTRIBUTIONS = {
+    'uniform': 2,
+    'normal': 2,
+    'lognormal': 2,
+    'triangular': 3,
+}
+
+
+def sample(sampler, n=None, seed=None, limit=None):
+    """Return the scenario matrix (n x 4, columns in the order of FUELS) and the loads (or None) drawn by sampler."""
+    if not isinstance(sampler, dict):
+        raise ValueError(f'sampler: must be an object, got {sampler!r}')
+    n = sampler.get('n') if n is None else n
+    if isinstance(n, bool) or not isinstance(n, int) or n < 1:
+        raise ValueError(f'sampler.n: must be an integer >= 1, got {n!r}')
+    if limit is not None and n > limit:
+        raise ValueError(f'sampler.n: must be <= {limit}, got {n}')
+    seed = sampler.get('seed') if seed is None else seed
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        raise ValueError(f'sampler.seed: must be an integer >= 0, got {seed!r}')
+    rng = np.random.default_rng(seed)
+    prices = np.empty((n, len(FUELS)))
+    for j, key in enumerate(FUELS):
+        if key not in sampler:
+            raise ValueError(f'Missing key "sampler.{key}"')
+        prices[:, j] = _draw(rng, sampler[key], n, f'sampler.{key}')
+    loads = _draw(rng, sampler['load'], n, 'sampler.load') if 'load' in sampler else None
+    return _clip(prices), loads
+
+
+def _draw(rng, spec, n, where):
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        return np.full(n, float(spec))
+    if not isinstance(spec, dict) or len(spec) != 1:
+        raise ValueError(f'{where}: must be a number or a distribution, one of {", ".join(DISTRIBUTIONS)}')
+    (name, args), = spec.items()
+    if DISTRIBUTIONS.get(name) != (len(args) if isinstance(args, list) else None):
+        raise ValueError(f'{where}: expected {{"{name}": [{DISTRIBUTIONS.get(name, "?")} numbers]}}, got {spec!r}')
+    try:
+        return np.maximum(getattr(rng, name)(*args, size=n), 0.0)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'{where}: {e}')
+
+
+def _clip(prices):
+    wind = FUELS.index(fuel_key['windturbine'])
+    prices[:, wind] = np.minimum(prices[:, wind], 100.0)
+    return prices
+
+
+def scenario_matrix(scenarios, load):
+    """Return the scenario matrix and the loads of a list of fuels dicts, each with an optional "load"."""
+    if not isinstance(scenarios, list) or not scenarios:
+        raise ValueError('scenarios: must be a non-empty list')
+    prices = np.empty((len(scenarios), len(FUELS)))
+    loads = np.empty(len(scenarios))
+    for i, scenario in enumerate(scenarios):
+        for j, key in enumerate(FUELS):
+            value = scenario.get(key) if isinstance(scenario, dict) else None
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not value >= 0:
+                raise ValueError(f'scenarios[{i}].{key}: must be a number >= 0, got {value!r}')
+            prices[i, j] = value
+        value = scenario.get('load', load)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or not value >= 0):
+            raise ValueError(f'scenarios[{i}].load: must be a number >= 0, got {value!r}')
+        loads[i] = np.nan if value is None else value
+    return _clip(prices), loads
+
+
+def prepare(payload, n=None, seed=None, limit=None):
+    """Return the fleet columns, scenario matrix and loads of a sweep payload, see the module docstring.
+
+    Raise a ValueError when the payload is not valid, or has more than limit scenarios.
+    """
+    load = payload.get('load')
+    if load is not None and (isinstance(load, bool) or not isinstance(load, (int, float)) or not load >= 0):
+        raise ValueError(f'load: must be a number >= 0, got {load!r}')
+    if 'scenarios' in payload:
+        prices, loads = scenario_matrix(payload['scenarios'], load)
+        if limit is not None and len(prices) > limit:
+            raise ValueError(f'scenarios: must have at most {limit} scenarios, got {len(prices)}')
+    elif 'sampler' in payload:
+        prices, loads = sample(payload['sampler'], n, seed, limit)
+        if loads is None:
+            loads = np.full(len(prices), load if load is not None else np.nan)
+    else:
+        raise ValueError('Missing key "scenarios" or "sampler"')
+    if np.isnan(loads).any():
+        raise ValueError('Missing key "load"')
+    return fleet_columns(payload['powerplants']), prices, loads
+
+
+def fleet_columns(powerplants):
+    """The names and the type, efficiency, pmin and pmax columns of powerplants, before any fuels are applied."""
+    return (
+        [d['name'] for d in powerplants],
+        np.array([plant_types.index(d['type']) for d in powerplants], dtype=np.int8),
+        np.array([d.get('efficiency', 1.0) for d in powerplants], dtype=float),
+        np.array([d.get('pmin', 0.0) for d in powerplants], dtype=float),
+        np.array([d.get('pmax', 0.0) for d in powerplants], dtype=float),
+    )
+
+
+def derate(columns, prices):
+    """Return the pmin (plants), pmax and cost (scenarios x plants) of the fleet in every scenario.
+
+    The rules of `Plant.__post_init__`, for all scenarios at once: a windturbine costs nothing and its pmax is scaled
+    by the wind(%) and rounded to 0.1 MW, a plant with an efficiency <= 0 is excluded.
+    """
+    _, types, efficiency, pmin, pmax = columns
+    wind = types == WIND
+    burns = efficiency > 0
+    price = prices[:, TYPE_COLUMNS][:, types]
+    cost = np.where(wind, 0.0, np.where(burns, price / np.where(burns, efficiency, 1.0), 10**10))
+    scenario_pmax = np.where(wind, _round1(pmax * (price / 100.0)), np.where(burns, pmax, 0.0))
+    return np.where(wind | burns, pmin, 0.0), scenario_pmax, cost
+
+
+def _round1(x):
+    # round(x, 1) for every element: np.round rounds x * 10, which is inexact for e.g. 75.65 (756.5 after scaling)
+    rounded = np.round(x, 1)
+    scaled = x * 10
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(v, 1) for v in x[near_half].tolist()]
+    return rounded
+
+
+def solve_chunk(start, columns, prices, loads, plans=False):
+    """Return the results of the scenarios start, start + 1, ... of prices and loads."""
+    names, types, efficiency, _, _ = columns
+    pmin, pmax, cost = derate(columns, prices)
+    merit_orders = np.argsort(cost, axis=1, kind='stable')
+    types = array('b', types.tobytes())
+    efficiency = array('d', efficiency.tobytes())
+    pmin = array('d', pmin.tobytes())
+    results = []
+    for i in range(len(prices)):
+        fleet = Fleet(names, types, efficiency, pmin, array('d', pmax[i].tobytes()), array('d', cost[i].tobytes()))
+        load = float(loads[i])
+        load_plan = array('d', bytes(8 * len(fleet)))
+        allocated = allocate_fleet(load, load_plan, fleet, merit_orders[i].tolist())
+        result = {'scenario': start + i, 'load': load, 'fuels': dict(zip(FUELS, prices[i].tolist()))}
+        if math.isclose(allocated, load):
+            result['cost'] = float(np.dot(load_plan, cost[i]))
+            if plans:
+                result['plan'] = [{'name': name, 'p': p} for name, p in zip(names, load_plan)]
+        else:
+            result['error'] = 'Unable to distribute load: load=%s, allocated=%s' % (load, allocated)
+        results.append(result)
+    return results
+
+
+def sweep(columns, prices, loads, plans=False, chunk_size=CHUNK_SIZE, submit=None, window=8):
+    """Yield the result of every scenario, see the module docstring.
+
+    Without submit the chunks are solved here, one after the other. Otherwise submit(solve_chunk, *args) must return
+    a `concurrent.futures.Future`, e.g. the submit of a process pool; at most window chunks are submitted ahead.
+    """
+    logger.debug('sweep: %s scenarios in chunks of %s', len(prices), chunk_size)
+    chunks = ((start, columns, prices[start:start + chunk_size], loads[start:start + chunk_size], plans)
+              for start in range(0, len(prices), chunk_size))
+    if submit is None:
+        for chunk in chunks:
+            yield from solve_chunk(*chunk)
+        return
+    pending = set()
+    try:
+        for chunk in chunks:
+            pending.add(submit(solve_chunk, *chunk))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class Summary:
+    """Statistics of the dispatch costs of the results of a sweep."""
+
+    PERCENTILES = (5, 25, 50, 75, 95)
+
+    def __init__(self):
+        self.costs = array('d')
+        self.infeasible = 0
+
+    def add(self, result):
+        if 'cost' in result:
+            self.costs.append(result['cost'])
+        else:
+            self.infeasible += 1
+        return result
+
+    def to_dict(self):
+        summary = {'scenarios': len(self.costs) + self.infeasible, 'infeasible': self.infeasible}
+        if self.costs:
+            costs = np.frombuffer(self.costs, dtype=float)
+            summary.update(mean=float(costs.mean()), std=float(costs.std()), min=float(costs.min()),
+                           max=float(costs.max()))
+            for p, value in zip(self.PERCENTILES, np.percentile(costs, self.PERCENTILES)):
+                summary[f'p{p}'] = float(value)
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sweep the dispatch cost of a fleet over fuel and wind scenarios.')
+    parser.add_argument('payload', help='json with "powerplants", "load" and "scenarios" or "sampler"')
+    parser.add_argument('--samples', type=int, help='number of scenarios to draw, overrides sampler.n')
+    parser.add_argument('--seed', type=int, help='overrides sampler.seed')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='0 solves in this process')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--plans', action='store_true', help='include the production plan of every scenario')
+    parser.add_argument('--summary', action='store_true', help='only print the summary')
+    args = parser.parse_args(argv)
+
+    logging.getLogger('pcc').setLevel(logging.WARNING)
+    with open(args.payload) as f:
+        payload = json.load(f)
+    columns, prices, loads = prepare(payload, args.samples, args.seed)
+    plans = args.plans or payload.get('plans', False)
+    summary = Summary()
+    executor = None
+    if args.processes:
+        executor = ProcessPoolExecutor(args.processes, mp_context=multiprocessing.get_context('forkserver'))
+    try:
+        results = sweep(columns, prices, loads, plans, args.chunk_size, executor and executor.submit,
+                        window=2 * (args.processes or 1))
+        for result in results:
+            summary.add(result)
+            if not args.summary:
+                print(json.dumps(result))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    print(json.dumps({'summary': summary.to_dict()}))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
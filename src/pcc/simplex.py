@@ -1,16 +1,33 @@
+import heapq
 import logging
 import math
+import os
 
+from . import metrics, trace
+from .cache import LRUCache, fleet_key
 from .util import Plant
 
 
 logger = logging.getLogger(__name__)
 
+prepare_cache = LRUCache.from_env('PCC_PREPARE_CACHE', maxsize=64, ttl=300, name='simplex.prepare')
 
-def distribute_load(config):
+# the defaults of `inner_simplex`, see there
+PRICING = os.getenv('PCC_SIMPLEX_PRICING', 'steepest-edge')
+MAX_ITERATIONS = int(os.getenv('PCC_SIMPLEX_MAX_ITERATIONS', 0)) or None
+DEGENERATE_LIMIT = int(os.getenv('PCC_SIMPLEX_DEGENERATE_LIMIT', 20))
+
+
+class IterationLimit(Exception):
+    """The simplex did not reach the optimum within its iteration limit."""
+
+
+def distribute_load(config, stats=None):
+    stats = trace.SolveStats() if stats is None else stats
     load, plants = prepare_input(config)
     logger.debug('distribute_load: load=%s', load)
-    load_plan = allocate_load(load, plants)
+    load_plan = allocate_load(load, plants, stats=stats)
+    metrics.simplex_pivots.labels('simplex').observe(stats.pivots)
     logger.debug('load_plan = %s', load_plan)
     allocated = sum(load_plan.values())
     if not math.isclose(allocated, load):
@@ -19,99 +36,149 @@ def distribute_load(config):
 
 
 def prepare_input(config):
+    """Return the load and the plant table of config.
+
+    The plant table is cached on the fuels and powerplants, so it is shared between calls and must
+    not be modified.
+    """
     fuels = config['fuels']
-    plants = {d['name']: Plant(**d, fuels=fuels) for d in config['powerplants']}
-    logger.debug('plants: %s', plants)
+    key = fleet_key(fuels, config['powerplants'])
+    plants = prepare_cache.get(key)
+    if plants is None:
+        plants = {d['name']: Plant(**d, fuels=fuels) for d in config['powerplants']}
+        logger.debug('plants: %s', plants)
+        prepare_cache.put(key, plants)
     return config['load'], plants
 
 
-def allocate_load(load, plants):
+def allocate_load(load, plants, stats=None):
     plant_list = [p for p in plants.values() if p.pmax > 0]
 
     c = [p.cost for p in plant_list]
 
+    # every row has a single nonzero: keep the rows sparse, as {column: value}
     constraints = []
     b = []
-    templ = [0 for _ in plant_list]
     for i, p in enumerate(plant_list):
         # p_i <= pmax_i
-        row = templ[:]
-        row[i] = 1
-        constraints.append(row)
+        constraints.append({i: 1})
         b.append(p.pmax)
         # p_i >= pmin_i
         if p.pmin > 0:
-            row = templ[:]
-            row[i] = 1
-            constraints.append(row)
+            constraints.append({i: 1})
             b.append(-p.pmin)  # indicate ">=" with "-"
 
     # # make the Sum(p_i) = load 2 inequalities
-    # constraints.append([1 for _ in plant_list])
+    # constraints.append({i: 1 for i in range(len(plant_list))})
     # b.append(load)
-    # constraints.append([1 for _ in plant_list])
+    # constraints.append({i: 1 for i in range(len(plant_list))})
     # b.append(-load)
 
-    solution = simplex(c, constraints, b)
+    solution = simplex(c, constraints, b, stats=stats)
     load_plan = {name: solution[f'x_{i+1}'] for i, name in enumerate(plants)}
     return load_plan
 
 
-def simplex(c, A, b, minimize=True):
+def simplex(c, A, b, minimize=True, stats=None, pricing=None, max_iterations=None, degenerate_limit=None):
     """
     c are the coefficients of the objective function
-    A is m x n matrix of rank m
+    A is m x n matrix of rank m, as dense rows (lists) or as sparse rows (dicts {j: a_ij} of the nonzeros)
     b is the RHS of the inequalities represented by A
       b > 0 BUT:
       convention: if b_i < 0 it means sum(a_ij, j: 0 -> n) >= b_i (i.e. a "greater than").
+    stats is an optional trace.SolveStats that gets the iteration counters and timings of the solve.
+    pricing, max_iterations and degenerate_limit apply to both phases, see `inner_simplex`.
     """
+    options = dict(pricing=pricing, max_iterations=max_iterations, degenerate_limit=degenerate_limit)
     # Convert to equalities by introducing slack variables:
     m = len(A)
     n = len(c)
     # Basic variables
     B = list(range(n, n + m, 1))
-    print(f'{B=}')
 
     a = []
     for i, row in enumerate(A):
         s = -1 if b[i] < 0 else 1
-        a_i = row[:] + [0 if j != i else s for j in range(m)]
+        a_i = {j: e for j, e in (row.items() if isinstance(row, dict) else enumerate(row)) if e}
+        a_i[n + i] = s
         a.append(a_i)
 
-    print('Phase 1')
-    B, T = initialize_tableau(a, b, c, B, m, n, minimize)
+    with trace.Timer(stats, phase=1):
+        B, T = initialize_tableau(a, b, c, B, m, n, minimize, stats=stats, **options)
 
-    print('Phase 2')
-    solution = inner_simplex(T, B, n)
+    with trace.Timer(stats, phase=2):
+        solution = inner_simplex(T, B, n, stats=stats, **options)
     if not minimize:
         solution['z'] = -solution['z']
     return solution
 
 
-def initialize_tableau(a, b, c, B, m, n, minimize):
-    T = []
+class Tableau:
+    """The simplex tableau, stored sparse.
+
+    rows[i] is a dict {j: value} of the nonzeros of row i; the last row is the objective row and the right hand side is
+    column `rhs`, the last column. columns[j] is the set of the rows - the objective row included - with a nonzero in
+    column j, so that the ratio test and the pivot only visit the rows that have the entering column. The memory is
+    linear in the number of nonzeros instead of rows x columns.
+    """
+
+    def __init__(self, rows, width):
+        self.rows = rows
+        self.width = width
+        self.rhs = width - 1
+        self.columns = [set() for _ in range(width)]
+        for i, row in enumerate(rows):
+            for j in row:
+                self.columns[j].add(i)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        return self.rows[i]
+
+    def get(self, i, j):
+        return self.rows[i].get(j, 0)
+
+    def to_lists(self):
+        """The tableau as dense rows, like the list of lists of the NumPy variant."""
+        return [[row.get(j, 0) for j in range(self.width)] for row in self.rows]
+
+
+def _add_row(target, row, factor=1):
+    """target += factor * row, for sparse rows that are not in a `Tableau`."""
+    for j, value in row.items():
+        new = target.get(j, 0) + factor * value
+        if new:
+            target[j] = new
+        else:
+            target.pop(j, None)
+
+
+def initialize_tableau(a, b, c, B, m, n, minimize, stats=None, **options):
+    rows = []
     # Choose a starting basic feasible solution with basis B
     diagonal = [row[n + i] for i, row in enumerate(a)]
     if not all(e == 1 for e in diagonal):
         # for the diagonal values not equal to 1 we add artificial variables
         art_var_cnt = sum(1 for e in diagonal if e != 1)
-        print(f'{art_var_cnt=}')
+        logger.debug('initialize_tableau: art_var_cnt=%s', art_var_cnt)
+        rhs = m + n + art_var_cnt
         v_i = 0
         for i, row in enumerate(a):
-            v = [0 for _ in range(art_var_cnt)]
+            row = dict(row)
             if diagonal[i] != 1:
                 # add an artificial variable
-                v[v_i] = 1
+                row[m + n + v_i] = 1
                 v_i += 1
             b_i = b[i]
             if b_i < 0:
                 b_i = -b_i
-            T.append(row[:] + v + [b_i])
+            if b_i:
+                row[rhs] = b_i
+            rows.append(row)
         # now the (z_0 - c_i) coefficients (z_0 == 0??)
-        if minimize:
-            T.append([0 for _ in range(m + n)] + [-1 for _ in range(art_var_cnt)] + [0])
-        else:
-            T.append([0 for _ in range(m + n)] + [1 for _ in range(art_var_cnt)] + [0])
+        z = {m + n + k: -1 if minimize else 1 for k in range(art_var_cnt)}
 
         B_art = []
         art_v_idx = 0
@@ -122,100 +189,130 @@ def initialize_tableau(a, b, c, B, m, n, minimize):
                 B_art.append(m + n + art_v_idx)
                 art_v_idx += 1
                 # add this row to the last row to eliminate the coefficients from Z
-                drow = T[i]
-                if minimize:
-                    for j, value in enumerate(T[-1]):
-                        T[-1][j] = value + drow[j]
-                else:
-                    for j, value in enumerate(T[-1]):
-                        T[-1][j] = value - drow[j]
+                _add_row(z, rows[i], 1 if minimize else -1)
+        rows.append(z)
+        T = Tableau(rows, rhs + 1)
 
         try:
-            solution = inner_simplex(T, B_art, n + m)
-        except:
+            solution = inner_simplex(T, B_art, n + m, stats=stats, phase=1, **options)
+        except (IterationLimit, ValueError):
+            raise
+        except Exception:
             raise Exception('No initial feasible solution found')
-        print('Phase 1 solution:', solution)
-        print(f'   {B_art=}')
+        logger.debug('initialize_tableau: phase 1 solution=%s, B_art=%s', solution, B_art)
         # Assert that the artificial variables have been reduced to 0
         if not all(v == 0 for varname, v in solution.items() if varname[0] == 's'):
             raise Exception('No initial feasible solution found, problem set is empty')
 
         # discart everyting "artificial"]
-        for i in range(len(T)):
-            art_row = T[i]
-            row = art_row[:m + n] + [art_row[-1]]
-            T[i] = row
-        T.pop(-1)
+        rows = []
+        for art_row in T.rows[:-1]:
+            row = {j: value for j, value in art_row.items() if j < m + n}
+            if rhs in art_row:
+                row[m + n] = art_row[rhs]
+            rows.append(row)
 
         # now the (z_0 - c_i) coefficients of the original problem
-        if minimize:
-            T.append([-e for e in c] + [0 for _ in range(m)] + [0])
-        else:
-            T.append([e for e in c] + [0 for _ in range(m)] + [0])
+        z = {j: -e if minimize else e for j, e in enumerate(c) if e}
 
         # finally, eliminate the z coefficients for the non slack variables
         # TODO: try to understand why??
         for i, var_i in enumerate(B_art):
             if var_i < n:
-                assert T[i][var_i] == 1
-                row = T[i]
-                factor = -T[-1][var_i]
-                for j, value in enumerate(row):
-                    T[-1][j] += factor * value
+                assert rows[i][var_i] == 1
+                factor = -z.get(var_i, 0)
+                if factor:
+                    _add_row(z, rows[i], factor)
 
         B = B_art
     else:
         # We have a feasible solution where all non basic variables are 0 and
         # the basic variables == b
         for i, row in enumerate(a):
+            row = dict(row)
             b_i = b[i]
             if b_i < 0:
                 b_i = -b_i
-            T.append(row[:] + [b_i])
+            if b_i:
+                row[m + n] = b_i
+            rows.append(row)
 
         # now the (z_0 - c_i) coefficients (z_0 == 0??)
-        if minimize:
-            T.append([-e for e in c] + [0 for _ in range(m)] + [0])
-        else:
-            T.append([e for e in c] + [0 for _ in range(m)] + [0])
+        z = {j: -e if minimize else e for j, e in enumerate(c) if e}
+
+    rows.append(z)
+    return B, Tableau(rows, m + n + 1)
 
-    return B, T
 
+def inner_simplex(T, B, n, stats=None, phase=2, pricing=None, max_iterations=None, degenerate_limit=None):
+    """Pivot T to the optimum and return the solution.
 
-def inner_simplex(T, B, n):
-    dump_t(T, B)
+    pricing is the name of the rule that picks the entering column, one of `PRICING_RULES`. After degenerate_limit
+    degenerate pivots in a row - pivots that do not move the solution - Bland's rule takes over until a pivot moves it
+    again, so the simplex cannot cycle; 0 turns the fallback off. After max_iterations pivots, by default 50 x the rows
+    and columns of T, it raises an `IterationLimit`. The defaults come from PCC_SIMPLEX_PRICING,
+    PCC_SIMPLEX_MAX_ITERATIONS and PCC_SIMPLEX_DEGENERATE_LIMIT.
+    """
+    pricing = PRICING if pricing is None else pricing
+    if pricing not in PRICING_RULES:
+        raise ValueError(f'pricing: must be one of {", ".join(PRICING_RULES)}, got {pricing!r}')
+    max_iterations = max_iterations or MAX_ITERATIONS or 50 * (len(T) + T.width)
+    degenerate_limit = DEGENERATE_LIMIT if degenerate_limit is None else degenerate_limit
+    rule = PRICING_RULES[pricing](T)
+    fallback = None
+    if trace.subscribers:
+        trace.emit('tableau', phase=phase, iteration=0, T=T.to_lists(), B=B)
 
     # Iterate towards optimal solution
     finished = False
     iteration = 0
+    degenerate_run = 0
+    objective = len(T) - 1
     while not finished:
-        print(f'{iteration=}')
-        enter_j = max_index(T[-1][:-1])
-        if T[-1][enter_j] <= 0:
-            print('Found optimal solution')
+        active = rule
+        if degenerate_limit and degenerate_run >= degenerate_limit:
+            if fallback is None:
+                logger.debug('inner_simplex: %s degenerate pivots, falling back to bland', degenerate_run)
+                fallback = Bland(T)
+            active = fallback
+        enter_j = active.entering()
+        if enter_j is None:
             finished = True
-        elif all(e <= 0 for e in [row[enter_j] for row in T[:-1]]):
+        elif all(T.rows[i][enter_j] <= 0 for i in T.columns[enter_j] if i != objective):
             raise Exception('Problem is unbounded')
+        elif iteration >= max_iterations:
+            raise IterationLimit(f'No optimal solution after {iteration} iterations')
         else:
-            leave_i = determine_leaving_variable(T, enter_j)
-            print(f'{leave_i=}')
-            print(f'{enter_j=}')
+            leave_i = active.leaving(enter_j, B)
+            degenerate = T.get(leave_i, T.rhs) == 0
+            degenerate_run = degenerate_run + 1 if degenerate else 0
+            if trace.subscribers:
+                trace.emit('pivot', phase=phase, iteration=iteration, leave_i=leave_i, enter_j=enter_j,
+                           pivot=T.rows[leave_i][enter_j], degenerate=degenerate, rule=active.name)
             pivot(T, B, leave_i, enter_j)
             # Keep track of the basic variables
             B[leave_i] = enter_j
-            dump_t(T, B)
             iteration += 1
+            if stats is not None:
+                stats.count_iteration(phase)
+                stats.pivots += 1
+                stats.degenerate_pivots += degenerate
+                stats.fallback_pivots += active is fallback
+            if trace.subscribers:
+                trace.emit('tableau', phase=phase, iteration=iteration, T=T.to_lists(), B=B)
+    if trace.subscribers:
+        trace.emit('optimal', phase=phase, iterations=iteration)
 
     # gather results
     solution = {}
-    result = dict(((B[i], T[i][-1]) for i in range(len(B))))
-    for i in range(len(T[0]) - 1):
+    result = dict(((B[i], T.get(i, T.rhs)) for i in range(len(B))))
+    for i in range(T.width - 1):
         if i < n:
             variable = f'x_{i+1}'
         else:
             variable = f's_{i-n+1}'
         solution[variable] = result.get(i, 0.0)
-    solution['z'] = T[-1][-1]
+    solution['z'] = T.get(objective, T.rhs)
 
     return solution
 
@@ -235,31 +332,50 @@ def is_identity(A, n):
 
 
 def pivot(T, B, leave_i, enter_j):
-    pivot = float(T[leave_i][enter_j])  # make sure we don't do interger division!
-    print(f'{pivot=}')
+    """Pivot on T[leave_i][enter_j], visiting only the rows with a nonzero in column enter_j."""
+    rows, columns = T.rows, T.columns
+    leaving_row = rows[leave_i]
+    pivot = float(leaving_row[enter_j])  # make sure we don't do interger division!
     assert pivot != 0
 
     # devide row T[leave_i] by pivot
-    for j, value in enumerate(T[leave_i]):
-        T[leave_i][j] = value / pivot
+    for j, value in leaving_row.items():
+        leaving_row[j] = value / pivot
 
-    # all other rows: subtract
-    leaving_row = T[leave_i]
-    for i, row in enumerate(T):
+    # all other rows with a nonzero in the entering column: subtract
+    for i in list(columns[enter_j]):
         if i == leave_i:
             continue
+        row = rows[i]
         factor = row[enter_j]
-        for j, value in enumerate(row):
-            row[j] = value - factor * leaving_row[j]
+        for j, value in leaving_row.items():
+            if j in row:
+                new = row[j] - factor * value
+                if new:
+                    row[j] = new
+                else:
+                    del row[j]
+                    columns[j].discard(i)
+            else:
+                new = 0 - factor * value
+                if new:
+                    row[j] = new
+                    columns[j].add(i)
+
 
+def determine_leaving_variable(T, enter_j, B=None):
+    """The row of the minimum ratio test on column enter_j.
 
-def determine_leaving_variable(T, enter_j):
+    Ties go to the first row, or with B to the row of the lowest basic variable, as Bland's rule wants.
+    """
     leave_i = -1
     min_ratio = 0
-    for j, row in enumerate(T[:-1]):
-        if row[enter_j] > 0:
-            ratio = row[-1]/row[enter_j]
-            if leave_i == -1 or ratio < min_ratio:
+    objective = len(T) - 1
+    for j in sorted(T.columns[enter_j]):
+        row = T.rows[j]
+        if j != objective and row[enter_j] > 0:
+            ratio = row.get(T.rhs, 0)/row[enter_j]
+            if leave_i == -1 or ratio < min_ratio or B is not None and ratio == min_ratio and B[j] < B[leave_i]:
                 leave_i = j
                 min_ratio = ratio
     if leave_i == -1:
@@ -268,21 +384,124 @@ def determine_leaving_variable(T, enter_j):
     return leave_i
 
 
-def max_index(row):
-    j = 0
-    m = row[0]
-    i = 1
-    while i < len(row):
-        e = row[i]
-        if e > m:
+def max_index(row, rhs):
+    """The column of the largest positive entry of the sparse objective row, the first one on ties, or None."""
+    j = None
+    m = 0
+    for i, e in row.items():
+        if i != rhs and (e > m or e == m and j is not None and i < j):
             j = i
             m = e
-        i += 1
     return j
 
 
+class Dantzig:
+    """The pricing rules pick the entering column and the leaving row of a pivot on T.
+
+    Dantzig's rule takes the column with the largest reduced cost, the first one on ties, and the first row on ties of
+    the ratio test. It is cheap, but can cycle on degenerate problems.
+    """
+
+    name = 'dantzig'
+
+    def __init__(self, T):
+        self.T = T
+
+    def entering(self):
+        """The entering column, None at the optimum."""
+        return max_index(self.T.rows[-1], self.T.rhs)
+
+    def leaving(self, enter_j, B):
+        """The leaving row for the entering column."""
+        return determine_leaving_variable(self.T, enter_j)
+
+
+class Bland(Dantzig):
+    """The lowest column with a positive reduced cost, and the row of the lowest basic variable on ties.
+
+    Never cycles, but often takes more pivots than the other rules.
+    """
+
+    name = 'bland'
+
+    def entering(self):
+        rhs = self.T.rhs
+        return min((j for j, e in self.T.rows[-1].items() if e > 0 and j != rhs), default=None)
+
+    def leaving(self, enter_j, B):
+        return determine_leaving_variable(self.T, enter_j, B)
+
+
+class PartialPricing(Dantzig):
+    """Dantzig's rule on a short list of candidate columns.
+
+    A pass over the whole objective row keeps the `size` columns with the largest reduced costs. The next iterations
+    only look at those, and take the best one that still has a positive reduced cost, until none has.
+    """
+
+    name = 'partial'
+    size = 8
+
+    def __init__(self, T):
+        super().__init__(T)
+        self.candidates = []
+
+    def entering(self):
+        z = self.T.rows[-1]
+        enter_j = max_index({j: z[j] for j in self.candidates if j in z}, self.T.rhs)
+        if enter_j is None:
+            rhs = self.T.rhs
+            self.candidates = heapq.nlargest(self.size, (j for j, e in z.items() if e > 0 and j != rhs),
+                                             key=lambda j: (z[j], -j))
+            enter_j = self.candidates[0] if self.candidates else None
+        return enter_j
+
+
+class SteepestEdge(Dantzig):
+    """The column with the largest reduced cost relative to the length of its edge.
+
+    The score of column j is z_j^2 / (1 + sum_i T[i][j]^2). The tableau has the columns at hand, so the edge lengths
+    are exact instead of the reference weights of Devex. Pricing visits the nonzeros of every candidate column, but
+    usually takes fewer pivots than Dantzig's rule.
+    """
+
+    name = 'steepest-edge'
+
+    def entering(self):
+        T = self.T
+        rows = T.rows
+        objective = len(T) - 1
+        enter_j = None
+        best = 0
+        for j, e in rows[-1].items():
+            if e > 0 and j != T.rhs:
+                norm = 1
+                for i in T.columns[j]:
+                    if i != objective:
+                        norm += rows[i][j] ** 2
+                score = e * e / norm
+                if score > best or score == best and j < enter_j:
+                    enter_j = j
+                    best = score
+        return enter_j
+
+
+PRICING_RULES = {rule.name: rule for rule in (Dantzig, Bland, PartialPricing, SteepestEdge)}
+
+
+def print_trace(event, data):
+    """A trace subscriber that prints every tableau, e.g. `trace.subscribe(simplex.print_trace)`."""
+    if event == 'tableau':
+        print(f"phase={data['phase']} iteration={data['iteration']}")
+        dump_t(data['T'], data['B'])
+    elif event == 'pivot':
+        print(f"leave_i={data['leave_i']} enter_j={data['enter_j']} pivot={data['pivot']}")
+    elif event == 'optimal':
+        print('Found optimal solution')
+
+
 def dump_t(T, B):
-    l = max(len(f'{e:.2f}') for e in sum(T, []))
+    l = max(len(f'{e:.2f}') for row in T for e in row)
     fmt = ''.join(['{:', str(l), '.2f}'])
     print('Tableau:')
     for i, row in enumerate(T[:-1]):
@@ -0,0 +1,214 @@
+"""The simplex algorithm of `pcc.simplex` on a NumPy tableau.
+
+The algorithm - including the phase 1 with artificial variables - is the same, but the tableau is a 2-D float array:
+the pivot is a rank-1 update, the ratio test a masked argmin and the entering column a single argmax.
+"""
+import logging
+import math
+
+import numpy as np
+
+from . import metrics, trace
+from .simplex import prepare_input
+
+
+logger = logging.getLogger(__name__)
+
+
+def distribute_load(config, stats=None):
+    stats = trace.SolveStats() if stats is None else stats
+    load, plants = prepare_input(config)
+    logger.debug('distribute_load: load=%s', load)
+    load_plan = allocate_load(load, plants, stats=stats)
+    metrics.simplex_pivots.labels('simplex_numpy').observe(stats.pivots)
+    logger.debug('load_plan = %s', load_plan)
+    allocated = sum(load_plan.values())
+    if not math.isclose(allocated, load):
+        raise Exception('Unable to distribute load: load=%s, allocated=%s' % (load, allocated))
+    return [{'name': name, 'p': p} for name, p in load_plan.items()]
+
+
+def allocate_load(load, plants, stats=None):
+    """Solve the LP relaxation: every plant with a pmax runs between its pmin and pmax, and together they meet load.
+
+    The tableau only has "<=" and ">=" rows, so the load balance sum(p) = load is the pair sum(p) <= load and
+    sum(p) >= load. Like `pcc.bounded` every plant is committed: it produces at least its pmin.
+    """
+    plant_list = [p for p in plants.values() if p.pmax > 0]
+    n = len(plant_list)
+
+    c = [p.cost for p in plant_list]
+
+    rows = []
+    b = []
+    for i, p in enumerate(plant_list):
+        # p_i <= pmax_i
+        rows.append(i)
+        b.append(p.pmax)
+        # p_i >= pmin_i
+        if p.pmin > 0:
+            rows.append(i)
+            b.append(-p.pmin)  # indicate ">=" with "-"
+    A = np.zeros((len(rows) + 2, n))
+    A[np.arange(len(rows)), rows] = 1
+    # sum(p) <= load and sum(p) >= load
+    A[-2:] = 1
+    b += [load, -load]
+
+    solution = simplex(c, A, b, stats=stats)
+    load_plan = {name: 0.0 for name in plants}
+    for i, p in enumerate(plant_list):
+        load_plan[p.name] = solution[f'x_{i+1}']
+    return load_plan
+
+
+def simplex(c, A, b, minimize=True, stats=None):
+    """
+    c are the coefficients of the objective function
+    A is m x n matrix of rank m
+    b is the RHS of the inequalities represented by A
+      b > 0 BUT:
+      convention: if b_i < 0 it means sum(a_ij, j: 0 -> n) >= b_i (i.e. a "greater than").
+    stats is an optional trace.SolveStats that gets the iteration counters and timings of the solve.
+    """
+    c = np.asarray(c, dtype=float)
+    A = np.asarray(A, dtype=float)
+    b = np.asarray(b, dtype=float)
+    m, n = A.shape
+
+    with trace.Timer(stats, phase=1):
+        B, T = initialize_tableau(A, b, c, m, n, minimize, stats=stats)
+    with trace.Timer(stats, phase=2):
+        solution = inner_simplex(T, B, n, stats=stats)
+    if not minimize:
+        solution['z'] = -solution['z']
+    return solution
+
+
+def initialize_tableau(A, b, c, m, n, minimize, stats=None):
+    # Convert to equalities by introducing slack variables, with a negative sign for the ">=" rows
+    diagonal = np.where(b < 0, -1.0, 1.0)
+    artificial = np.flatnonzero(diagonal != 1)
+    art_var_cnt = len(artificial)
+    objective = -c if minimize else c
+
+    if not art_var_cnt:
+        # We have a feasible solution where all non basic variables are 0 and the basic variables == b
+        T = np.zeros((m + 1, n + m + 1))
+        T[:m, :n] = A
+        T[:m, n:n + m] = np.diag(diagonal)
+        T[:m, -1] = np.abs(b)
+        T[-1, :n] = objective
+        return list(range(n, n + m)), T
+
+    # Phase 1: add an artificial variable for every row that has no +1 on the diagonal and minimize their sum
+    T = np.zeros((m + 1, n + m + art_var_cnt + 1))
+    T[:m, :n] = A
+    T[:m, n:n + m] = np.diag(diagonal)
+    T[artificial, n + m + np.arange(art_var_cnt)] = 1
+    T[:m, -1] = np.abs(b)
+    T[-1, n + m:-1] = -1 if minimize else 1
+    # add the artificial rows to the last row to eliminate their coefficients from Z
+    for i in artificial:
+        if minimize:
+            T[-1] += T[i]
+        else:
+            T[-1] -= T[i]
+
+    B = list(range(n, n + m))
+    for k, i in enumerate(artificial):
+        B[i] = n + m + k
+
+    try:
+        solution = inner_simplex(T, B, n + m, stats=stats, phase=1)
+    except Exception:
+        raise Exception('No initial feasible solution found')
+    # Assert that the artificial variables have been reduced to 0
+    if not all(v == 0 for varname, v in solution.items() if varname[0] == 's'):
+        raise Exception('No initial feasible solution found, problem set is empty')
+
+    # an artificial variable can stay basic at 0, e.g. for the load balance pair: pivot it out on any other
+    # variable of its row, or drop the row when it has none, it is then redundant
+    keep = []
+    for i, var_i in enumerate(B):
+        if var_i >= n + m:
+            j = np.flatnonzero(np.abs(T[i, :n + m]) > 1e-9)
+            if not len(j):
+                continue
+            pivot(T, i, int(j[0]))
+            B[i] = int(j[0])
+        keep.append(i)
+    B = [B[i] for i in keep]
+    # discard everything "artificial" and put back the objective of the original problem
+    T = np.hstack((T[keep + [m], :n + m], T[keep + [m], -1:]))
+    T[-1] = 0
+    T[-1, :n] = objective
+
+    # eliminate the z coefficients of the basic variables
+    for i, var_i in enumerate(B):
+        if var_i < n:
+            T[-1] -= T[-1, var_i] * T[i]
+    return B, T
+
+
+def inner_simplex(T, B, n, stats=None, phase=2):
+    if trace.subscribers:
+        trace.emit('tableau', phase=phase, iteration=0, T=T, B=B)
+
+    # Iterate towards optimal solution
+    iteration = 0
+    while True:
+        enter_j = int(np.argmax(T[-1, :-1]))
+        if T[-1, enter_j] <= 0:
+            break
+        if not (T[:-1, enter_j] > 0).any():
+            raise Exception('Problem is unbounded')
+        leave_i = determine_leaving_variable(T, enter_j)
+        degenerate = T[leave_i, -1] == 0
+        if trace.subscribers:
+            trace.emit('pivot', phase=phase, iteration=iteration, leave_i=leave_i, enter_j=enter_j,
+                       pivot=T[leave_i, enter_j], degenerate=degenerate)
+        pivot(T, leave_i, enter_j)
+        # Keep track of the basic variables
+        B[leave_i] = enter_j
+        iteration += 1
+        if stats is not None:
+            stats.count_iteration(phase)
+            stats.pivots += 1
+            stats.degenerate_pivots += bool(degenerate)
+        if trace.subscribers:
+            trace.emit('tableau', phase=phase, iteration=iteration, T=T, B=B)
+    if trace.subscribers:
+        trace.emit('optimal', phase=phase, iterations=iteration)
+
+    # gather results
+    solution = {}
+    result = {B[i]: float(T[i, -1]) for i in range(len(B))}
+    for i in range(T.shape[1] - 1):
+        if i < n:
+            variable = f'x_{i+1}'
+        else:
+            variable = f's_{i-n+1}'
+        solution[variable] = result.get(i, 0.0)
+    solution['z'] = float(T[-1, -1])
+    return solution
+
+
+def pivot(T, leave_i, enter_j):
+    pivot = T[leave_i, enter_j]
+    assert pivot != 0
+    T[leave_i] /= pivot
+    factors = T[:, enter_j].copy()
+    factors[leave_i] = 0
+    T -= np.outer(factors, T[leave_i])
+
+
+def determine_leaving_variable(T, enter_j):
+    column = T[:-1, enter_j]
+    mask = column > 0
+    if not mask.any():
+        # This "cannot happen", because we already checked at the calling site
+        raise Exception('Unable to determine leaving variable: problem is unbounded')
+    ratios = np.full(len(column), np.inf)
+    np.divide(T[:-1, -1], column, out=ratios, where=mask)
+    return int(np.argmin(ratios))
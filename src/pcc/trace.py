@@ -0,0 +1,99 @@
+"""Solver tracing.
+
+The solvers report what they are doing to the callables in `subscribers`, as `callback(event, data)` with `data` a
+dict. They only build the event data when the list is not empty, so when nobody is subscribed tracing costs a single
+truth test per iteration.
+
+Events of the tableau simplex:
+
+- 'tableau': phase, iteration, T, B - at the start of a phase and after every pivot
+- 'pivot': phase, iteration, leave_i, enter_j, pivot, degenerate; `pcc.simplex` adds the name of the pricing rule
+- 'optimal': phase, iterations
+
+T is a dense copy of the sparse tableau of `pcc.simplex`, as a list of rows, built only when someone is subscribed. B
+is the live basis: copy it if you want to keep it, see `TableauRecorder`.
+"""
+import copy
+import time
+from dataclasses import dataclass, field
+
+
+subscribers = []
+
+
+def subscribe(callback):
+    subscribers.append(callback)
+    return callback
+
+
+def unsubscribe(callback):
+    subscribers.remove(callback)
+
+
+def emit(event, **data):
+    for callback in subscribers:
+        callback(event, data)
+
+
+@dataclass
+class SolveStats:
+    """Counters of a single solve, pass one in as `stats` to have them filled."""
+    phase1_iterations: int = 0
+    phase2_iterations: int = 0
+    pivots: int = 0
+    degenerate_pivots: int = 0
+    fallback_pivots: int = 0  # pivots of the anti-cycling rule of `pcc.simplex.inner_simplex`
+    phase1_time: float = 0.0
+    phase2_time: float = 0.0
+
+    @property
+    def iterations(self):
+        return self.phase1_iterations + self.phase2_iterations
+
+    def count_iteration(self, phase):
+        if phase == 1:
+            self.phase1_iterations += 1
+        else:
+            self.phase2_iterations += 1
+
+
+class Timer:
+    """Context manager that adds the elapsed wall time to the `phase<n>_time` of a SolveStats, if any."""
+
+    def __init__(self, stats, phase):
+        self.stats = stats
+        self.attribute = f'phase{phase}_time'
+
+    def __enter__(self):
+        if self.stats is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.stats is not None:
+            elapsed = time.perf_counter() - self.start
+            setattr(self.stats, self.attribute, getattr(self.stats, self.attribute) + elapsed)
+
+
+@dataclass
+class TableauRecorder:
+    """Subscriber that keeps a copy of every tableau, for debugging.
+
+    Use it as a context manager to subscribe it for the duration of a solve:
+
+        with TableauRecorder() as recorder:
+            simplex(c, A, b)
+        recorder.tableaus
+    """
+    tableaus: list = field(default_factory=list)
+
+    def __call__(self, event, data):
+        if event == 'tableau':
+            self.tableaus.append((data['phase'], data['iteration'], copy.deepcopy(data['T']), data['B'][:]))
+
+    def __enter__(self):
+        subscribe(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        unsubscribe(self)
@@ -1,11 +1,25 @@
+import glob
+import json
 import logging
+import os
+from time import perf_counter
+
 from flask import Flask
 
 
+logger = logging.getLogger(__name__)
+
+# the example payloads of the repository, which the Docker image installs in place
+WARMUP_PAYLOADS = os.getenv('PCC_WARMUP_PAYLOADS', os.path.normpath(
+    os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, os.pardir, 'doc', 'example_payloads')))
+
+
 def _configure_logging(app):
     gunicorn_logger = logging.getLogger('gunicorn.error')
     app.logger.handlers = gunicorn_logger.handlers
     app.logger.setLevel(gunicorn_logger.level)
+    # the engines log every solve at debug level
+    logging.getLogger('pcc').setLevel(gunicorn_logger.level)
     app.logger.debug('logging configured with level %s', app.logger.level)
 
 
@@ -18,3 +32,33 @@ def create_app():
     init_error_handlers(app)
     register_blueprint(app)
     return app
+
+
+def warm_up(directory=WARMUP_PAYLOADS):
+    """Parse, validate and solve the /productionplan payloads in directory once, and return how many there were.
+
+    A payload takes the path of a request - in the solver pool if there is one - without the result cache, the
+    broadcast or the request metrics, so the first real request of a worker does not pay for the imports of the
+    engines it needs and for filling their caches. An invalid payload is logged and skipped.
+    """
+    from pcc.engines import select
+    from pcc.pool import get_pool
+    from .schema import parse_payload
+
+    count = 0
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        start = perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                payload = json.loads(f.read())
+            load, fleet = parse_payload(payload)
+            function = select(load, fleet, payload.get('engine'), record=False).engine.function
+            pool = get_pool()
+            result = function(load, fleet) if pool is None else pool.solve(function, load, fleet)
+            json.dumps(result)
+        except Exception as e:
+            logger.warning('warm_up: %s: %r', path, e)
+            continue
+        count += 1
+        logger.debug('warm_up: %s in %.1f ms', path, (perf_counter() - start) * 1000)
+    return count
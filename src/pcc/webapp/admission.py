@@ -0,0 +1,228 @@
+"""Admission control: shed the solves a worker can not finish in time, instead of queueing them without limit.
+
+Every worker has an `Admission` with a limit on its solves in flight. The limit adapts to the latency of the solves,
+like the gradient limiter of Netflix' concurrency-limits: it compares a short and a long moving average of the solve
+latency. While the short average stays within `tolerance` times the long one, the solves are not queueing anywhere and
+the limit grows by about its square root; when the short average rises the limit shrinks in proportion, down to half
+per update. The long average slowly follows, so the limit settles on whatever the solver pool and the payload mix
+allow. The limit only grows while it is used: a worker with less than half its limit in flight learns nothing new.
+
+A solve over the limit waits in a waiting room of as many places as the limit, for at most `max_wait` seconds. The
+waiting room is served by priority - the X-Priority header (high, normal or low) and then the smallest request body
+first, so small payloads go ahead of huge fleets - and in order of arrival within a priority. A request that can not
+be admitted is answered at once, with a Retry-After of the expected time for a place to free up:
+
+- 503 Service Unavailable: the waiting room is full, or the wait took too long
+- 429 Too Many Requests: shed in favour of requests with a higher priority
+
+Only the solves pass the admission control, cache hits are answered regardless. It matters for the gthread workers of
+`gunicorn_conf.py` and for uvicorn workers, that take many requests at once and queue their solves; a sync worker
+serves one request at a time and never goes over a limit.
+
+Configured with PCC_ADMISSION (1, set 0 to turn it off), PCC_ADMISSION_LIMIT (the initial limit, 4),
+PCC_ADMISSION_MAX_LIMIT (64), PCC_ADMISSION_MAX_WAIT (seconds, 1) and PCC_ADMISSION_BY_SIZE (1, set 0 to ignore the
+body size).
+"""
+import asyncio
+import itertools
+import math
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from time import perf_counter
+
+from pcc import metrics
+from .exceptions import APIError
+
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+SHORT_WINDOW = 10  # solves
+LONG_WINDOW = 500  # solves
+SMOOTHING = 0.2
+
+
+class Rejected(APIError):
+
+    def __init__(self, status_code, reason, retry_after):
+        message = 'Too Many Requests' if status_code == 429 else 'Service Unavailable'
+        super().__init__(message, status_code, payload={'reason': reason}, headers={'Retry-After': str(retry_after)})
+        self.reason = reason
+
+
+class Waiter:
+    __slots__ = ('key', 'notify', 'state')
+
+    def __init__(self, key, notify):
+        self.key = key
+        self.notify = notify
+        self.state = None  # 'admitted', 'cancelled' or a Rejected
+
+
+class Admission:
+    """The adaptive limit of the solves in flight of this process, see the module docstring."""
+
+    def __init__(self, limit=4, min_limit=1, max_limit=64, max_wait=1.0, tolerance=2.0, by_size=True):
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_wait = max_wait
+        self.tolerance = tolerance
+        self.by_size = by_size
+        self.in_flight = 0
+        self.waiting = []
+        self.short = self.long = None
+        self._lock = threading.Lock()
+        self._arrivals = itertools.count()
+
+    @classmethod
+    def from_env(cls):
+        """The `Admission` configured in the environment, None when PCC_ADMISSION is 0."""
+        if os.getenv('PCC_ADMISSION', '1') == '0':
+            return None
+        return cls(limit=float(os.getenv('PCC_ADMISSION_LIMIT', 4)),
+                   max_limit=float(os.getenv('PCC_ADMISSION_MAX_LIMIT', 64)),
+                   max_wait=float(os.getenv('PCC_ADMISSION_MAX_WAIT', 1)),
+                   by_size=os.getenv('PCC_ADMISSION_BY_SIZE', '1') != '0')
+
+    def priority(self, header=None, size=None):
+        """The sort key of a request with this X-Priority header and body size; the lowest goes first."""
+        level = PRIORITIES.get((header or 'normal').strip().lower(), PRIORITIES['normal'])
+        return level, (size or 0) if self.by_size else 0, next(self._arrivals)
+
+    @contextmanager
+    def slot(self, priority):
+        """Hold a place in flight for the solve in the with block, waiting for it if needed, or raise `Rejected`."""
+        event = threading.Event()
+        waiter = self._enter(priority, event.set)
+        if waiter is not None:
+            event.wait(self.max_wait)
+            self._settle(waiter)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.release(perf_counter() - start)
+
+    @asynccontextmanager
+    async def async_slot(self, priority):
+        """`slot` for a coroutine: it waits without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enter(priority, notify)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # the client is gone: give up the place in the waiting room, or in flight
+                self._cancel(waiter)
+                raise
+            self._settle(waiter)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.release(perf_counter() - start)
+
+    def release(self, latency):
+        """Free the place of a solve that took latency seconds, and admit the waiting solves that fit."""
+        with self._lock:
+            self._observe(latency)
+            self.in_flight -= 1
+            self._admit_waiting()
+
+    def _enter(self, priority, notify):
+        # None when admitted right away, else the Waiter in the waiting room
+        with self._lock:
+            if self.in_flight < self.limit and not self.waiting:
+                self.in_flight += 1
+                metrics.admission_limit.labels().observe(self.limit)
+                return None
+            waiter = Waiter(priority, notify)
+            if len(self.waiting) >= max(1, math.ceil(self.limit)):
+                worst = max(self.waiting, key=_key)
+                if priority >= worst.key:
+                    if priority[:2] > worst.key[:2]:
+                        raise self._reject(429, 'shed for requests with a higher priority')
+                    raise self._reject(503, 'overloaded: the waiting room is full')
+                self.waiting.remove(worst)
+                worst.state = self._reject(429, 'shed for requests with a higher priority')
+                worst.notify()
+            self.waiting.append(waiter)
+            return waiter
+
+    def _settle(self, waiter):
+        with self._lock:
+            if waiter.state is None:
+                self.waiting.remove(waiter)
+                waiter.state = self._reject(503, f'overloaded: no solve slot within {self.max_wait} s')
+        if isinstance(waiter.state, Rejected):
+            raise waiter.state
+
+    def _cancel(self, waiter):
+        with self._lock:
+            if waiter.state is None:
+                self.waiting.remove(waiter)
+                waiter.state = 'cancelled'
+            elif waiter.state == 'admitted':
+                self.in_flight -= 1
+                self._admit_waiting()
+
+    def _admit_waiting(self):
+        while self.waiting and self.in_flight < self.limit:
+            waiter = min(self.waiting, key=_key)
+            self.waiting.remove(waiter)
+            self.in_flight += 1
+            waiter.state = 'admitted'
+            metrics.admission_limit.labels().observe(self.limit)
+            waiter.notify()
+
+    def _reject(self, status_code, reason):
+        metrics.admission_rejections.labels(status_code).inc()
+        return Rejected(status_code, reason, self.retry_after())
+
+    def retry_after(self):
+        """Whole seconds until a place in flight frees up for a new request, at least 1."""
+        latency = self.long or 0.0
+        return max(1, math.ceil(latency * (len(self.waiting) + 1) / self.limit))
+
+    def _observe(self, latency):
+        if self.short is None:
+            self.short = self.long = latency
+            return
+        self.short += (latency - self.short) / SHORT_WINDOW
+        self.long += (latency - self.long) / LONG_WINDOW
+        if self.long > 2 * self.short:
+            # the solves got faster: let the long average catch up sooner
+            self.long *= 0.95
+        gradient = max(0.5, min(1.0, self.tolerance * self.long / self.short))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        if target > self.limit and self.in_flight < self.limit / 2:
+            return
+        limit = self.limit * (1 - SMOOTHING) + target * SMOOTHING
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+
+def _key(waiter):
+    return waiter.key
+
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def get_admission():
+    """The `Admission` of this process, or None when it is turned off."""
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                admission = Admission.from_env()
+                _admission = False if admission is None else admission
+    return _admission or None
@@ -1,13 +1,31 @@
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from json import dumps, loads
+from time import perf_counter
 
-from flask import current_app, request, jsonify, Blueprint
+from flask import current_app, g, request, jsonify, Blueprint, Response, stream_with_context
 
-from pcc.lib import distribute_load
-from .exceptions import APIError
+from pcc import metrics
+from pcc.cache import SharedCache, digest, fleet_fingerprint
+from pcc.engines import select
+from pcc.lib import distribute_loads
+from pcc.pool import PoolError, SolveTimeout, get_pool
+from . import broadcast
+from .admission import get_admission
+from .exceptions import APIError, error_to_dict
+from .schema import RAMP_KEYS, parse_fleet, parse_loads, parse_payload, parse_ramps
+
+# pcc.multiperiod and pcc.scenarios are imported by their endpoints: they load NumPy, which most workers never need
 
 
 blueprint = Blueprint('pcd', __name__)
 
+MAX_SCENARIOS = int(os.getenv('PCC_MAX_SCENARIOS', 100000))
+SWEEP_THREADS = int(os.getenv('PCC_SWEEP_THREADS', os.cpu_count()))
+
 
 def register_blueprint(app):
     app.register_blueprint(blueprint)
@@ -19,6 +37,121 @@ def validate_mandatory_keys(keys, payload):
             raise APIError(payload={'reason': f'Missing key "{key}"'})
 
 
+def solve(function, *args):
+    """Return function(*args), computed in the solver pool if there is one, see `pcc.pool`."""
+    engine = function.__module__.rpartition('.')[2]
+    start = perf_counter()
+    try:
+        pool = get_pool()
+        if pool is None:
+            return function(*args)
+        return pool.solve(function, *args)
+    except SolveTimeout as e:
+        raise APIError('Gateway Timeout', 504, payload={'reason': str(e)})
+    except PoolError as e:
+        raise APIError('Service Unavailable', 503, payload={'reason': str(e)})
+    finally:
+        metrics.solve_duration.labels(engine).observe(perf_counter() - start)
+
+
+def admit():
+    """A place in flight for the solve of this request, see `pcc.webapp.admission`; raises a 429 or 503 APIError."""
+    admission = get_admission()
+    if admission is None:
+        return nullcontext()
+    return admission.slot(admission.priority(request.headers.get('X-Priority'), request.content_length))
+
+
+_result_cache = None
+
+
+def get_result_cache():
+    """The /productionplan responses shared by all workers, see `pcc.cache.SharedCache`, or None.
+
+    A response is stored under the hash of the request body, and under the hash of the validated load and fleet, so
+    that the same payload with its keys in another order is also a hit.
+    Configured with PCC_RESULT_CACHE_PATH - set by `gunicorn_conf.py` - PCC_RESULT_CACHE_SIZE (default 1024) and
+    PCC_RESULT_CACHE_TTL (seconds, default 60).
+    """
+    global _result_cache
+    if _result_cache is None:
+        cache = SharedCache.from_env('PCC_RESULT_CACHE', name='result')
+        _result_cache = False if cache is None else cache
+    return None if _result_cache is False else _result_cache
+
+
+def body_key(body):
+    """The result cache key of a request body: a repeated request is answered without even parsing its json."""
+    return 'body:' + digest(body)
+
+
+def plan_key(load, fleet, engine):
+    """The result cache key of a validated payload solved by engine, see `pcc.cache.fleet_fingerprint`."""
+    return f'plan:{engine}:' + fleet_fingerprint(load, fleet)
+
+
+def store_response(cache, data, *keys):
+    for key in keys:
+        cache.put(key, data)
+
+
+def select_engine(load, fleet, payload):
+    """The `pcc.engines.Engine` for a validated payload, the one its optional "engine" names or the one that fits."""
+    try:
+        return select(load, fleet, payload.get('engine')).engine
+    except ValueError as e:
+        raise APIError(payload={'reason': str(e)})
+
+
+def validate_batch(payload, optional=frozenset()):
+    validate_mandatory_keys(('loads', 'fuels', 'powerplants'), payload)
+    parse_fleet(payload['fuels'], payload['powerplants'], optional)
+    parse_loads(payload['loads'])
+
+
+def validate_multiperiod(payload):
+    validate_batch(payload, RAMP_KEYS)
+    parse_ramps(payload['powerplants'])
+    if not payload['loads']:
+        raise APIError(payload={'reason': '"loads" must not be empty'})
+
+
+def validate_scenarios(payload):
+    """Return the fleet columns, scenario matrix and loads of a sweep payload, see `pcc.scenarios`."""
+    from pcc.scenarios import FUELS, prepare
+    if not isinstance(payload, dict):
+        raise APIError(payload={'reason': 'payload: must be an object'})
+    validate_mandatory_keys(('powerplants',), payload)
+    # the powerplants are checked before the scenarios are built from them, the checks do not depend on the prices
+    parse_fleet(dict.fromkeys(FUELS, 0), payload['powerplants'])
+    try:
+        return prepare(payload, limit=MAX_SCENARIOS)
+    except ValueError as e:
+        raise APIError(payload={'reason': str(e)})
+
+
+@blueprint.before_app_request
+def start_timer():
+    g.start = perf_counter()
+
+
+@blueprint.after_app_request
+def record_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'other'
+    metrics.request_duration.labels(endpoint).observe(perf_counter() - g.start)
+    if request.content_length:
+        metrics.request_size.labels(endpoint).observe(request.content_length)
+    if response.status_code >= 400:
+        metrics.errors.labels(response.status_code).inc()
+    return response
+
+
+@blueprint.route('/metrics')
+def exposition():
+    """The metrics of all workers, see `pcc.metrics`."""
+    return Response(metrics.exposition(), content_type=metrics.CONTENT_TYPE)
+
+
 @blueprint.route('/')
 def hello_worl():
     return 'Hello from pcd!\n'
@@ -29,10 +162,146 @@ def productionplan():
     current_app.logger.debug('productionplan is called')
     if not request.is_json:
         raise APIError()
+    cache = get_result_cache()
+    if cache is not None:
+        body = request.get_data()
+        data = cache.get(body_key(body))
+        if data is not None:
+            current_app.logger.debug('productionplan: cached body')
+            broadcast.publish(body, data)
+            return Response(data, mimetype='application/json')
     json = request.json
     current_app.logger.info('about to validate input')
-    validate_mandatory_keys(('load', 'fuels', 'powerplants'), json)
+    load, fleet = parse_payload(json)
     current_app.logger.debug('productionplan: payload = %s', json)
-    result = distribute_load(json)
+    engine = select_engine(load, fleet, json)
+    if cache is not None:
+        key = plan_key(load, fleet, engine.name)
+        data = cache.get(key)
+        if data is not None:
+            current_app.logger.debug('productionplan: cached plan')
+            cache.put(body_key(body), data)
+            broadcast.publish(body, data)
+            return Response(data, mimetype='application/json')
+    with admit():
+        result = solve(engine.function, load, fleet)
     current_app.logger.debug('productionplan: result = %s', result)
+    broadcast.publish(json, result)
+    response = jsonify(result)
+    if cache is not None:
+        store_response(cache, response.get_data(), key, body_key(body))
+    return response
+
+
+@blueprint.route('/productionplan/batch', methods=['POST'])
+def productionplan_batch():
+    """Production plans for one fleet and many loads.
+
+    The payload has the "fuels" and "powerplants" of /productionplan, and "loads": a list of loads, or of
+    [load, wind%] pairs. The response is a list with a production plan per load.
+    """
+    current_app.logger.debug('productionplan_batch is called')
+    if not request.is_json:
+        raise APIError()
+    json = request.json
+    validate_batch(json)
+    with admit():
+        result = solve(distribute_loads, json, json['loads'])
+    current_app.logger.debug('productionplan_batch: %s plans', len(result))
+    return jsonify(result)
+
+
+@blueprint.route('/productionplan/multiperiod', methods=['POST'])
+def productionplan_multiperiod():
+    """Production plans for one fleet over a horizon of periods, within the ramp limits of the plants.
+
+    The payload is that of /productionplan/batch, and the powerplants may have "rampup" and "rampdown": the MW their
+    output may rise or fall from one period to the next. The periods are solved together as one LP, see
+    `pcc.multiperiod`. The response is a list with a production plan per period.
+    """
+    current_app.logger.debug('productionplan_multiperiod is called')
+    if not request.is_json:
+        raise APIError()
+    json = request.json
+    from pcc.multiperiod import distribute_loads as distribute_horizon
+    validate_multiperiod(json)
+    with admit():
+        result = solve(distribute_horizon, json, json['loads'])
+    current_app.logger.debug('productionplan_multiperiod: %s plans', len(result))
     return jsonify(result)
+
+
+@blueprint.route('/productionplan/stream', methods=['POST'])
+def productionplan_stream():
+    """Production plans for a stream of payloads.
+
+    The request body is newline delimited json: one /productionplan payload per line. Every payload is solved as soon
+    as its line has arrived, and its production plan - or the json of its error - is written back as one line of the
+    response. A bad payload does not end the stream. Only one line is held in memory at a time.
+    """
+    current_app.logger.debug('productionplan_stream is called')
+    stream = request.stream
+
+    def generate():
+        count = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            count += 1
+            yield dumps(solve_line(line)) + '\n'
+        current_app.logger.debug('productionplan_stream: %s plans', count)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@blueprint.route('/productionplan/scenarios', methods=['POST'])
+def productionplan_scenarios():
+    """The dispatch cost of one fleet over many fuel price and wind scenarios.
+
+    The payload has the "load" and "powerplants" of /productionplan, and "scenarios" or a "sampler" instead of
+    "fuels", see `pcc.scenarios`. The response is newline delimited json: the result of every scenario as soon as its
+    chunk is solved, then {"summary": ...} with the statistics of the costs. With a solver pool, up to
+    PCC_SWEEP_THREADS chunks are solved at once; at most PCC_MAX_SCENARIOS (default 100000) scenarios are accepted.
+    """
+    from pcc.scenarios import Summary, sweep
+    current_app.logger.debug('productionplan_scenarios is called')
+    if not request.is_json:
+        raise APIError()
+    json = request.json
+    columns, prices, loads = validate_scenarios(json)
+    plans = json.get('plans', False) is True
+
+    def generate():
+        summary = Summary()
+        executor = None
+        submit = None
+        if get_pool() is not None:
+            executor = ThreadPoolExecutor(SWEEP_THREADS, thread_name_prefix='sweep')
+            submit = partial(executor.submit, solve)
+        try:
+            for result in sweep(columns, prices, loads, plans, submit=submit, window=2 * SWEEP_THREADS):
+                yield dumps(summary.add(result)) + '\n'
+        except Exception as e:
+            current_app.logger.exception('productionplan_scenarios')
+            yield dumps(error_to_dict(e)) + '\n'
+            return
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        current_app.logger.debug('productionplan_scenarios: %s', summary.to_dict())
+        yield dumps({'summary': summary.to_dict()}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def solve_line(line):
+    try:
+        try:
+            json = loads(line)
+        except ValueError as e:
+            raise APIError(payload={'reason': f'Invalid json: {e}'})
+        load, fleet = parse_payload(json)
+        return solve(select_engine(load, fleet, json).function, load, fleet)
+    except Exception as e:
+        current_app.logger.exception('productionplan_stream')
+        return error_to_dict(e)
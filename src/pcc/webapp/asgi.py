@@ -0,0 +1,353 @@
+"""ASGI entry point, serving the same api as `create_app()`.
+
+Requests are read, parsed and validated on the event loop and only the solve runs in a thread pool, so a worker holds
+any number of idle or slow connections while it solves. The streaming endpoints /productionplan/stream and
+/productionplan/scenarios send every result as it is solved. It also serves the websocket /ws, that sends every
+production plan with its input, see `pcc.webapp.broadcast`. Run it with uvicorn workers under gunicorn:
+
+    gunicorn -c gunicorn_conf.py -k uvicorn.workers.UvicornWorker pcc.webapp.asgi:app
+
+The size of the thread pool is set with the environment variable PCC_SOLVE_THREADS (default 4).
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+from werkzeug.exceptions import BadRequest, MethodNotAllowed, NotFound
+
+from pcc import metrics
+from pcc.lib import distribute_loads
+from pcc.pool import get_pool
+from . import broadcast
+from .admission import get_admission
+from .api import (SWEEP_THREADS, body_key, get_result_cache, plan_key, select_engine,
+                  solve as solve_in_pool, store_response, validate_batch, validate_multiperiod, validate_scenarios)
+from .schema import parse_payload
+from .exceptions import APIError, error_to_dict
+
+
+logger = logging.getLogger(__name__)
+
+SOLVE_THREADS = int(os.getenv('PCC_SOLVE_THREADS', 4))
+
+# a response body that is already serialized
+Raw = namedtuple('Raw', 'content_type data')
+# a response body that is sent as it is made: chunks is an async iterator of bytes
+Stream = namedtuple('Stream', 'content_type chunks')
+
+
+async def hello_world(scope, body):
+    return 'Hello from pcd!\n'
+
+
+async def productionplan(scope, body):
+    cache = get_result_cache()
+    if cache is not None:
+        check_json(scope)
+        data = cache.get(body_key(body))
+        if data is not None:
+            broadcast.publish(body, data)
+            return Raw(b'application/json', data)
+    payload = parse_json(scope, body)
+    load, fleet = parse_payload(payload)
+    logger.debug('productionplan: payload = %s', payload)
+    engine = select_engine(load, fleet, payload)
+    if cache is not None:
+        key = plan_key(load, fleet, engine.name)
+        data = cache.get(key)
+        if data is not None:
+            executor.submit(cache.put, body_key(body), data)
+            broadcast.publish(body, data)
+            return Raw(b'application/json', data)
+    async with admit(scope, body):
+        result = await solve(engine.function, load, fleet)
+    broadcast.publish(payload, result)
+    if cache is None:
+        return result
+    data = dump_json(result)
+    # a put may have to wait for another writer, not on the event loop
+    executor.submit(store_response, cache, data, key, body_key(body))
+    return Raw(b'application/json', data)
+
+
+async def productionplan_batch(scope, body):
+    payload = parse_json(scope, body)
+    validate_batch(payload)
+    async with admit(scope, body):
+        return await solve(distribute_loads, payload, payload['loads'])
+
+
+async def productionplan_multiperiod(scope, body):
+    from pcc.multiperiod import distribute_loads as distribute_horizon
+    payload = parse_json(scope, body)
+    validate_multiperiod(payload)
+    async with admit(scope, body):
+        return await solve(distribute_horizon, payload, payload['loads'])
+
+
+async def productionplan_stream(scope, receive):
+    """`pcc.webapp.api.productionplan_stream`: every line is solved as soon as it has arrived."""
+    async def generate():
+        count = 0
+        async for line in read_lines(receive):
+            if not line.strip():
+                continue
+            count += 1
+            yield dump_json(await solve_line(line))
+        logger.debug('productionplan_stream: %s plans', count)
+
+    return Stream(b'application/x-ndjson', generate())
+
+
+async def solve_line(line):
+    try:
+        try:
+            payload = json.loads(line)
+        except ValueError as e:
+            raise APIError(payload={'reason': f'Invalid json: {e}'})
+        load, fleet = parse_payload(payload)
+        return await solve(select_engine(load, fleet, payload).function, load, fleet)
+    except Exception as e:
+        logger.exception('productionplan_stream')
+        return error_to_dict(e)
+
+
+async def productionplan_scenarios(scope, body):
+    """`pcc.webapp.api.productionplan_scenarios`; the sweep runs in the solve threads, a chunk of results at a time."""
+    from pcc.scenarios import CHUNK_SIZE, Summary, sweep
+    payload = parse_json(scope, body)
+    columns, prices, loads = validate_scenarios(payload)
+    plans = payload.get('plans', False) is True
+
+    async def generate():
+        loop = asyncio.get_running_loop()
+        summary = Summary()
+        sweeper = None
+        submit = None
+        if get_pool() is not None:
+            sweeper = ThreadPoolExecutor(SWEEP_THREADS, thread_name_prefix='sweep')
+            submit = partial(sweeper.submit, solve_in_pool)
+        results = sweep(columns, prices, loads, plans, submit=submit, window=2 * SWEEP_THREADS)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(executor, list, itertools.islice(results, CHUNK_SIZE))
+                if not chunk:
+                    break
+                yield b''.join(dump_json(summary.add(result)) for result in chunk)
+        except Exception as e:
+            logger.exception('productionplan_scenarios')
+            yield dump_json(error_to_dict(e))
+            return
+        finally:
+            results.close()
+            if sweeper is not None:
+                sweeper.shutdown(cancel_futures=True)
+        logger.debug('productionplan_scenarios: %s', summary.to_dict())
+        yield dump_json({'summary': summary.to_dict()})
+
+    return Stream(b'application/x-ndjson', generate())
+
+
+async def exposition(scope, body):
+    return Raw(metrics.CONTENT_TYPE.encode(), metrics.exposition())
+
+
+routes = {
+    '/': ('GET', hello_world),
+    '/metrics': ('GET', exposition),
+    '/productionplan': ('POST', productionplan),
+    '/productionplan/batch': ('POST', productionplan_batch),
+    '/productionplan/multiperiod': ('POST', productionplan_multiperiod),
+    '/productionplan/stream': ('POST', productionplan_stream),
+    '/productionplan/scenarios': ('POST', productionplan_scenarios),
+}
+
+# the handlers that read the request body themselves: they get receive instead of the body
+READS_BODY = {productionplan_stream}
+
+executor = None
+
+
+def admit(scope, body):
+    """`pcc.webapp.api.admit` for a request of this app."""
+    admission = get_admission()
+    if admission is None:
+        return nullcontext()
+    priority = dict(scope['headers']).get(b'x-priority', b'').decode('latin-1')
+    return admission.async_slot(admission.priority(priority, len(body)))
+
+
+async def solve(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, solve_in_pool, function, *args)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http':
+        await http(scope, receive, send)
+    elif scope['type'] == 'websocket':
+        await websocket(scope, receive, send)
+
+
+async def lifespan(receive, send):
+    global executor
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            _configure_logging()
+            executor = ThreadPoolExecutor(max_workers=SOLVE_THREADS, thread_name_prefix='solve')
+            logger.debug('started %s solve threads', SOLVE_THREADS)
+            broadcast.bus.listen(broadcast.hub.deliver)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            broadcast.bus.close()
+            executor.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def _configure_logging():
+    """Log at the level of gunicorn, like `create_app` does for the Flask app."""
+    gunicorn_logger = logging.getLogger('gunicorn.error')
+    logging.getLogger('pcc').setLevel(gunicorn_logger.level)
+
+
+async def http(scope, receive, send):
+    start = time.perf_counter()
+    endpoint = scope['path'] if scope['path'] in routes else 'other'
+    headers = []
+    try:
+        method, handler = routes.get(scope['path'], (None, None))
+        if handler is None:
+            raise NotFound()
+        if scope['method'] != method:
+            raise MethodNotAllowed(valid_methods=[method])
+        data = b''
+        if handler in READS_BODY:
+            data = receive
+        elif method == 'POST':
+            data = await read_body(receive)
+            metrics.request_size.labels(endpoint).observe(len(data))
+        status, body = 200, await handler(scope, data)
+    except Exception as e:
+        if isinstance(e, (APIError, NotFound, MethodNotAllowed, BadRequest)):
+            logger.info('%s %s: %r', scope['method'], scope['path'], e)
+        else:
+            logger.exception('Unhandled exception')
+        body = error_to_dict(e)
+        status = body['status_code']
+        if isinstance(e, APIError) and e.headers:
+            headers = [(key.lower().encode(), value.encode()) for key, value in e.headers.items()]
+
+    if isinstance(body, Stream):
+        await send_stream(send, body)
+        metrics.request_duration.labels(endpoint).observe(time.perf_counter() - start)
+        return
+    if isinstance(body, Raw):
+        content_type, data = body
+    elif isinstance(body, str):
+        content_type, data = b'text/html; charset=utf-8', body.encode()
+    else:
+        content_type, data = b'application/json', dump_json(body)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(data)).encode()), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': data})
+    metrics.request_duration.labels(endpoint).observe(time.perf_counter() - start)
+    if status >= 400:
+        metrics.errors.labels(status).inc()
+
+
+async def send_stream(send, body):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', body.content_type)],
+    })
+    async for chunk in body.chunks:
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def dump_json(body):
+    return json.dumps(body, separators=(',', ':')).encode() + b'\n'
+
+
+async def websocket(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if scope['path'] != '/ws':
+        await send({'type': 'websocket.close', 'code': 1008})
+        return
+    await send({'type': 'websocket.accept'})
+    subscriber = broadcast.hub.subscribe()
+    sender = asyncio.create_task(forward(subscriber, send))
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+    finally:
+        broadcast.hub.unsubscribe(subscriber)
+        sender.cancel()
+
+
+async def forward(subscriber, send):
+    while True:
+        text = await subscriber.queue.get()
+        if text is broadcast.CLOSE:
+            # 1013: try again later
+            await send({'type': 'websocket.close', 'code': 1013})
+            return
+        await send({'type': 'websocket.send', 'text': text})
+
+
+async def read_lines(receive):
+    """The lines of a request body, as they arrive."""
+    rest = b''
+    while True:
+        message = await receive()
+        lines = (rest + message.get('body', b'')).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line
+        if not message.get('more_body'):
+            break
+    if rest:
+        yield rest
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def parse_json(scope, body):
+    """Like `flask.Request.json`: a json content type is mandatory, invalid json is a 400 Bad Request."""
+    check_json(scope)
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise BadRequest(f'Failed to decode JSON object: {e}')
+
+
+def check_json(scope):
+    headers = dict(scope['headers'])
+    mimetype = headers.get(b'content-type', b'').split(b';')[0].strip().decode('latin-1')
+    if not (mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+        raise APIError()
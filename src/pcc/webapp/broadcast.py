@@ -0,0 +1,199 @@
+"""Broadcast every production plan to the websocket clients of all workers.
+
+After every POST of /productionplan the input and the response are published as one json message:
+
+    {"input": {...}, "output": [...]}
+
+Publishing only puts the pair on a bounded queue, a background thread serializes it - once - and sends it to every
+worker over the bus. So the POST does not wait for the fan-out, and when the thread falls behind messages are dropped
+rather than slowing down the POST.
+
+The bus is a directory (PCC_BUS_DIR, that `gunicorn_conf.py` creates for every deployment; default pcc-bus in the
+temp directory) with a unix datagram socket for every worker that serves websockets. Every worker can publish, also the sync Flask workers, and a message is sent to every
+socket in the directory, without ever blocking: a socket whose buffer is full misses the message, the socket of a
+worker that is gone is removed. A message has to fit in a single datagram, bigger messages are dropped with a warning.
+
+In a worker that serves websockets, `Hub` gives every client a queue of PCC_WS_QUEUE_SIZE messages (default 64). A
+client whose queue is full is too slow: it is disconnected instead of holding up the others.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import socket
+import tempfile
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUS_DIR = os.path.join(tempfile.gettempdir(), 'pcc-bus')
+QUEUE_SIZE = int(os.getenv('PCC_WS_QUEUE_SIZE', 64))
+
+CLOSE = object()
+
+
+class Bus:
+    """Unix datagram sockets in a shared directory, one for every listening worker."""
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self.sock = None
+        self.path = None
+        self._send_sock = None
+
+    @property
+    def directory(self):
+        # PCC_BUS_DIR is read on first use: with preload_app the module is imported before gunicorn_conf.py sets it
+        if self._directory is None:
+            self._directory = os.getenv('PCC_BUS_DIR', DEFAULT_BUS_DIR)
+        return self._directory
+
+    def publish(self, data):
+        """Send data to every listening worker, including this one. Never blocks."""
+        if self._send_sock is None:
+            self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._send_sock.setblocking(False)
+        try:
+            peers = [entry.path for entry in os.scandir(self.directory) if entry.name.endswith('.sock')]
+        except FileNotFoundError:
+            return 0
+        sent = 0
+        for path in peers:
+            try:
+                self._send_sock.sendto(data, path)
+                sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # the worker is gone
+                _unlink(path)
+            except BlockingIOError:
+                logger.debug('bus: %s is full, dropped a message', path)
+            except OSError as e:
+                logger.warning('bus: unable to send %s bytes to %s: %s', len(data), path, e)
+        return sent
+
+    def listen(self, callback, loop=None):
+        """Bind the socket of this worker and call callback(data) on the event loop for every message."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f'{os.getpid()}-{id(self)}.sock')
+        _unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.sock.setblocking(False)
+        loop = loop or asyncio.get_running_loop()
+        loop.add_reader(self.sock.fileno(), self._receive, callback)
+        logger.debug('bus: listening on %s', self.path)
+
+    def close(self, loop=None):
+        if self.sock is not None:
+            (loop or asyncio.get_running_loop()).remove_reader(self.sock.fileno())
+            self.sock.close()
+            _unlink(self.path)
+            self.sock = None
+
+    def _receive(self, callback):
+        while True:
+            try:
+                data = self.sock.recv(1 << 20)
+            except BlockingIOError:
+                return
+            callback(data)
+
+
+class Publisher:
+    """Serializes and publishes messages on a background thread, dropping them when it can not keep up."""
+
+    def __init__(self, bus, maxsize=1000):
+        self.bus = bus
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, payload, plan):
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait((payload, plan))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='broadcast', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            payload, plan = self.queue.get()
+            try:
+                self.bus.publish(b'{"input": %s, "output": %s}' % (_json(payload), _json(plan)))
+            except Exception:
+                logger.exception('broadcast')
+
+
+class Subscriber:
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+
+class Hub:
+    """The websocket clients of this worker."""
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.subscribers = set()
+
+    def subscribe(self):
+        subscriber = Subscriber(self.maxsize)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def deliver(self, data):
+        """Queue the message for every client; it is decoded once and all clients share the text."""
+        text = data.decode()
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(text)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        logger.info('hub: dropping a slow websocket client')
+        self.unsubscribe(subscriber)
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(CLOSE)
+
+
+def _json(obj):
+    # bytes are json already, e.g. the request body or a response from the result cache
+    return obj.strip() if isinstance(obj, bytes) else json.dumps(obj).encode()
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+bus = Bus()
+publisher = Publisher(bus)
+hub = Hub()
+
+
+def publish(payload, plan):
+    """Broadcast a production plan with its input to the websocket clients, see the module docstring.
+
+    Both can also be given as json bytes.
+    """
+    publisher.publish(payload, plan)
@@ -15,41 +15,52 @@ def _handle_http_exception(error):
     The default handlers of Flask will return a html page, which is not what we want in a REST application.
     """
     current_app.logger.exception('HTTPException')
-    return jsonify({
-        'status_code': error.code,
-        'error': str(error),
-        'description': error.description,
-    }), error.code
+    return jsonify(error_to_dict(error)), error.code
 
 
 def _handle_exception(error):
     current_app.logger.exception('Unhandled exception')
-    return jsonify({
-        'status_code': 500,
-        'error': str(error),
-        'description': 'Internal Server Error',
-    }), 500
+    return jsonify(error_to_dict(error)), 500
 
 
 def _handle_api_error(error):
     current_app.logger.exception('APIError')
-    return jsonify(error.to_dict()), error.status_code
+    return jsonify(error.to_dict()), error.status_code, error.headers or {}
+
+
+def error_to_dict(error):
+    """The json body of the error response for error, for when there is no response to return it in."""
+    if isinstance(error, APIError):
+        return error.to_dict()
+    if isinstance(error, HTTPException):
+        return {
+            'status_code': error.code,
+            'error': str(error),
+            'description': error.description,
+        }
+    return {
+        'status_code': 500,
+        'error': str(error),
+        'description': 'Internal Server Error',
+    }
 
 
 class APIError(Exception):
     """A general exception class to raise for api errors, defaulting to "400, Bad Request".
 
-    If you want to return extra information you can pass in a dict for 'payload'.
+    If you want to return extra information you can pass in a dict for 'payload', and extra response headers in a
+    dict for 'headers'.
     """
 
     status_code = 400
 
-    def __init__(self, message="Bad Request", status_code=None, payload=None):
+    def __init__(self, message="Bad Request", status_code=None, payload=None, headers=None):
         super().__init__()
         self.message = message
         if status_code:
             self.status_code = status_code
         self.payload = payload
+        self.headers = headers
 
     def to_dict(self):
         result = dict(self.payload or ())
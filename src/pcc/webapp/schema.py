@@ -0,0 +1,155 @@
+"""Validation of the /productionplan payload.
+
+`parse_payload` checks the payload and builds the `pcc.util.Fleet` of the engines in the same pass over the
+powerplants, so a valid payload is walked only once and an invalid one is rejected at its first error, before any
+solving, with an `APIError` that says where the error is:
+
+    {"error": "Bad Request", "reason": "powerplants[2].pmin: must be <= pmax (460), got 500", "status_code": 400}
+
+The checks are written out for every field instead of interpreting a schema, the lookup tables they use are built
+once at import.
+"""
+import math
+import reprlib
+from array import array
+
+from pcc import metrics
+from pcc.util import RAMP_KEYS, Fleet, fuel_key, plant_types
+from .exceptions import APIError
+
+
+PLANT_KEYS = frozenset(('name', 'type', 'efficiency', 'pmin', 'pmax'))
+NUMBER_TYPES = frozenset((int, float))
+
+type_codes = {t: i for i, t in enumerate(plant_types)}
+WIND = type_codes['windturbine']
+
+
+def parse_payload(payload):
+    """Return the load and the `Fleet` of a /productionplan payload, or raise an APIError."""
+    if not isinstance(payload, dict):
+        _invalid('payload', 'must be an object', payload)
+    for key in ('load', 'fuels', 'powerplants'):
+        if key not in payload:
+            raise APIError(payload={'reason': f'Missing key "{key}"'})
+    load = payload['load']
+    if not _is_number(load) or load < 0:
+        _invalid('load', 'must be a number >= 0', load)
+    return load, parse_fleet(payload['fuels'], payload['powerplants'])
+
+
+def parse_fleet(fuels, powerplants, optional=frozenset()):
+    """Return the `Fleet` of the fuels and powerplants of a payload, or raise an APIError.
+
+    The powerplants may have the keys in optional too; they are not checked here.
+    """
+    price = _parse_fuels(fuels)
+    fraction = price[WIND] / 100.0
+    if not isinstance(powerplants, list):
+        _invalid('powerplants', 'must be a list', powerplants)
+
+    names = []
+    seen = set()
+    types = []
+    efficiency = []
+    pmin = []
+    pmax = []
+    cost = []
+    is_number = _is_number
+    for i, d in enumerate(powerplants):
+        if type(d) is not dict:
+            _invalid(f'powerplants[{i}]', 'must be an object', d)
+        if d.keys() != PLANT_KEYS:
+            _check_keys(i, d, optional)
+        name = d['name']
+        if type(name) is not str or not name:
+            _invalid(f'powerplants[{i}].name', 'must be a non-empty string', name)
+        if name in seen:
+            _invalid(f'powerplants[{i}].name', 'must be unique', name)
+        seen.add(name)
+        code = type_codes.get(d['type']) if type(d['type']) is str else None
+        if code is None:
+            _invalid(f'powerplants[{i}].type', f'must be one of {", ".join(plant_types)}', d['type'])
+        e = d['efficiency']
+        if not is_number(e) or e <= 0:
+            _invalid(f'powerplants[{i}].efficiency', 'must be a number > 0', e)
+        lo = d['pmin']
+        hi = d['pmax']
+        if not is_number(hi) or hi < 0:
+            _invalid(f'powerplants[{i}].pmax', 'must be a number >= 0', hi)
+        if not is_number(lo) or lo < 0:
+            _invalid(f'powerplants[{i}].pmin', 'must be a number >= 0', lo)
+        if lo > hi:
+            _invalid(f'powerplants[{i}].pmin', f'must be <= pmax ({hi})', lo)
+
+        names.append(name)
+        types.append(code)
+        efficiency.append(e)
+        pmin.append(lo)
+        if code == WIND:
+            pmax.append(round(hi * fraction, 1))
+            cost.append(0.0)
+        else:
+            pmax.append(hi)
+            cost.append(price[code] / e)
+    metrics.fleet_plants.labels().observe(len(names))
+    return Fleet(names, array('b', types), array('d', efficiency), array('d', pmin), array('d', pmax),
+                 array('d', cost))
+
+
+def _parse_fuels(fuels):
+    if not isinstance(fuels, dict):
+        _invalid('fuels', 'must be an object', fuels)
+    for key in fuel_key.values():
+        if key not in fuels:
+            raise APIError(payload={'reason': f'Missing key "fuels.{key}"'})
+        value = fuels[key]
+        if not _is_number(value) or value < 0:
+            _invalid(f'fuels.{key}', 'must be a number >= 0', value)
+    if fuels[fuel_key['windturbine']] > 100:
+        _invalid(f'fuels.{fuel_key["windturbine"]}', 'must be <= 100', fuels[fuel_key['windturbine']])
+    return [fuels[fuel_key[t]] for t in plant_types]
+
+
+def parse_loads(loads):
+    """Check the "loads" of a batch payload - a list of loads or of [load, wind%] pairs - or raise an APIError."""
+    if not isinstance(loads, list):
+        raise APIError(payload={'reason': '"loads" must be a list'})
+    for i, period in enumerate(loads):
+        where = f'loads[{i}]'
+        if isinstance(period, list):
+            if len(period) != 2:
+                raise APIError(payload={'reason': f'Expected a load or a [load, wind%] pair, got {period}'})
+            period, wind = period
+            if not _is_number(wind) or not 0 <= wind <= 100:
+                _invalid(f'{where}[1]', 'must be a number between 0 and 100', wind)
+            where += '[0]'
+        if not _is_number(period) or period < 0:
+            _invalid(where, 'must be a number >= 0', period)
+
+
+def parse_ramps(powerplants):
+    """Check the optional "rampup" and "rampdown" of the powerplants of a valid fleet, or raise an APIError."""
+    for i, d in enumerate(powerplants):
+        for key in RAMP_KEYS & d.keys():
+            value = d[key]
+            if not _is_number(value) or value < 0:
+                _invalid(f'powerplants[{i}].{key}', 'must be a number >= 0', value)
+
+
+def _check_keys(i, d, optional=frozenset()):
+    missing = PLANT_KEYS - d.keys()
+    if missing:
+        raise APIError(payload={'reason': f'Missing key "powerplants[{i}].{min(missing)}"'})
+    unknown = d.keys() - PLANT_KEYS - optional
+    if unknown:
+        raise APIError(payload={'reason': f'Unknown key "powerplants[{i}].{min(unknown)}"'})
+
+
+def _is_number(value):
+    # json numbers are int or float; bool is excluded on purpose
+    return type(value) in NUMBER_TYPES and math.isfinite(value)
+
+
+def _invalid(where, what, value):
+    raise APIError(payload={'reason': f'{where}: {what}, got {reprlib.repr(value)}'})
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+from pcc.webapp import api, asgi, create_app
+from pcc.webapp.admission import Admission, Rejected
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads')
+
+
+def hold(admission, priority):
+    """Enter a slot in a thread and return the thread, its release event and its outcome."""
+    entered = threading.Event()
+    done = threading.Event()
+    outcome = []
+
+    def run():
+        try:
+            with admission.slot(priority):
+                outcome.append('admitted')
+                entered.set()
+                done.wait(5)
+        except Rejected as e:
+            outcome.append(e)
+            entered.set()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, entered, done, outcome
+
+
+def wait_for_waiters(admission, n):
+    for _ in range(500):
+        if len(admission.waiting) == n:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f'expected {n} waiting, got {len(admission.waiting)}')
+
+
+def test_waiting_room():
+    admission = Admission(limit=1, max_wait=5)
+    first, entered, release_first, _ = hold(admission, admission.priority())
+    entered.wait(5)
+    second, admitted, release_second, outcome = hold(admission, admission.priority())
+    wait_for_waiters(admission, 1)
+    with pytest.raises(Rejected) as e:
+        with admission.slot(admission.priority()):
+            pass
+    assert e.value.status_code == 503
+    assert e.value.headers == {'Retry-After': '1'}
+    release_first.set()
+    admitted.wait(5)
+    assert outcome == ['admitted']
+    release_second.set()
+    first.join()
+    second.join()
+    assert admission.in_flight == 0
+
+
+def test_wait_timeout():
+    admission = Admission(limit=1, max_wait=0.01)
+    thread, entered, release, _ = hold(admission, admission.priority())
+    entered.wait(5)
+    with pytest.raises(Rejected) as e:
+        with admission.slot(admission.priority()):
+            pass
+    assert e.value.status_code == 503
+    assert admission.waiting == []
+    release.set()
+    thread.join()
+
+
+def test_priority():
+    admission = Admission(limit=1, max_wait=5)
+    first, entered, release_first, _ = hold(admission, admission.priority(size=10))
+    entered.wait(5)
+    huge, shed, _, huge_outcome = hold(admission, admission.priority(size=10 ** 6))
+    wait_for_waiters(admission, 1)
+    small, admitted, release_small, small_outcome = hold(admission, admission.priority(size=100))
+    shed.wait(5)
+    assert huge_outcome[0].status_code == 429
+    # a low priority is shed before any size
+    with pytest.raises(Rejected) as e:
+        with admission.slot(admission.priority('low', 1)):
+            pass
+    assert e.value.status_code == 429
+    release_first.set()
+    admitted.wait(5)
+    assert small_outcome == ['admitted']
+    release_small.set()
+    for thread in (first, huge, small):
+        thread.join()
+
+
+def test_limit_adapts():
+    admission = Admission(limit=4, max_limit=64)
+    admission.in_flight = 100  # busy: the limit may grow
+    for _ in range(50):
+        admission._observe(0.01)
+    grown = admission.limit
+    assert grown > 8
+    for _ in range(20):
+        admission._observe(0.2)
+    assert admission.limit < grown / 2
+    assert admission.limit >= admission.min_limit
+
+    idle = Admission(limit=4)
+    for _ in range(50):
+        idle._observe(0.01)
+    assert idle.limit == 4
+
+
+def test_async_slot():
+    admission = Admission(limit=1, max_wait=5)
+
+    async def solve(order, name, delay):
+        async with admission.async_slot(admission.priority(size=len(name))):
+            order.append(name)
+            await asyncio.sleep(delay)
+
+    async def main():
+        order = []
+        first = asyncio.create_task(solve(order, 'first', 0.05))
+        await asyncio.sleep(0)
+        huge = asyncio.create_task(solve(order, 'a huge fleet', 0))
+        await asyncio.sleep(0)
+        small = asyncio.create_task(solve(order, 'small', 0))
+        await asyncio.gather(first, small)
+        with pytest.raises(Rejected):
+            await huge
+        return order
+
+    assert asyncio.run(main()) == ['first', 'small']
+    assert admission.in_flight == 0
+
+
+@pytest.fixture
+def full(monkeypatch):
+    """An `Admission` with its only place taken, that rejects at once."""
+    admission = Admission(limit=1, max_wait=0)
+    admission.in_flight = 1
+    monkeypatch.setattr(api, 'get_admission', lambda: admission)
+    monkeypatch.setattr(asgi, 'get_admission', lambda: admission)
+    return admission
+
+
+def test_api_rejects(full):
+    with open(os.path.join(PAYLOADS, 'payload1.json')) as f:
+        payload = json.load(f)
+    response = create_app().test_client().post('/productionplan', json=payload)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()['error'] == 'Service Unavailable'
+    full.in_flight = 0
+    assert create_app().test_client().post('/productionplan', json=payload).status_code == 200
+
+
+def test_asgi_rejects(full):
+    with open(os.path.join(PAYLOADS, 'payload1.json'), 'rb') as f:
+        body = f.read()
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/productionplan',
+             'headers': [(b'content-type', b'application/json'), (b'x-priority', b'high')]}
+    asyncio.run(asgi.app(scope, receive, send))
+    assert sent[0]['status'] == 503
+    assert dict(sent[0]['headers'])[b'retry-after'] == b'1'
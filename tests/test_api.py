@@ -0,0 +1,240 @@
+import json
+import math
+import os
+import subprocess
+import sys
+
+import pytest
+
+from pcc.webapp import create_app
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads')
+
+
+def load_payload(name):
+    with open(os.path.join(PAYLOADS, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    return app.test_client()
+
+
+def test_productionplan(client):
+    response = client.post('/productionplan', json=load_payload('payload3.json'))
+    assert response.status_code == 200
+    assert math.isclose(sum(d['p'] for d in response.get_json()), 910)
+
+
+def test_productionplan_missing_key(client):
+    response = client.post('/productionplan', json={'load': 910})
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == 'Missing key "fuels"'
+
+
+def test_batch(client):
+    payload = load_payload('payload3.json')
+    loads = [480, 910, 600.5]
+    response = client.post('/productionplan/batch', json={**payload, 'loads': loads})
+    assert response.status_code == 200
+    plans = response.get_json()
+    assert len(plans) == 3
+    for load, plan in zip(loads, plans):
+        expected = client.post('/productionplan', json={**payload, 'load': load}).get_json()
+        assert all(math.isclose(a['p'], b['p']) for a, b in zip(plan, expected))
+
+
+def test_batch_with_wind(client):
+    payload = load_payload('payload3.json')
+    response = client.post('/productionplan/batch', json={**payload, 'loads': [[480, 0], [480, 100]]})
+    assert response.status_code == 200
+    no_wind, full_wind = response.get_json()
+    assert no_wind[4] == {'name': 'windpark1', 'p': 0.0}
+    assert full_wind[4] == {'name': 'windpark1', 'p': 150.0}
+
+
+def test_batch_bad_loads(client):
+    payload = load_payload('payload3.json')
+    response = client.post('/productionplan/batch', json={**payload, 'loads': 480})
+    assert response.status_code == 400
+    response = client.post('/productionplan/batch', json={**payload, 'loads': [[480, 0, 1]]})
+    assert response.status_code == 400
+    for loads, reason in (([[480, 'x']], "loads[0][1]: must be a number between 0 and 100, got 'x'"),
+                          ([[480, 150]], 'loads[0][1]: must be a number between 0 and 100, got 150'),
+                          ([480, 'abc'], "loads[1]: must be a number >= 0, got 'abc'"),
+                          ([[-1, 50]], 'loads[0][0]: must be a number >= 0, got -1')):
+        response = client.post('/productionplan/batch', json={**payload, 'loads': loads})
+        assert response.status_code == 400
+        assert response.get_json()['reason'] == reason
+
+
+def test_multiperiod(client):
+    payload = load_payload('payload3.json')
+    payload['powerplants'][0].update(rampup=150, rampdown=100)
+    loads = [480, [910, 60], [480, 20]]
+    response = client.post('/productionplan/multiperiod', json={**payload, 'loads': loads})
+    assert response.status_code == 200
+    plans = response.get_json()
+    assert len(plans) == 3
+    for plan, load in zip(plans, [480, 910, 480]):
+        assert math.isclose(sum(d['p'] for d in plan), load)
+    p = [plan[0]['p'] for plan in plans]
+    assert p[1] - p[0] <= 150 + 1e-6 and p[1] - p[2] <= 100 + 1e-6
+
+
+def test_multiperiod_invalid(client):
+    payload = load_payload('payload3.json')
+    payload['powerplants'][0]['rampup'] = -1
+    response = client.post('/productionplan/multiperiod', json={**payload, 'loads': [480]})
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == 'powerplants[0].rampup: must be a number >= 0, got -1'
+    payload['powerplants'][0]['rampup'] = 10
+    response = client.post('/productionplan/multiperiod', json={**payload, 'loads': []})
+    assert response.get_json()['reason'] == '"loads" must not be empty'
+    payload['powerplants'][0]['ramp'] = 1
+    response = client.post('/productionplan/multiperiod', json={**payload, 'loads': [480]})
+    assert response.get_json()['reason'] == 'Unknown key "powerplants[0].ramp"'
+    del payload['powerplants'][0]['ramp']
+    response = client.post('/productionplan/multiperiod', json={**payload, 'loads': [480, 'x']})
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == "loads[1]: must be a number >= 0, got 'x'"
+    response = client.post('/productionplan/batch', json={**load_payload('payload3.json'), 'loads': [480]})
+    assert response.status_code == 200
+    payload = load_payload('payload3.json')
+    payload['powerplants'][0]['rampup'] = 10
+    response = client.post('/productionplan/batch', json={**payload, 'loads': [480]})
+    assert response.get_json()['reason'] == 'Unknown key "powerplants[0].rampup"'
+
+
+def test_stream(client):
+    payload = load_payload('payload3.json')
+    loads = [480, 910, 2000, 600.5]
+    lines = [json.dumps({**payload, 'load': load}) for load in loads]
+    lines[1:1] = ['', 'not json', json.dumps({'load': 480})]
+    response = client.post('/productionplan/stream', data='\n'.join(lines) + '\n')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    results = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert len(results) == 6
+    assert results[1]['status_code'] == 400
+    assert results[2]['reason'] == 'Missing key "fuels"'
+    assert results[4]['status_code'] == 500
+    for load, plan in zip([480, 910, 600.5], [results[0], results[3], results[5]]):
+        assert math.isclose(sum(d['p'] for d in plan), load)
+
+
+def test_result_cache(client, tmp_path, monkeypatch):
+    from pcc.cache import SharedCache
+    from pcc.webapp import api
+    monkeypatch.setattr(api, '_result_cache', SharedCache(str(tmp_path / 'results.db')))
+    solves = []
+
+    def solve(*args):
+        solves.append(args)
+        return args[0](*args[1:])
+
+    monkeypatch.setattr(api, 'solve', solve)
+    payload = load_payload('payload1.json')
+    first = client.post('/productionplan', json=payload)
+    # the same payload with the keys in another order
+    second = client.post('/productionplan', json=dict(reversed(payload.items())))
+    assert first.status_code == second.status_code == 200
+    assert second.content_type == 'application/json'
+    assert first.get_data() == second.get_data()
+    assert len(solves) == 1
+    # a repeated body is answered without parsing it
+    monkeypatch.setattr(api, 'parse_payload', None)
+    assert client.post('/productionplan', json=payload).get_data() == first.get_data()
+    monkeypatch.undo()
+    monkeypatch.setattr(api, '_result_cache', SharedCache(str(tmp_path / 'results.db')))
+    monkeypatch.setattr(api, 'solve', solve)
+    assert client.post('/productionplan', json=dict(payload, load=481)).status_code == 200
+    assert len(solves) == 2
+
+
+def test_scenarios(client):
+    payload = load_payload('payload3.json')
+    fuels = payload.pop('fuels')
+    sweep = [fuels, dict(fuels, **{'wind(%)': 0}), dict(fuels, load=480), dict(fuels, load=2000)]
+    response = client.post('/productionplan/scenarios', json={**payload, 'scenarios': sweep, 'plans': True})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r['scenario'] for r in lines[:-1]] == [0, 1, 2, 3]
+    for result in lines[:2]:
+        plan = client.post('/productionplan', json={**payload, 'fuels': result['fuels']}).get_json()
+        assert result['plan'] == plan
+    assert math.isclose(sum(d['p'] for d in lines[2]['plan']), 480)
+    assert 'error' in lines[3]
+    summary = lines[-1]['summary']
+    assert summary['scenarios'] == 4
+    assert summary['infeasible'] == 1
+    assert summary['min'] < summary['max']
+
+
+def test_scenarios_invalid(client):
+    payload = load_payload('payload3.json')
+    fuels = payload.pop('fuels')
+    response = client.post('/productionplan/scenarios', json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == 'Missing key "scenarios" or "sampler"'
+    response = client.post('/productionplan/scenarios', json={**payload, 'scenarios': [dict(fuels, gas=1), {}]})
+    assert response.get_json()['reason'] == 'scenarios[1].gas(euro/MWh): must be a number >= 0, got None'
+    powerplants = payload['powerplants'] + [{'name': 'x', 'type': 'gasfired', 'efficiency': 0.5}]
+    response = client.post('/productionplan/scenarios', json={**payload, 'powerplants': powerplants,
+                                                              'scenarios': [fuels]})
+    assert response.get_json()['reason'] == 'Missing key "powerplants[6].pmax"'
+    del powerplants[6]['name']
+    response = client.post('/productionplan/scenarios', json={**payload, 'powerplants': powerplants,
+                                                              'scenarios': [fuels]})
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == 'Missing key "powerplants[6].name"'
+    response = client.post('/productionplan/scenarios', json={**payload, 'powerplants': {}, 'scenarios': [fuels]})
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == 'powerplants: must be a list, got {}'
+    sampler = dict(fuels, n=2, seed=1.5)
+    response = client.post('/productionplan/scenarios', json={**payload, 'sampler': sampler})
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == 'sampler.seed: must be an integer >= 0, got 1.5'
+
+
+def test_engine(client):
+    # a pmin binds: the engine is the branch and bound, the naive one finds no plan
+    payload = load_payload('payload3.json')
+    binding = {
+        'load': 120,
+        'fuels': payload['fuels'],
+        'powerplants': [
+            {'name': 'p0', 'type': 'gasfired', 'efficiency': 0.3, 'pmin': 25, 'pmax': 50},
+            {'name': 'p1', 'type': 'gasfired', 'efficiency': 0.4, 'pmin': 0, 'pmax': 50},
+            {'name': 'p2', 'type': 'gasfired', 'efficiency': 0.3, 'pmin': 75, 'pmax': 100},
+        ],
+    }
+    response = client.post('/productionplan', json=binding)
+    assert response.status_code == 200
+    assert [d['p'] for d in response.get_json()] == [0.0, 45.0, 75.0]
+    response = client.post('/productionplan', json=dict(binding, engine='naive'))
+    assert response.status_code == 500
+    response = client.post('/productionplan', json=dict(binding, engine='fastest'))
+    assert response.status_code == 400
+    assert response.get_json()['reason'].startswith('engine: must be one of auto, naive, bnb')
+
+
+def test_warm_up(tmp_path):
+    from pcc.webapp import warm_up
+    for name in ('payload1.json', 'payload3.json'):
+        (tmp_path / name).write_text(json.dumps(load_payload(name)))
+    (tmp_path / 'invalid.json').write_text('{"load": 10}')
+    assert warm_up(str(tmp_path)) == 2
+    assert warm_up() == 3
+
+
+def test_lazy_imports():
+    # NumPy is only needed by the multiperiod and scenario endpoints
+    code = 'import sys, pcc.webapp.api; print("numpy" in sys.modules)'
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            env=dict(os.environ, PYTHONPATH=os.path.join(os.path.dirname(__file__), '..', 'src')))
+    assert result.stdout.strip() == 'False'
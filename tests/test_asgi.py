@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from pcc.webapp import create_app
+from pcc.webapp.asgi import app
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads')
+
+
+def load_payload(name):
+    with open(os.path.join(PAYLOADS, name)) as f:
+        return json.load(f)
+
+
+def request(method, path, body=b'', content_type=b'application/json'):
+    """Call the ASGI app, with the body sent in two chunks, and return the status and the decoded response."""
+    messages = [
+        {'type': 'http.request', 'body': body[:10], 'more_body': True},
+        {'type': 'http.request', 'body': body[10:], 'more_body': False},
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'headers': [(b'content-type', content_type)]}
+    asyncio.run(app(scope, receive, send))
+    status = sent[0]['status']
+    body = b''.join(message['body'] for message in sent[1:])
+    return status, json.loads(body) if dict(sent[0]['headers'])[b'content-type'] == b'application/json' else body
+
+
+@pytest.fixture
+def client():
+    return create_app().test_client()
+
+
+@pytest.mark.parametrize('name', ['payload1.json', 'payload2.json', 'payload3.json'])
+def test_productionplan(client, name):
+    payload = load_payload(name)
+    status, result = request('POST', '/productionplan', json.dumps(payload).encode())
+    assert status == 200
+    assert result == client.post('/productionplan', json=payload).get_json()
+
+
+def test_batch(client):
+    payload = {**load_payload('payload3.json'), 'loads': [480, [910, 30]]}
+    status, result = request('POST', '/productionplan/batch', json.dumps(payload).encode())
+    assert status == 200
+    assert result == client.post('/productionplan/batch', json=payload).get_json()
+
+
+def test_multiperiod(client):
+    payload = load_payload('payload3.json')
+    payload['powerplants'][0].update(rampup=150, rampdown=100)
+    payload['loads'] = [480, [910, 60], [480, 20]]
+    status, result = request('POST', '/productionplan/multiperiod', json.dumps(payload).encode())
+    assert status == 200
+    assert result == client.post('/productionplan/multiperiod', json=payload).get_json()
+    payload['loads'] = [480, 'x']
+    status, result = request('POST', '/productionplan/multiperiod', json.dumps(payload).encode())
+    assert status == 400
+
+
+def test_stream(client):
+    payload = load_payload('payload3.json')
+    body = ''.join(json.dumps({**payload, 'load': load}) + '\n' for load in (480, 910, 2000)) + 'not json\n'
+    status, result = request('POST', '/productionplan/stream', body.encode(), b'application/x-ndjson')
+    assert status == 200
+    lines = [json.loads(line) for line in result.splitlines()]
+    expected = [json.loads(line) for line in client.post('/productionplan/stream', data=body).data.splitlines()]
+    assert lines == expected
+    assert lines[2]['status_code'] == 500
+
+
+def test_scenarios(client):
+    payload = load_payload('payload3.json')
+    fuels = payload.pop('fuels')
+    payload['scenarios'] = [fuels, dict(fuels, **{'wind(%)': 0}), dict(fuels, load=2000)]
+    status, result = request('POST', '/productionplan/scenarios', json.dumps(payload).encode())
+    assert status == 200
+    lines = [json.loads(line) for line in result.splitlines()]
+    expected = [json.loads(line) for line in client.post('/productionplan/scenarios', json=payload).data.splitlines()]
+    assert lines == expected
+    assert lines[-1]['summary']['scenarios'] == 3
+
+
+@pytest.mark.parametrize('method, path, body, content_type', [
+    ('POST', '/productionplan', b'{"load": 910}', b'application/json'),
+    ('POST', '/productionplan', b'{"load": 910}', b'text/plain'),
+    ('POST', '/productionplan', b'{"load": ', b'application/json'),
+    ('POST', '/productionplan/batch', b'{"loads": 1, "fuels": {}, "powerplants": []}', b'application/json'),
+    ('GET', '/productionplan', b'', b''),
+    ('GET', '/nowhere', b'', b''),
+])
+def test_errors(client, method, path, body, content_type):
+    status, result = request(method, path, body, content_type)
+    expected = client.open(path, method=method, data=body, content_type=content_type.decode() or None)
+    assert status == expected.status_code
+    assert result['status_code'] == status
+    assert result.keys() == expected.get_json().keys()
+
+
+def test_solve_error(client):
+    payload = {**load_payload('payload3.json'), 'load': 5000}
+    status, result = request('POST', '/productionplan', json.dumps(payload).encode())
+    assert status == 500
+    assert result == client.post('/productionplan', json=payload).get_json()
+
+
+def test_result_cache(client, tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from pcc.cache import SharedCache
+    from pcc.webapp import api, asgi
+    cache = SharedCache(str(tmp_path / 'results.db'))
+    monkeypatch.setattr(api, '_result_cache', cache)
+    monkeypatch.setattr(asgi, 'executor', ThreadPoolExecutor(1))
+    payload = load_payload('payload2.json')
+    status, first = request('POST', '/productionplan', json.dumps(payload).encode())
+    # wait for the put
+    asgi.executor.submit(len, ()).result()
+    # under the body and under the load and fleet
+    assert len(cache) == 2
+    monkeypatch.setattr(asgi, 'solve', None)
+    status, second = request('POST', '/productionplan', json.dumps(payload).encode())
+    assert status == 200
+    status, third = request('POST', '/productionplan', json.dumps(payload, indent=2).encode())
+    assert status == 200
+    assert first == second == third == client.post('/productionplan', json=payload).get_json()
+    asgi.executor.shutdown()
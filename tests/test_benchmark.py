@@ -0,0 +1,38 @@
+import json
+
+from pcc import benchmark
+
+
+def test_generate_fleet():
+    config = benchmark.generate_fleet(1000, seed=3, wind=40)
+    assert config == benchmark.generate_fleet(1000, seed=3, wind=40)
+    assert config != benchmark.generate_fleet(1000, seed=4, wind=40)
+    assert config['fuels']['wind(%)'] == 40
+    powerplants = config['powerplants']
+    assert len(powerplants) == 1000
+    assert len({d['name'] for d in powerplants}) == 1000
+    assert {d['type'] for d in powerplants} == {'gasfired', 'turbojet', 'windturbine'}
+    assert all(0 <= d['pmin'] <= d['pmax'] for d in powerplants)
+    assert len({d['pmax'] for d in powerplants}) > 100
+
+
+def test_run():
+    records = list(benchmark.run(engines=('naive', 'simplex_numpy'), sizes=(10, 400), loads=(0.2, 0.8), repeat=2))
+    assert len(records) == 2 * 2 * 2
+    for record in records:
+        json.dumps(record)
+        if record['engine'] == 'simplex_numpy' and record['size'] == 400:
+            assert record['skipped']
+            continue
+        assert record['best'] <= record['median']
+        assert record['peak_memory'] > 0
+        if record['engine'] == 'naive':
+            assert record['ok']
+            assert abs(record['allocated'] - record['load']) < 1e-6
+    assert 'skipped' in benchmark.format_table(records)
+
+
+def test_main(capsys):
+    benchmark.main(['--engines', 'naive', 'bounded', '--sizes', '10', '--repeat', '1'])
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)['engine'] for line in lines] == ['naive', 'bounded']
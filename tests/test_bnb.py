@@ -0,0 +1,189 @@
+import itertools
+import math
+import random
+
+from pcc.bnb import distribute_fleet, distribute_load, allocate_load
+from pcc.util import Fleet, Plant
+
+
+def make_config(load, wind):
+    return {
+        "load": load,
+        "fuels":
+        {
+            "gas(euro/MWh)": 13.4,
+            "kerosine(euro/MWh)": 50.8,
+            "co2(euro/ton)": 20,
+            "wind(%)": wind
+        },
+        "powerplants": [
+            {
+            "name": "gasfiredbig1",
+            "type": "gasfired",
+            "efficiency": 0.53,
+            "pmin": 100,
+            "pmax": 460
+            },
+            {
+            "name": "gasfiredbig2",
+            "type": "gasfired",
+            "efficiency": 0.53,
+            "pmin": 100,
+            "pmax": 460
+            },
+            {
+            "name": "gasfiredsomewhatsmaller",
+            "type": "gasfired",
+            "efficiency": 0.37,
+            "pmin": 40,
+            "pmax": 210
+            },
+            {
+            "name": "tj1",
+            "type": "turbojet",
+            "efficiency": 0.3,
+            "pmin": 0,
+            "pmax": 16
+            },
+            {
+            "name": "windpark1",
+            "type": "windturbine",
+            "efficiency": 1,
+            "pmin": 0,
+            "pmax": 150
+            },
+            {
+            "name": "windpark2",
+            "type": "windturbine",
+            "efficiency": 1,
+            "pmin": 0,
+            "pmax": 36
+            }
+        ]
+    }
+
+
+def test_payload1():
+    expected = [
+        {"name": "gasfiredbig1", "p": 368.4},
+        {"name": "gasfiredbig2", "p": 0.0},
+        {"name": "gasfiredsomewhatsmaller", "p": 0.0},
+        {"name": "tj1", "p": 0.0},
+        {"name": "windpark1", "p": 90.0},
+        {"name": "windpark2", "p": 21.6}
+    ]
+    result = distribute_load(make_config(480, 60))
+    assert result == expected
+
+
+def test_payload2():
+    expected = [
+        {"name": "gasfiredbig1", "p": 380.0},
+        {"name": "gasfiredbig2", "p": 100.0},
+        {"name": "gasfiredsomewhatsmaller", "p": 0.0},
+        {"name": "tj1", "p": 0.0},
+        {"name": "windpark1", "p": 0.0},
+        {"name": "windpark2", "p": 0.0}
+    ]
+    result = distribute_load(make_config(480, 0))
+    assert result == expected
+
+
+def test_payload3():
+    expected = [
+        {"name": "gasfiredbig1", "p": 460.0},
+        {"name": "gasfiredbig2", "p": 338.4},
+        {"name": "gasfiredsomewhatsmaller", "p": 0.0},
+        {"name": "tj1", "p": 0.0},
+        {"name": "windpark1", "p": 90.0},
+        {"name": "windpark2", "p": 21.6}
+    ]
+    result = distribute_load(make_config(910, 60))
+    assert result == expected
+
+
+def test_payload4():
+    """Case where requested load is too little for any plant.
+    """
+    try:
+        distribute_load(make_config(20, 0))
+    except Exception:
+        pass
+    else:
+        assert False, 'No exception raised'
+
+
+def test_payload5():
+    """Case where requested load is larger than the total capacity.
+    """
+    try:
+        distribute_load(make_config(1200, 0))
+    except Exception:
+        pass
+    else:
+        assert False, 'No exception raised'
+
+
+def test_several_pmin_plants():
+    """The naive algorithm fails here: it can only take load back from a single cheaper plant.
+    """
+    config = {
+        "load": 110,
+        "fuels": {"gas(euro/MWh)": 10, "kerosine(euro/MWh)": 20, "co2(euro/ton)": 0, "wind(%)": 0},
+        "powerplants": [
+            {"name": "a", "type": "gasfired", "efficiency": 1, "pmin": 0, "pmax": 50},
+            {"name": "b", "type": "gasfired", "efficiency": 1, "pmin": 0, "pmax": 50},
+            {"name": "c", "type": "turbojet", "efficiency": 1, "pmin": 80, "pmax": 200},
+        ]
+    }
+    result = distribute_load(config)
+    assert math.isclose(sum(d['p'] for d in result), 110)
+    assert result[2] == {"name": "c", "p": 80.0}
+
+
+def brute_force(load, plants):
+    units = [p for p in plants.values() if p.pmax > 0]
+    best = math.inf
+    for on in itertools.product((False, True), repeat=len(units)):
+        chosen = sorted((u for u, o in zip(units, on) if o), key=lambda u: u.cost)
+        lo = sum(u.pmin for u in chosen)
+        hi = sum(u.pmax for u in chosen)
+        if not lo <= load <= hi:
+            continue
+        remaining = load - lo
+        cost = 0.0
+        for u in chosen:
+            extra = min(remaining, u.pmax - u.pmin)
+            remaining -= extra
+            cost += u.cost * (u.pmin + extra)
+        best = min(best, cost)
+    return best
+
+
+def test_random_fleets_are_optimal():
+    rng = random.Random(42)
+    for _ in range(50):
+        plants = {}
+        for i in range(8):
+            pmax = rng.choice((20, 50, 100, 200))
+            pmin = rng.choice((0, pmax // 4, pmax // 2))
+            plants[f'p{i}'] = Plant(name=f'p{i}', type='gasfired', pmin=pmin, pmax=pmax, cost=rng.choice((10, 20, 30)))
+        merit_order = sorted(plants, key=lambda name: plants[name].cost)
+        load = rng.randrange(10, 600)
+        expected = brute_force(load, plants)
+        load_plan = allocate_load(load, plants, merit_order)
+        if expected == math.inf:
+            assert not math.isclose(sum(load_plan.values()), load)
+            continue
+        cost = sum(plants[name].cost * p for name, p in load_plan.items())
+        assert math.isclose(cost, expected)
+        for name, p in load_plan.items():
+            assert p == 0 or plants[name].pmin <= p <= plants[name].pmax
+
+
+def test_distribute_fleet(monkeypatch):
+    monkeypatch.setattr(Fleet, 'plants', None)
+    for load, wind in ((480, 60), (910, 0), (120, 100), (45, 0)):
+        config = make_config(load, wind)
+        fleet = Fleet.from_powerplants(config['powerplants'], config['fuels'])
+        assert distribute_fleet(load, fleet) == distribute_load(config)
@@ -0,0 +1,175 @@
+import math
+import random
+
+import pytest
+
+from pcc.bounded import RevisedSimplex, Session, distribute_load, prepare_input, allocate_load
+from pcc.simplex_numpy import simplex
+from pcc.trace import SolveStats
+from pcc.util import Plant
+
+
+def make_config(load, wind):
+    return {
+        "load": load,
+        "fuels":
+        {
+            "gas(euro/MWh)": 13.4,
+            "kerosine(euro/MWh)": 50.8,
+            "co2(euro/ton)": 20,
+            "wind(%)": wind
+        },
+        "powerplants": [
+            {
+            "name": "gasfiredbig1",
+            "type": "gasfired",
+            "efficiency": 0.53,
+            "pmin": 100,
+            "pmax": 460
+            },
+            {
+            "name": "gasfiredbig2",
+            "type": "gasfired",
+            "efficiency": 0.53,
+            "pmin": 100,
+            "pmax": 460
+            },
+            {
+            "name": "gasfiredsomewhatsmaller",
+            "type": "gasfired",
+            "efficiency": 0.37,
+            "pmin": 40,
+            "pmax": 210
+            },
+            {
+            "name": "tj1",
+            "type": "turbojet",
+            "efficiency": 0.3,
+            "pmin": 0,
+            "pmax": 16
+            },
+            {
+            "name": "windpark1",
+            "type": "windturbine",
+            "efficiency": 1,
+            "pmin": 0,
+            "pmax": 150
+            },
+            {
+            "name": "windpark2",
+            "type": "windturbine",
+            "efficiency": 1,
+            "pmin": 0,
+            "pmax": 36
+            }
+        ]
+    }
+
+
+def test_payload1():
+    """All plants are committed: the gas plants run at least at pmin.
+    """
+    expected = [
+        {"name": "gasfiredbig1", "p": 228.4},
+        {"name": "gasfiredbig2", "p": 100.0},
+        {"name": "gasfiredsomewhatsmaller", "p": 40.0},
+        {"name": "tj1", "p": 0.0},
+        {"name": "windpark1", "p": 90.0},
+        {"name": "windpark2", "p": 21.6}
+    ]
+    result = distribute_load(make_config(480, 60))
+    assert result == expected
+
+
+def test_load_below_pmin():
+    with pytest.raises(Exception):
+        distribute_load(make_config(200, 0))
+
+
+def test_load_above_capacity():
+    with pytest.raises(Exception):
+        distribute_load(make_config(1200, 0))
+
+
+def test_merit_order():
+    rng = random.Random(3)
+    plants = {}
+    for i in range(200):
+        pmax = rng.choice((50, 100, 200))
+        plants[f'p{i}'] = Plant(name=f'p{i}', type='gasfired', pmin=rng.choice((0, pmax / 4)), pmax=pmax,
+                                cost=rng.uniform(10, 50))
+    lo = sum(p.pmin for p in plants.values())
+    hi = sum(p.pmax for p in plants.values())
+    load = (lo + hi) / 3
+    expected = 0.0
+    remaining = load - lo
+    for p in sorted(plants.values(), key=lambda p: p.cost):
+        extra = min(remaining, p.pmax - p.pmin)
+        remaining -= extra
+        expected += p.cost * (p.pmin + extra)
+    load_plan = allocate_load(load, plants)
+    assert math.isclose(sum(load_plan.values()), load)
+    assert math.isclose(sum(plants[name].cost * p for name, p in load_plan.items()), expected)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_general_lp(seed):
+    """min c x s.t. A x <= b, x >= 0, written with slack variables, compared with the tableau simplex.
+    """
+    rng = random.Random(seed)
+    n = rng.randrange(2, 8)
+    m = rng.randrange(2, 8)
+    c = [rng.randrange(-5, 10) for _ in range(n)]
+    A = [[rng.randrange(0, 10) for _ in range(n)] for _ in range(m)]
+    b = [rng.randrange(10, 100) for _ in range(m)]
+    expected = simplex(c, A, b)
+
+    columns = [[(i, A[i][j]) for i in range(m) if A[i][j]] for j in range(n)]
+    columns += [[(i, 1.0)] for i in range(m)]
+    lp = RevisedSimplex(c + [0] * m, columns, b, [0] * (n + m), [math.inf] * (n + m))
+    lp.solve()
+    assert math.isclose(lp.objective, expected['z'], abs_tol=1e-9)
+
+
+def test_refactorization():
+    rng = random.Random(11)
+    n = m = 30
+    c = [rng.randrange(-9, 10) for _ in range(n)]
+    A = [[rng.randrange(0, 10) for _ in range(n)] for _ in range(m)]
+    b = [rng.randrange(50, 500) for _ in range(m)]
+    expected = simplex(c, A, b)
+
+    columns = [[(i, A[i][j]) for i in range(m) if A[i][j]] for j in range(n)]
+    columns += [[(i, 1.0)] for i in range(m)]
+    lp = RevisedSimplex(c + [0] * m, columns, b, [0] * (n + m), [math.inf] * (n + m))
+    lp.refactor_interval = 3
+    lp.solve()
+    assert math.isclose(lp.objective, expected['z'], abs_tol=1e-9)
+
+
+def test_stats():
+    stats = SolveStats()
+    distribute_load(make_config(480, 60), stats=stats)
+    assert stats.phase1_iterations > 0
+    assert stats.pivots <= stats.iterations
+
+
+def test_session():
+    session = Session(*prepare_input(make_config(480, 60)))
+    for load in (480, 500, 910, 600, 1100, 400.5):
+        stats = SolveStats()
+        result = session.resolve(load, stats=stats)
+        expected = distribute_load(make_config(load, 60))
+        assert stats.phase1_iterations == 0
+        assert math.isclose(sum(d['p'] for d in result), load)
+        # gasfiredbig1 and gasfiredbig2 have the same cost, so only the total of the pair is unique
+        assert math.isclose(result[0]['p'] + result[1]['p'], expected[0]['p'] + expected[1]['p'])
+        assert all(math.isclose(a['p'], b['p'], abs_tol=1e-9) for a, b in zip(result[2:], expected[2:]))
+
+
+def test_session_infeasible_load():
+    session = Session(*prepare_input(make_config(480, 60)))
+    with pytest.raises(Exception):
+        session.resolve(200)
+    result = session.resolve(910)
+    assert math.isclose(sum(d['p'] for d in result), 910)
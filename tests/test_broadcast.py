@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+import socket
+
+from pcc.webapp import broadcast, create_app
+from pcc.webapp.asgi import app
+from pcc.webapp.broadcast import CLOSE, Bus, Hub, Publisher
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads')
+
+
+def test_publish_to_all_workers(tmp_path):
+    async def main():
+        hubs = [Hub(), Hub()]
+        buses = [Bus(str(tmp_path)), Bus(str(tmp_path))]
+        subscribers = [hub.subscribe() for hub in hubs]
+        for bus, hub in zip(buses, hubs):
+            bus.listen(hub.deliver)
+        Publisher(Bus(str(tmp_path))).publish({'load': 1}, [{'name': 'a', 'p': 1.0}])
+        try:
+            for subscriber in subscribers:
+                text = await asyncio.wait_for(subscriber.queue.get(), 5)
+                assert json.loads(text) == {'input': {'load': 1}, 'output': [{'name': 'a', 'p': 1.0}]}
+        finally:
+            for bus in buses:
+                bus.close()
+        assert os.listdir(tmp_path) == []
+
+    asyncio.run(main())
+
+
+def test_slow_client_is_dropped():
+    async def main():
+        hub = Hub(maxsize=2)
+        slow, fast = hub.subscribe(), hub.subscribe()
+        for i in range(3):
+            hub.deliver(b'%d' % i)
+            await fast.queue.get()
+        assert slow.dropped and not fast.dropped
+        assert slow.queue.get_nowait() is CLOSE
+        assert hub.subscribers == {fast}
+
+    asyncio.run(main())
+
+
+def test_stale_socket_is_removed(tmp_path):
+    path = str(tmp_path / 'gone.sock')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    sock.close()
+    assert Bus(str(tmp_path)).publish(b'{}') == 0
+    assert not os.path.exists(path)
+
+
+def test_websocket():
+    async def main():
+        incoming = asyncio.Queue()
+        sent = asyncio.Queue()
+        await incoming.put({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': '/ws', 'headers': []}
+        task = asyncio.create_task(app(scope, incoming.get, sent.put))
+        assert (await sent.get())['type'] == 'websocket.accept'
+        while not broadcast.hub.subscribers:
+            await asyncio.sleep(0)
+        broadcast.hub.deliver(b'{"input": {}, "output": []}')
+        assert await sent.get() == {'type': 'websocket.send', 'text': '{"input": {}, "output": []}'}
+        await incoming.put({'type': 'websocket.disconnect'})
+        await task
+        assert not broadcast.hub.subscribers
+
+    asyncio.run(main())
+
+
+def test_productionplan_publishes(monkeypatch):
+    published = []
+    monkeypatch.setattr(broadcast, 'publish', lambda payload, plan: published.append((payload, plan)))
+    with open(os.path.join(PAYLOADS, 'payload3.json')) as f:
+        payload = json.load(f)
+    response = create_app().test_client().post('/productionplan', json=payload)
+    assert published == [(payload, response.get_json())]
+
+
+def test_bus_dir_from_env(tmp_path, monkeypatch):
+    bus = Bus()
+    # gunicorn_conf.py sets it after a preloaded app has created its Bus
+    monkeypatch.setenv('PCC_BUS_DIR', str(tmp_path))
+    assert bus.directory == str(tmp_path)
@@ -0,0 +1,97 @@
+from pcc import naive
+from pcc.cache import LRUCache, SharedCache, fingerprint, fleet_key
+
+
+def test_fingerprint_ignores_key_order():
+    assert fingerprint({'a': 1, 'b': [1, 2]}) == fingerprint({'b': [1, 2], 'a': 1})
+    assert fingerprint({'a': 1}) != fingerprint({'a': 2})
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats.evictions == 1
+    assert cache.stats.hits == 3
+    assert cache.stats.misses == 1
+
+
+def test_ttl():
+    now = [0.0]
+    cache = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put('a', 1)
+    now[0] = 9.9
+    assert cache.get('a') == 1
+    now[0] = 10.0
+    assert cache.get('a') is None
+    assert cache.stats.expirations == 1
+    assert len(cache) == 0
+
+
+def test_prepare_input_is_cached():
+    config = {
+        "load": 480,
+        "fuels": {"gas(euro/MWh)": 13.4, "kerosine(euro/MWh)": 50.8, "co2(euro/ton)": 20, "wind(%)": 60},
+        "powerplants": [
+            {"name": "gasfiredbig1", "type": "gasfired", "efficiency": 0.53, "pmin": 100, "pmax": 460},
+            {"name": "windpark1", "type": "windturbine", "efficiency": 1, "pmin": 0, "pmax": 150},
+        ]
+    }
+    naive.prepare_cache.clear()
+    _, plants, merit_order = naive.prepare_input(config)
+    load, cached_plants, cached_merit_order = naive.prepare_input(dict(config, load=500))
+    assert load == 500
+    assert cached_plants is plants
+    assert cached_merit_order is merit_order
+    assert naive.prepare_cache.stats.hits == 1
+    assert naive.prepare_cache.stats.misses == 1
+
+
+def test_fleet_key():
+    fuels = {'gas(euro/MWh)': 13.4, 'wind(%)': 60}
+    plant = {'name': 'gasfiredbig1', 'type': 'gasfired', 'efficiency': 0.53, 'pmin': 100, 'pmax': 460}
+    reordered = dict(reversed(list(plant.items())))
+    assert fleet_key(fuels, [plant]) == fleet_key(dict(reversed(list(fuels.items()))), [reordered])
+    assert fleet_key(fuels, [plant]) != fleet_key(fuels, [dict(plant, pmax=461)])
+    assert fleet_key(fuels, [plant]) != fleet_key(fuels, [dict(plant, extra=1)])
+
+
+def test_shared_cache(tmp_path):
+    now = [0.0]
+    path = str(tmp_path / 'results.db')
+    cache = SharedCache(path, maxsize=3, ttl=10, clock=lambda: now[0])
+    other = SharedCache(path, maxsize=3, ttl=10, clock=lambda: now[0])
+    cache.put('a', b'1')
+    assert other.get('a') == b'1'
+    assert other.get('b') is None
+
+    # the oldest entries are evicted, also when they are read
+    for key in 'bcd':
+        other.put(key, key.encode())
+    assert len(cache) == 3
+    assert cache.get('a') is None
+    assert cache.get('d') == b'd'
+
+    # put again makes an entry young
+    cache.put('b', b'B')
+    cache.put('e', b'e')
+    assert cache.get('b') == b'B'
+    assert cache.get('c') is None
+
+    now[0] = 10
+    assert cache.get('b') is None
+
+
+def test_shared_cache_from_env(tmp_path, monkeypatch):
+    assert SharedCache.from_env('PCC_TEST_CACHE') is None
+    monkeypatch.setenv('PCC_TEST_CACHE_PATH', str(tmp_path / 'test.db'))
+    monkeypatch.setenv('PCC_TEST_CACHE_TTL', '5')
+    cache = SharedCache.from_env('PCC_TEST_CACHE', maxsize=10)
+    assert (cache.maxsize, cache.ttl) == (10, 5)
+    monkeypatch.setenv('PCC_TEST_CACHE_SIZE', '0')
+    assert SharedCache.from_env('PCC_TEST_CACHE') is None
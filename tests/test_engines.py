@@ -0,0 +1,70 @@
+import math
+
+import pytest
+
+from pcc import engines
+from pcc.engines import BINDING_PMIN, MERIT_ORDER, NO_PMIN, classify, distribute_load, select
+from pcc.util import Fleet
+
+
+FUELS = {'gas(euro/MWh)': 13.4, 'kerosine(euro/MWh)': 50.8, 'co2(euro/ton)': 20, 'wind(%)': 60}
+
+# the merit order fill gives p2 20 MW, below its pmin, and the naive engine finds no plan at all
+BINDING = {
+    'load': 120,
+    'fuels': FUELS,
+    'powerplants': [
+        {'name': 'p0', 'type': 'gasfired', 'efficiency': 0.3, 'pmin': 25, 'pmax': 50},
+        {'name': 'p1', 'type': 'gasfired', 'efficiency': 0.4, 'pmin': 0, 'pmax': 50},
+        {'name': 'p2', 'type': 'gasfired', 'efficiency': 0.3, 'pmin': 75, 'pmax': 100},
+    ],
+}
+
+
+def fleet_of(config, **changes):
+    return Fleet.from_powerplants([dict(d, **changes) for d in config['powerplants']], config['fuels'])
+
+
+def test_classify():
+    fleet = fleet_of(BINDING)
+    assert classify(120, fleet) == BINDING_PMIN
+    assert classify(180, fleet) == MERIT_ORDER
+    assert classify(1000, fleet) == MERIT_ORDER
+    assert classify(120, fleet_of(BINDING, pmin=0)) == NO_PMIN
+
+
+def test_select():
+    fleet = fleet_of(BINDING)
+    selection = select(120, fleet)
+    assert (selection.engine.name, selection.kind, selection.reason) == ('bnb', BINDING_PMIN, 'auto')
+    assert select(180, fleet).engine.name == 'naive'
+    assert select(120, fleet_of(BINDING, pmin=0)).engine.name == 'naive'
+    # bigger fleets do not change the ranking
+    for engine in engines.ENGINES.values():
+        assert engine.expected_time(10**5) >= engines.ENGINES['naive'].expected_time(10**5)
+    assert select(120, fleet, 'bounded').reason == 'request'
+    with pytest.raises(ValueError, match='engine: must be one of auto, naive, bnb'):
+        select(120, fleet, 'fastest')
+    with pytest.raises(ValueError):
+        select(120, fleet, ['naive'])
+
+
+def test_select_env(monkeypatch):
+    monkeypatch.setattr(engines, 'ENGINE', 'bounded')
+    selection = select(120, fleet_of(BINDING))
+    assert (selection.engine.name, selection.reason) == ('bounded', 'env')
+    assert select(120, fleet_of(BINDING), 'auto').engine.name == 'bnb'
+
+
+def test_distribute_load():
+    plan = distribute_load(BINDING)
+    assert math.isclose(sum(d['p'] for d in plan), 120)
+    assert [d['p'] for d in plan] == [0.0, 45.0, 75.0]
+    with pytest.raises(Exception, match='Unable to distribute load'):
+        distribute_load(dict(BINDING, engine='naive'))
+    # without pmin every engine runs the cheapest plant p1 at pmax, p0 and p2 cost the same
+    powerplants = [dict(d, pmin=0) for d in BINDING['powerplants']]
+    for name in engines.ENGINES:
+        plan = distribute_load(dict(BINDING, powerplants=powerplants, engine=name))
+        assert plan[1]['p'] == 50.0
+        assert math.isclose(sum(d['p'] for d in plan), 120)
@@ -0,0 +1,67 @@
+import math
+import random
+
+from pcc import bounded, naive
+from pcc.util import Fleet, Plant
+
+
+FUELS = {
+    "gas(euro/MWh)": 13.4,
+    "kerosine(euro/MWh)": 50.8,
+    "co2(euro/ton)": 20,
+    "wind(%)": 60
+}
+
+
+def random_powerplants(rng, n):
+    powerplants = []
+    for i in range(n):
+        type_ = rng.choice(('gasfired', 'turbojet', 'windturbine'))
+        pmax = rng.choice((16, 36, 50, 150, 460))
+        powerplants.append({'name': f'p{i}', 'type': type_, 'efficiency': rng.choice((0, 0.3, 0.37, 0.53, 1)),
+                            'pmin': 0 if type_ != 'gasfired' else rng.choice((0, pmax / 4)), 'pmax': pmax})
+    return powerplants
+
+
+def test_same_as_plants():
+    powerplants = random_powerplants(random.Random(1), 100)
+    fleet = Fleet.from_powerplants(powerplants, FUELS)
+    plants = {d['name']: Plant(**d, fuels=FUELS) for d in powerplants}
+    assert len(fleet) == len(plants)
+    assert fleet.plants() == plants
+    merit_order = naive.prepare_input({'load': 0, 'fuels': FUELS, 'powerplants': powerplants})[2]
+    assert [fleet.names[k] for k in fleet.merit_order()] == merit_order
+
+
+def test_missing_fuels_and_duplicate_names():
+    powerplants = random_powerplants(random.Random(3), 10)
+    powerplants = [d for d in powerplants if d['type'] != 'turbojet']
+    powerplants.append({**powerplants[0], 'pmax': 123})
+    fuels = {key: value for key, value in FUELS.items() if key != 'kerosine(euro/MWh)'}
+    fleet = Fleet.from_powerplants(powerplants, fuels)
+    assert fleet.plants() == {d['name']: Plant(**d, fuels=fuels) for d in powerplants}
+
+
+def test_allocate_fleet():
+    rng = random.Random(2)
+    for _ in range(20):
+        powerplants = random_powerplants(rng, rng.randrange(2, 30))
+        config = {'load': 0, 'fuels': FUELS, 'powerplants': powerplants}
+        _, plants, merit_order = naive.prepare_input(config)
+        _, fleet, order = naive.prepare_fleet(config)
+        load = rng.uniform(0, sum(fleet.pmax))
+        expected = {name: 0.0 for name in plants}
+        allocated = naive.allocate_load(load, expected, plants, merit_order)
+        load_plan = [0.0] * len(fleet)
+        assert naive.allocate_fleet(load, load_plan, fleet, order) == allocated
+        assert load_plan == list(expected.values())
+
+
+def test_bounded_allocate_fleet():
+    rng = random.Random(3)
+    powerplants = random_powerplants(rng, 50)
+    fleet = Fleet.from_powerplants(powerplants, FUELS)
+    load = (sum(fleet.pmin) + sum(fleet.pmax)) / 2
+    expected = bounded.allocate_load(load, fleet.plants())
+    load_plan = bounded.allocate_fleet(load, fleet)
+    assert all(math.isclose(p, q, abs_tol=1e-9) for p, q in zip(load_plan, expected.values()))
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from pcc import loadtest
+
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+@pytest.fixture(scope='module')
+def requests():
+    return loadtest.make_requests(os.path.join(ROOT, 'doc', 'example_payloads'), synthetic=[50], batch=True)
+
+
+def test_make_requests(requests):
+    paths = [path for path, body in requests]
+    assert paths == ['/productionplan'] * 6 + ['/productionplan/batch'] * 6
+
+
+def test_percentile():
+    ordered = list(range(1, 101))
+    assert loadtest.percentile(ordered, 50) == 50
+    assert loadtest.percentile(ordered, 99) == 99
+    assert loadtest.percentile(ordered, 100) == 100
+    assert loadtest.percentile([7], 95) == 7
+    assert loadtest.percentile([], 50) is None
+
+
+@pytest.mark.parametrize('rate', [None, 50])
+def test_run(requests, rate):
+    records = list(loadtest.run(requests, workers=[1], concurrency=2, duration=0.5, rate=rate,
+                                config=os.path.join(ROOT, 'gunicorn_conf.py'), env={'PCC_SOLVER_PROCESSES': '0'}))
+    assert [r['endpoint'] for r in records] == ['/productionplan', '/productionplan/batch']
+    for r in records:
+        assert r['workers'] == 1
+        assert r['worker_class'] == 'sync'
+        assert r['requests'] > 0
+        assert r['p50'] <= r['p95'] <= r['p99']
+        assert r['error_rate'] == 0
+        assert r['statuses'] == {'200': r['requests']}
+    assert 'p99 ms' in loadtest.format_table(records)
+
+
+def test_worker_ready():
+    port = loadtest.free_port()
+    process = loadtest.start_server(port, 1, config=os.path.join(ROOT, 'gunicorn_conf.py'),
+                                    env={'PCC_SOLVER_PROCESSES': '0'})
+    try:
+        status, body = asyncio.run(loadtest.Connection('127.0.0.1', port).request('GET', '/metrics'))
+    finally:
+        loadtest.stop_server(process)
+    assert status == 200
+    # the worker is warmed up, and counted, before it answers
+    assert b'\npcc_worker_ready_seconds_count 1.0\n' in body
+
+
+def test_admission_under_shipped_config():
+    # the workers of gunicorn_conf.py take several requests at once, so the admission control sheds the solves
+    # over its limit instead of each worker serving one request at a time
+    from pcc.benchmark import capacity, generate_fleet
+    config = generate_fleet(300, 0)
+    # a solve of about 0.1 s, so that all four requests arrive while the first is in flight
+    bodies = [json.dumps({**config, 'loads': [capacity(config) * (0.2 + 0.6 * i / 2000) + j for i in range(2000)]})
+              .encode() for j in range(4)]
+    port = loadtest.free_port()
+    process = loadtest.start_server(port, 1, config=os.path.join(ROOT, 'gunicorn_conf.py'),
+                                    env={'PCC_SOLVER_PROCESSES': '0', 'PCC_WARMUP': '0', 'PCC_ADMISSION_LIMIT': '1',
+                                         'PCC_ADMISSION_MAX_LIMIT': '1'})
+
+    async def post_all():
+        return await asyncio.gather(*(loadtest.Connection('127.0.0.1', port).request(
+            'POST', '/productionplan/batch', body) for body in bodies))
+
+    try:
+        responses = asyncio.run(post_all())
+    finally:
+        loadtest.stop_server(process)
+    statuses = sorted(status for status, body in responses)
+    assert statuses[0] == 200
+    assert statuses[-1] == 503
+    assert all(json.loads(body)['reason'].startswith('overloaded') for status, body in responses if status == 503)
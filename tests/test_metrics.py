@@ -0,0 +1,132 @@
+import asyncio
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from pcc import metrics
+from pcc.webapp import create_app
+from pcc.webapp.asgi import app
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads')
+
+
+def load_payload(name):
+    with open(os.path.join(PAYLOADS, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('PCC_METRICS_DIR', str(tmp_path))
+    metrics._reset()
+    yield tmp_path
+    monkeypatch.delenv('PCC_METRICS_DIR')
+    metrics._reset()
+
+
+def samples(text):
+    result = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            result[name] = float(value)
+    return result
+
+
+def observe_in_child():
+    metrics.errors.labels(504).inc()
+    metrics.solve_duration.labels('naive').observe(2)
+
+
+def test_aggregated_over_processes(metrics_dir):
+    metrics.errors.labels(504).inc(2)
+    metrics.solve_duration.labels('naive').observe(0.003)
+    process = multiprocessing.get_context('spawn').Process(target=observe_in_child)
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert len(list(metrics_dir.glob('*.db'))) == 2
+
+    result = samples(metrics.exposition().decode())
+    assert result['pcc_errors_total{status="504"}'] == 3
+    assert result['pcc_solve_duration_seconds_count{engine="naive"}'] == 2
+    assert result['pcc_solve_duration_seconds_sum{engine="naive"}'] == pytest.approx(2.003)
+    assert result['pcc_solve_duration_seconds_bucket{engine="naive",le="0.0025"}'] == 0
+    assert result['pcc_solve_duration_seconds_bucket{engine="naive",le="0.005"}'] == 1
+    assert result['pcc_solve_duration_seconds_bucket{engine="naive",le="1.0"}'] == 1
+    assert result['pcc_solve_duration_seconds_bucket{engine="naive",le="2.5"}'] == 2
+    assert result['pcc_solve_duration_seconds_bucket{engine="naive",le="+Inf"}'] == 2
+
+
+def test_exposition_format(metrics_dir):
+    metrics.cache_lookups.labels('a"b', 'hit').inc()
+    text = metrics.exposition().decode()
+    assert '# TYPE pcc_cache_lookups_total counter\n' in text
+    assert '# TYPE pcc_request_duration_seconds histogram\n' in text
+    assert 'pcc_cache_lookups_total{cache="a\\"b",result="hit"} 1.0\n' in text
+
+
+def test_flask(metrics_dir):
+    client = create_app().test_client()
+    assert client.post('/productionplan', json=load_payload('payload1.json')).status_code == 200
+    assert client.post('/productionplan', json={'load': 10}).status_code == 400
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    result = samples(response.get_data(as_text=True))
+    assert result['pcc_request_duration_seconds_count{endpoint="/productionplan"}'] == 2
+    assert result['pcc_request_size_bytes_count{endpoint="/productionplan"}'] == 2
+    assert result['pcc_solve_duration_seconds_count{engine="naive"}'] == 1
+    assert result['pcc_fleet_plants_bucket{le="10.0"}'] == 1
+    assert result['pcc_errors_total{status="400"}'] == 1
+
+
+def test_asgi(metrics_dir):
+    def request(method, path, body=b''):
+        messages = [{'type': 'http.request', 'body': body}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'headers': [(b'content-type', b'application/json')]}
+        asyncio.run(app(scope, receive, send))
+        return sent
+
+    request('POST', '/productionplan', json.dumps(load_payload('payload2.json')).encode())
+    request('GET', '/nowhere')
+    start, body = request('GET', '/metrics')
+    assert dict(start['headers'])[b'content-type'] == metrics.CONTENT_TYPE.encode()
+    result = samples(body['body'].decode())
+    assert result['pcc_request_duration_seconds_count{endpoint="/productionplan"}'] == 1
+    assert result['pcc_errors_total{status="404"}'] == 1
+
+
+def test_simplex_pivots(metrics_dir):
+    from pcc import bounded
+    bounded.distribute_load(load_payload('payload1.json'))
+    result = samples(metrics.exposition().decode())
+    assert result['pcc_simplex_pivots_count{engine="bounded"}'] == 1
+
+
+def test_mark_process_dead(metrics_dir):
+    metrics.errors.labels(504).inc()
+    for _ in range(3):
+        process = multiprocessing.get_context('spawn').Process(target=observe_in_child)
+        process.start()
+        process.join()
+        assert metrics.mark_process_dead(process.pid) == 1
+    assert metrics.mark_process_dead(process.pid) == 0
+    assert len(list(metrics_dir.glob('*.db'))) == 1
+    assert (metrics_dir / metrics.ARCHIVE).exists()
+
+    result = samples(metrics.exposition().decode())
+    assert result['pcc_errors_total{status="504"}'] == 4
+    assert result['pcc_solve_duration_seconds_count{engine="naive"}'] == 3
+    assert result['pcc_solve_duration_seconds_bucket{engine="naive",le="2.5"}'] == 3
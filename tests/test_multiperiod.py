@@ -0,0 +1,113 @@
+import math
+
+import pytest
+
+from pcc import bounded, multiperiod
+from pcc.benchmark import capacity, generate_fleet
+from pcc.naive import prepare_fleet
+from pcc.trace import SolveStats
+
+
+def make_config(rampup=None, rampdown=None):
+    powerplants = [
+        {'name': 'gasfiredbig1', 'type': 'gasfired', 'efficiency': 0.53, 'pmin': 100, 'pmax': 460},
+        {'name': 'gasfiredsomewhatsmaller', 'type': 'gasfired', 'efficiency': 0.37, 'pmin': 40, 'pmax': 210},
+        {'name': 'tj1', 'type': 'turbojet', 'efficiency': 0.3, 'pmin': 0, 'pmax': 160},
+        {'name': 'windpark1', 'type': 'windturbine', 'efficiency': 1, 'pmin': 0, 'pmax': 150},
+    ]
+    if rampup is not None:
+        powerplants[0]['rampup'] = rampup
+    if rampdown is not None:
+        powerplants[0]['rampdown'] = rampdown
+    fuels = {'gas(euro/MWh)': 13.4, 'kerosine(euro/MWh)': 50.8, 'co2(euro/ton)': 20, 'wind(%)': 60}
+    return {'fuels': fuels, 'powerplants': powerplants}
+
+
+def cost(config, plans, periods):
+    total = 0.0
+    for plan, period in zip(plans, periods):
+        fuels = dict(config['fuels'])
+        if isinstance(period, list):
+            fuels['wind(%)'] = period[1]
+        _, fleet, _ = prepare_fleet({'load': 0, 'fuels': fuels, 'powerplants': config['powerplants']})
+        total += sum(d['p'] * c for d, c in zip(plan, fleet.cost))
+    return total
+
+
+def check_plans(config, plans, periods):
+    assert len(plans) == len(periods)
+    for plan, period in zip(plans, periods):
+        load = period[0] if isinstance(period, list) else period
+        assert math.isclose(sum(d['p'] for d in plan), load)
+        for d, plant in zip(plan, config['powerplants']):
+            assert d['name'] == plant['name']
+            assert d['p'] >= plant['pmin'] - 1e-6
+    for before, after in zip(plans, plans[1:]):
+        for d, e, plant in zip(before, after, config['powerplants']):
+            assert e['p'] - d['p'] <= plant.get('rampup', math.inf) + 1e-6
+            assert d['p'] - e['p'] <= plant.get('rampdown', math.inf) + 1e-6
+
+
+def test_without_ramps_is_per_period():
+    config = make_config()
+    periods = [480, [800, 20], 300, [600, 100]]
+    plans = multiperiod.distribute_loads(config, periods)
+    check_plans(config, plans, periods)
+    expected = []
+    for period in periods:
+        load, wind = period if isinstance(period, list) else (period, 60)
+        fuels = dict(config['fuels'], **{'wind(%)': wind})
+        _, fleet, _ = prepare_fleet({'load': load, 'fuels': fuels, 'powerplants': config['powerplants']})
+        load_plan = bounded.allocate_fleet(load, fleet)
+        expected.append([{'name': name, 'p': p} for name, p in zip(fleet.names, load_plan)])
+    assert math.isclose(cost(config, plans, periods), cost(config, expected, periods))
+
+
+def test_ramp_limits():
+    periods = [300, 700, 700, 300]
+    free = multiperiod.distribute_loads(make_config(), periods)
+    assert [plan[0]['p'] for plan in free] == [170, 460, 460, 170]
+    config = make_config(rampup=150, rampdown=100)
+    stats = SolveStats()
+    plans = multiperiod.distribute_loads(config, periods, stats=stats)
+    check_plans(config, plans, periods)
+    # down by at most 100 to 260 in the last period, and up by at most 150 from at most 260 in the first
+    assert [plan[0]['p'] for plan in plans] == pytest.approx([250, 400, 360, 260])
+    assert cost(config, plans, periods) > cost(config, free, periods)
+    assert stats.pivots > 0
+
+
+def test_infeasible():
+    with pytest.raises(Exception, match='No initial feasible solution found'):
+        multiperiod.distribute_loads(make_config(rampup=10), [300, 950])
+
+
+@pytest.mark.parametrize('size, periods', [(20, 12), (40, 16)])
+def test_synthetic(size, periods):
+    config = generate_fleet(size, seed=5)
+    for d in config['powerplants']:
+        if d['type'] != 'windturbine':
+            d['pmin'] = 0
+            d['rampup'] = d['rampdown'] = round(0.2 * d['pmax'])
+    top = capacity(config)
+    loads = [[round(top * (0.5 + 0.2 * math.sin(t / 3)), 1), 50 + 10 * math.cos(t / 4)] for t in range(periods)]
+    plans = multiperiod.distribute_loads(config, loads)
+    check_plans(config, plans, loads)
+    # the same LP from scratch, without the initial basis, the start at pmax and the vectorized pricing
+    captured = {}
+
+    class Capture(multiperiod.HorizonSimplex):
+        def __init__(self, *args, **kwargs):
+            captured['args'] = [list(a) for a in args]
+            super().__init__(*args, **kwargs)
+            captured['objective'] = lambda: self.objective
+
+    original = multiperiod.HorizonSimplex
+    multiperiod.HorizonSimplex = Capture
+    try:
+        multiperiod.distribute_loads(config, loads)
+    finally:
+        multiperiod.HorizonSimplex = original
+    lp = bounded.RevisedSimplex(*captured['args'])
+    lp.solve()
+    assert math.isclose(lp.objective, captured['objective']())
@@ -1,4 +1,10 @@
-from pcc.naive import distribute_load
+import copy
+import json
+import math
+import os
+
+from pcc import naive
+from pcc.naive import distribute_load, prepare_input, Session
 
 
 def test_payload1():
@@ -330,3 +336,89 @@ def test_payload5():
         pass
     else:
         assert False, 'No exception raised'
+
+
+def test_session():
+    config = {
+        "load": 480,
+        "fuels":
+        {
+            "gas(euro/MWh)": 13.4,
+            "kerosine(euro/MWh)": 50.8,
+            "co2(euro/ton)": 20,
+            "wind(%)": 60
+        },
+        "powerplants": [
+            {
+            "name": "gasfiredbig1",
+            "type": "gasfired",
+            "efficiency": 0.53,
+            "pmin": 100,
+            "pmax": 460
+            },
+            {
+            "name": "gasfiredbig2",
+            "type": "gasfired",
+            "efficiency": 0.53,
+            "pmin": 100,
+            "pmax": 460
+            },
+            {
+            "name": "gasfiredsomewhatsmaller",
+            "type": "gasfired",
+            "efficiency": 0.37,
+            "pmin": 40,
+            "pmax": 210
+            },
+            {
+            "name": "tj1",
+            "type": "turbojet",
+            "efficiency": 0.3,
+            "pmin": 0,
+            "pmax": 16
+            },
+            {
+            "name": "windpark1",
+            "type": "windturbine",
+            "efficiency": 1,
+            "pmin": 0,
+            "pmax": 150
+            },
+            {
+            "name": "windpark2",
+            "type": "windturbine",
+            "efficiency": 1,
+            "pmin": 0,
+            "pmax": 36
+            }
+        ]
+    }
+    session = Session(*prepare_input(config))
+    for load in (480, 500, 910, 600, 50, 1100, 560.4):
+        config = copy.deepcopy(config)
+        config['load'] = load
+        expected = distribute_load(config)
+        result = session.resolve(load)
+        assert [d['name'] for d in result] == [d['name'] for d in expected]
+        assert all(math.isclose(a['p'], b['p']) for a, b in zip(result, expected))
+
+
+def test_distribute_loads(monkeypatch):
+    with open(os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads', 'payload3.json')) as f:
+        config = json.load(f)
+    resolves = []
+    resolve = Session.resolve
+
+    def counting_resolve(self, load):
+        resolves.append(load)
+        return resolve(self, load)
+
+    monkeypatch.setattr(Session, 'resolve', counting_resolve)
+    periods = [480, [910, 0], 600, [480, 0]]
+    plans = naive.distribute_loads(config, periods)
+    # one solve per period: a new session solves its first load itself
+    assert len(resolves) == len(periods)
+    for period, plan in zip(periods, plans):
+        load, wind = period if isinstance(period, list) else (period, config['fuels']['wind(%)'])
+        expected = distribute_load(dict(config, load=load, fuels=dict(config['fuels'], **{'wind(%)': wind})))
+        assert all(math.isclose(a['p'], b['p']) for a, b in zip(plan, expected))
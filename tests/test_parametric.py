@@ -0,0 +1,130 @@
+import math
+import random
+
+import pytest
+
+from pcc import naive
+from pcc.parametric import DispatchCurve, distribute_load
+from pcc.naive import prepare_input
+
+
+def make_config(load, wind):
+    return {
+        "load": load,
+        "fuels":
+        {
+            "gas(euro/MWh)": 13.4,
+            "kerosine(euro/MWh)": 50.8,
+            "co2(euro/ton)": 20,
+            "wind(%)": wind
+        },
+        "powerplants": [
+            {
+            "name": "gasfiredbig1",
+            "type": "gasfired",
+            "efficiency": 0.53,
+            "pmin": 100,
+            "pmax": 460
+            },
+            {
+            "name": "gasfiredbig2",
+            "type": "gasfired",
+            "efficiency": 0.53,
+            "pmin": 100,
+            "pmax": 460
+            },
+            {
+            "name": "gasfiredsomewhatsmaller",
+            "type": "gasfired",
+            "efficiency": 0.37,
+            "pmin": 40,
+            "pmax": 210
+            },
+            {
+            "name": "tj1",
+            "type": "turbojet",
+            "efficiency": 0.3,
+            "pmin": 0,
+            "pmax": 16
+            },
+            {
+            "name": "windpark1",
+            "type": "windturbine",
+            "efficiency": 1,
+            "pmin": 0,
+            "pmax": 150
+            },
+            {
+            "name": "windpark2",
+            "type": "windturbine",
+            "efficiency": 1,
+            "pmin": 0,
+            "pmax": 36
+            }
+        ]
+    }
+
+
+def assert_same_plan(result, expected):
+    assert [d['name'] for d in result] == [d['name'] for d in expected]
+    assert all(math.isclose(a['p'], b['p'], abs_tol=1e-9) for a, b in zip(result, expected))
+
+
+def assert_same_as_naive(config, loads):
+    curve = DispatchCurve(*prepare_input(config)[1:])
+    for load in loads:
+        config = dict(config, load=load)
+        try:
+            expected = naive.distribute_load(config)
+        except Exception:
+            with pytest.raises(Exception):
+                curve.dispatch(load)
+        else:
+            assert_same_plan(curve.dispatch(load), expected)
+
+
+@pytest.mark.parametrize('load, wind', [(480, 60), (480, 0), (910, 60)])
+def test_payloads(load, wind):
+    assert distribute_load(make_config(load, wind)) == naive.distribute_load(make_config(load, wind))
+
+
+@pytest.mark.parametrize('load', [20, 1200])
+def test_infeasible(load):
+    with pytest.raises(Exception):
+        distribute_load(make_config(load, 0))
+
+
+def test_breakpoints():
+    config = make_config(0, 60)
+    curve = DispatchCurve(*prepare_input(config)[1:])
+    loads = curve.breakpoints + [(s.lo + s.hi) / 2 for s in curve.segments]
+    loads += [x + d for x in curve.breakpoints for d in (-1e-3, 1e-3)]
+    assert_same_as_naive(config, loads)
+
+
+def test_cost():
+    config = make_config(0, 60)
+    _, plants, merit_order = prepare_input(config)
+    curve = DispatchCurve(plants, merit_order)
+    for load in range(0, 1200, 7):
+        try:
+            plan = naive.distribute_load(dict(config, load=load))
+        except Exception:
+            continue
+        expected = sum(plants[d['name']].cost * d['p'] for d in plan)
+        assert math.isclose(curve.cost(load), expected)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_fleets(seed):
+    rng = random.Random(seed)
+    powerplants = []
+    for i in range(rng.randrange(3, 30)):
+        type_ = rng.choice(('gasfired', 'turbojet', 'windturbine'))
+        pmax = rng.choice((16, 50, 100, 200, 460))
+        powerplants.append({'name': f'p{i}', 'type': type_, 'efficiency': rng.choice((0.3, 0.37, 0.53, 0.6)),
+                            'pmin': 0 if type_ != 'gasfired' else rng.choice((0, pmax / 4, pmax / 2)), 'pmax': pmax})
+    config = make_config(0, rng.choice((0, 25, 60, 100)))
+    config['powerplants'] = powerplants
+    capacity = sum(d['pmax'] for d in powerplants)
+    assert_same_as_naive(config, [rng.uniform(0, capacity * 1.1) for _ in range(200)])
@@ -0,0 +1,138 @@
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from pcc.pool import PoolBusy, PoolClient, SolverPool, SolveTimeout, start_server
+from pcc.webapp import create_app
+from pcc.webapp import api
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads')
+
+
+@pytest.fixture(scope='module')
+def solver_pool():
+    solver_pool = SolverPool(2, timeout=5)
+    yield solver_pool
+    solver_pool.close()
+
+
+def test_solve(solver_pool):
+    assert solver_pool.solve(divmod, 7, 2) == (3, 1)
+
+
+def test_error(solver_pool):
+    with pytest.raises(ZeroDivisionError):
+        solver_pool.solve(divmod, 7, 0)
+
+
+def test_timeout_replaces_solver(solver_pool):
+    pids = {s.process.pid for s in solver_pool._idle.queue}
+    with pytest.raises(SolveTimeout):
+        solver_pool.solve(time.sleep, 30, timeout=0.5)
+    assert len(solver_pool._idle.queue) == 2
+    assert {s.process.pid for s in solver_pool._idle.queue} != pids
+    assert [solver_pool.solve(divmod, 7, 2) for _ in range(4)] == [(3, 1)] * 4
+
+
+def test_busy():
+    solver_pool = SolverPool(1, timeout=5)
+    try:
+        thread = threading.Thread(target=solver_pool.solve, args=(time.sleep, 1))
+        thread.start()
+        time.sleep(0.1)
+        with pytest.raises(PoolBusy):
+            solver_pool.solve(divmod, 7, 2, timeout=0.2)
+        thread.join()
+    finally:
+        solver_pool.close()
+
+
+def test_shared_pool(tmp_path):
+    path = str(tmp_path / 'solver.sock')
+    process = start_server(path, size=1, timeout=5)
+    try:
+        client = PoolClient(path)
+        assert client.solve(divmod, 7, 2) == (3, 1)
+        with pytest.raises(SolveTimeout):
+            client.solve(time.sleep, 30, timeout=0.5)
+        assert client.solve(divmod, 9, 2) == (4, 1)
+    finally:
+        process.terminate()
+        process.wait()
+    assert not os.path.exists(path)
+    with pytest.raises(PoolBusy):
+        client.solve(divmod, 7, 2)
+
+
+
+def test_shared_pool_does_not_answer(tmp_path):
+    path = str(tmp_path / 'solver.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        # accepts the connection, and never replies
+        server.bind(path)
+        server.listen()
+        client = PoolClient(path, timeout=0.1)
+        client.grace = 0.1
+        with pytest.raises(SolveTimeout):
+            client.solve(divmod, 7, 2)
+
+
+class FailingPool:
+
+    def __init__(self, error):
+        self.error = error
+
+    def solve(self, function, *args):
+        raise self.error
+
+
+@pytest.mark.parametrize('error, status_code', [(SolveTimeout('late'), 504), (PoolBusy('busy'), 503)])
+def test_api_status(monkeypatch, error, status_code):
+    monkeypatch.setattr(api, 'get_pool', lambda: FailingPool(error))
+    with open(os.path.join(PAYLOADS, 'payload3.json')) as f:
+        payload = json.load(f)
+    response = create_app().test_client().post('/productionplan', json=payload)
+    assert response.status_code == status_code
+    assert response.get_json()['status_code'] == status_code
+    assert response.get_json()['reason'] == str(error)
+
+
+def test_api_scenarios(monkeypatch, solver_pool):
+    with open(os.path.join(PAYLOADS, 'payload3.json')) as f:
+        payload = json.load(f)
+    payload['sampler'] = dict(payload.pop('fuels'), n=1000, seed=1, **{'wind(%)': {'uniform': [0, 100]}})
+    client = create_app().test_client()
+    expected = client.post('/productionplan/scenarios', json=payload).data.decode().splitlines()
+    monkeypatch.setattr(api, 'get_pool', lambda: solver_pool)
+    lines = client.post('/productionplan/scenarios', json=payload).data.decode().splitlines()
+    assert sorted(lines[:-1]) == sorted(expected[:-1])
+    assert json.loads(lines[-1])['summary']['scenarios'] == 1000
+    monkeypatch.setattr(api, 'get_pool', lambda: FailingPool(SolveTimeout('late')))
+    lines = client.post('/productionplan/scenarios', json=payload).data.decode().splitlines()
+    assert json.loads(lines[-1])['status_code'] == 504
+
+
+class Unpicklable(Exception):
+
+    def __init__(self, message, detail):
+        super().__init__(message)
+        self.detail = detail
+
+
+def fail(message):
+    raise Unpicklable(message, 'detail')
+
+
+def test_pickling_errors_keep_the_solvers(solver_pool):
+    with pytest.raises(TypeError):
+        solver_pool.solve(len, threading.Lock())
+    # the solver pickles the exception, but it can not be unpickled: __init__ wants two arguments
+    with pytest.raises(Exception, match='Unable to unpickle the result of fail'):
+        solver_pool.solve(fail, 'boom')
+    assert len(solver_pool._idle.queue) == solver_pool.size
+    assert [solver_pool.solve(divmod, 7, 2) for _ in range(solver_pool.size)] == [(3, 1)] * solver_pool.size
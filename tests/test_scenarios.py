@@ -0,0 +1,142 @@
+import json
+import math
+import os
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from pcc import naive, scenarios
+from pcc.benchmark import capacity, generate_fleet
+from pcc.util import Fleet
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads')
+
+SAMPLER = {
+    'n': 500,
+    'seed': 1,
+    'gas(euro/MWh)': {'normal': [13.4, 2]},
+    'kerosine(euro/MWh)': {'uniform': [40, 60]},
+    'co2(euro/ton)': 20,
+    'wind(%)': {'triangular': [0, 60, 100]},
+}
+
+
+def load_payload(name):
+    with open(os.path.join(PAYLOADS, name)) as f:
+        return json.load(f)
+
+
+def test_sample():
+    prices, loads = scenarios.sample(SAMPLER)
+    assert prices.shape == (500, 4)
+    assert loads is None
+    assert np.array_equal(prices, scenarios.sample(SAMPLER)[0])
+    assert not np.array_equal(prices, scenarios.sample(SAMPLER, seed=2)[0])
+    assert (prices >= 0).all()
+    assert (prices[:, scenarios.FUELS.index('wind(%)')] <= 100).all()
+    assert (prices[:, scenarios.FUELS.index('co2(euro/ton)')] == 20).all()
+    assert len(scenarios.sample(SAMPLER, n=7)[0]) == 7
+
+
+@pytest.mark.parametrize('sampler, reason', [
+    ({**SAMPLER, 'n': 0}, 'sampler.n: must be an integer >= 1, got 0'),
+    ({**SAMPLER, 'n': 10**6}, 'sampler.n: must be <= 1000, got 1000000'),
+    ({**SAMPLER, 'gas(euro/MWh)': {'normal': [13.4]}}, 'sampler.gas(euro/MWh): expected'),
+    ({**SAMPLER, 'gas(euro/MWh)': {'poisson': [3]}}, 'sampler.gas(euro/MWh): expected'),
+    ({**SAMPLER, 'gas(euro/MWh)': 'cheap'}, 'sampler.gas(euro/MWh): must be a number or a distribution'),
+    ({k: v for k, v in SAMPLER.items() if k != 'co2(euro/ton)'}, 'Missing key "sampler.co2(euro/ton)"'),
+])
+def test_sample_invalid(sampler, reason):
+    with pytest.raises(ValueError, match=reason.replace('(', r'\(').replace(')', r'\)')):
+        scenarios.sample(sampler, limit=1000)
+
+
+def test_prepare():
+    payload = load_payload('payload3.json')
+    fuels = payload.pop('fuels')
+    columns, prices, loads = scenarios.prepare(dict(payload, scenarios=[fuels, dict(fuels, load=480)]))
+    assert columns[0] == [d['name'] for d in payload['powerplants']]
+    assert prices.tolist() == [[fuels[key] for key in scenarios.FUELS]] * 2
+    assert loads.tolist() == [910, 480]
+    with pytest.raises(ValueError, match='Missing key "load"'):
+        scenarios.prepare({'powerplants': payload['powerplants'], 'scenarios': [fuels]})
+    with pytest.raises(ValueError, match='Missing key "scenarios" or "sampler"'):
+        scenarios.prepare(payload)
+
+
+def test_derate():
+    config = generate_fleet(300, seed=2)
+    prices, _ = scenarios.sample(SAMPLER, n=50)
+    columns = scenarios.fleet_columns(config['powerplants'])
+    pmin, pmax, cost = scenarios.derate(columns, prices)
+    for i, row in enumerate(prices.tolist()):
+        fleet = Fleet.from_powerplants(config['powerplants'], dict(zip(scenarios.FUELS, row)))
+        assert pmin.tolist() == list(fleet.pmin)
+        assert pmax[i].tolist() == list(fleet.pmax)
+        assert cost[i].tolist() == list(fleet.cost)
+
+
+def test_sweep_matches_naive():
+    config = generate_fleet(100, seed=3)
+    load = round(0.6 * capacity(config), 1)
+    payload = {'load': load, 'powerplants': config['powerplants'], 'sampler': SAMPLER}
+    columns, prices, loads = scenarios.prepare(payload, n=100)
+    results = list(scenarios.sweep(columns, prices, loads, plans=True, chunk_size=16))
+    assert sorted(r['scenario'] for r in results) == list(range(100))
+    for result in results:
+        config = {'load': load, 'fuels': result['fuels'], 'powerplants': config['powerplants']}
+        try:
+            plan = naive.distribute_load(config)
+        except Exception:
+            assert 'error' in result
+            continue
+        assert result['plan'] == plan
+
+
+def test_sweep_submit():
+    payload = load_payload('payload3.json')
+    del payload['fuels']
+    columns, prices, loads = scenarios.prepare(dict(payload, sampler=SAMPLER), n=100)
+    submitted = []
+
+    def submit(function, *args):
+        submitted.append(args[0])
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+    results = list(scenarios.sweep(columns, prices, loads, chunk_size=30, submit=submit, window=2))
+    assert submitted == [0, 30, 60, 90]
+    results.sort(key=lambda r: r['scenario'])
+    assert results == list(scenarios.sweep(columns, prices, loads, chunk_size=30))
+
+
+def test_summary():
+    summary = scenarios.Summary()
+    for cost in range(1, 101):
+        summary.add({'cost': float(cost)})
+    summary.add({'error': 'Unable to distribute load'})
+    result = summary.to_dict()
+    assert result['scenarios'] == 101
+    assert result['infeasible'] == 1
+    assert result['min'] == 1 and result['max'] == 100
+    assert math.isclose(result['mean'], 50.5)
+    assert math.isclose(result['p50'], 50.5)
+    assert scenarios.Summary().to_dict() == {'scenarios': 0, 'infeasible': 0}
+
+
+def test_main(tmp_path, capsys):
+    payload = load_payload('payload3.json')
+    del payload['fuels']
+    path = tmp_path / 'sweep.json'
+    path.write_text(json.dumps(dict(payload, sampler=SAMPLER)))
+    scenarios.main([str(path), '--samples', '40', '--processes', '0', '--chunk-size', '16'])
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(lines) == 41
+    assert lines[-1]['summary']['scenarios'] == 40
+    scenarios.main([str(path), '--samples', '40', '--processes', '2', '--summary'])
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(lines) == 1
+    assert lines[0]['summary']['scenarios'] == 40
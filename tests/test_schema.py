@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+from pcc.naive import prepare_fleet
+from pcc.webapp import create_app
+from pcc.webapp.exceptions import APIError
+from pcc.webapp.schema import parse_payload
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads')
+
+
+def load_payload(name):
+    with open(os.path.join(PAYLOADS, name)) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('name', ['payload1.json', 'payload2.json', 'payload3.json'])
+def test_same_fleet(name):
+    payload = load_payload(name)
+    load, fleet = parse_payload(payload)
+    _, expected, _ = prepare_fleet(payload)
+    assert load == payload['load']
+    for column in ('names', 'types', 'efficiency', 'pmin', 'pmax', 'cost'):
+        assert getattr(fleet, column) == getattr(expected, column)
+
+
+def change(path, value):
+    payload = load_payload('payload3.json')
+    target = payload
+    for key in path[:-1]:
+        target = target[key]
+    if value is KeyError:
+        del target[path[-1]]
+    else:
+        target[path[-1]] = value
+    return payload
+
+
+@pytest.mark.parametrize('payload, reason', [
+    ([], 'payload: must be an object, got []'),
+    (change(['load'], KeyError), 'Missing key "load"'),
+    (change(['load'], '910'), "load: must be a number >= 0, got '910'"),
+    (change(['load'], True), 'load: must be a number >= 0, got True'),
+    (change(['fuels', 'wind(%)'], 120), 'fuels.wind(%): must be <= 100, got 120'),
+    (change(['fuels', 'gas(euro/MWh)'], KeyError), 'Missing key "fuels.gas(euro/MWh)"'),
+    (change(['powerplants'], {}), 'powerplants: must be a list, got {}'),
+    (change(['powerplants', 1, 'pmax'], KeyError), 'Missing key "powerplants[1].pmax"'),
+    (change(['powerplants', 1, 'colour'], 'red'), 'Unknown key "powerplants[1].colour"'),
+    (change(['powerplants', 1, 'name'], 'gasfiredbig1'), "powerplants[1].name: must be unique, got 'gasfiredbig1'"),
+    (change(['powerplants', 2, 'type'], 'nuclear'),
+     "powerplants[2].type: must be one of gasfired, turbojet, windturbine, got 'nuclear'"),
+    (change(['powerplants', 2, 'type'], ['x']),
+     "powerplants[2].type: must be one of gasfired, turbojet, windturbine, got ['x']"),
+    (change(['powerplants', 2, 'type'], {'x': 1}),
+     "powerplants[2].type: must be one of gasfired, turbojet, windturbine, got {'x': 1}"),
+    (change(['powerplants', 3, 'efficiency'], 0), 'powerplants[3].efficiency: must be a number > 0, got 0'),
+    (change(['powerplants', 0, 'pmin'], -1), 'powerplants[0].pmin: must be a number >= 0, got -1'),
+    (change(['powerplants', 0, 'pmin'], 500), 'powerplants[0].pmin: must be <= pmax (460), got 500'),
+    (change(['powerplants', 0, 'pmax'], None), 'powerplants[0].pmax: must be a number >= 0, got None'),
+])
+def test_invalid(payload, reason):
+    with pytest.raises(APIError) as excinfo:
+        parse_payload(payload)
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.to_dict()['reason'] == reason
+
+
+def test_api_rejects_invalid_plant():
+    response = create_app().test_client().post('/productionplan', json=change(['powerplants', 0, 'pmin'], 500))
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == 'powerplants[0].pmin: must be <= pmax (460), got 500'
+    response = create_app().test_client().post('/productionplan', json=change(['powerplants', 0, 'type'], ['x']))
+    assert response.status_code == 400
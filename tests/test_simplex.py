@@ -1,4 +1,12 @@
-from pcc.simplex import simplex, prepare_input
+import random
+
+import pytest
+
+from pcc import trace
+from pcc.simplex import (PRICING_RULES, IterationLimit, Tableau, allocate_load, pivot, simplex,
+                         prepare_input)
+from pcc.trace import SolveStats, TableauRecorder
+from pcc.util import Plant
 
 
 def test1():
@@ -38,8 +46,8 @@ def test2():
          [1, 1],
          [2, 5]]
     b = [11, 27, 90]
-    expected = {'x_1': 14.999999999999998, 'x_2': 12.0,
-                's_1': 13.999999999999998, 's_2': 0.0, 's_3': 0.0,
+    expected = {'x_1': 15.0, 'x_2': 12.0,
+                's_1': 14.0, 's_2': 0.0, 's_3': 0.0,
                 'z': 132}
     solution = simplex(c, A, b, minimize=False)
     print(solution)
@@ -230,3 +238,109 @@ def test_payload1():
     solution = simplex(c, constraints, b)
     print(solution)
     assert solution == expected
+
+
+def test_stats():
+    c = [4, 2, 1]
+    A = [[2, 3, 4],
+         [3, 1, 5],
+         [1, 4, 3]]
+    b = [14, -4, -6]
+    stats = SolveStats()
+    simplex(c, A, b, stats=stats)
+    assert stats.phase1_iterations > 0
+    assert stats.pivots == stats.phase1_iterations + stats.phase2_iterations
+    assert stats.phase1_time > 0 and stats.phase2_time > 0
+
+
+def test_trace():
+    c = [1, 1, -4]
+    A = [[ 1, 1,  2],
+         [ 1, 1, -1],
+         [-1, 1,  1]]
+    b = [9, 2, 4]
+    stats = SolveStats()
+    with TableauRecorder() as recorder:
+        simplex(c, A, b, stats=stats)
+    assert not trace.subscribers
+    assert len(recorder.tableaus) == stats.pivots + 1
+    phase, iteration, T, B = recorder.tableaus[-1]
+    assert T[-1][-1] == -17.0
+
+
+def test_sparse_rows():
+    """Sparse rows give the same solution as dense rows, and the tableau only stores the nonzeros."""
+    c = [4, 2, 1]
+    A = [[2, 3, 4],
+         [3, 1, 0],
+         [0, 4, 3]]
+    b = [14, -4, -6]
+    sparse = [{j: e for j, e in enumerate(row) if e} for row in A]
+    assert simplex(c, sparse, b) == simplex(c, A, b)
+
+    n = 2000
+    plants = {f'p{i}': Plant(name=f'p{i}', type='gasfired', efficiency=0.5, pmin=10, pmax=100, cost=i + 1.0)
+              for i in range(n)}
+    load_plan = allocate_load(0, plants)
+    assert all(p == 10 for p in load_plan.values())
+
+
+def test_tableau():
+    T = Tableau([{0: 1, 2: 5}, {1: 2}, {0: -1}], 3)
+    assert T.columns == [{0, 2}, {1}, {0}]
+    assert T.to_lists() == [[1, 0, 5], [0, 2, 0], [-1, 0, 0]]
+    pivot(T, [0, 1], 0, 0)
+    assert T.to_lists() == [[1.0, 0, 5.0], [0, 2, 0], [0, 0, 5.0]]
+    assert T.columns[0] == {0}
+
+
+# Beale's example: Dantzig's rule with the first row on ties cycles on it
+BEALE = ([-0.75, 20, -0.5, 6], [[0.25, -8, -1, 9], [0.5, -12, -0.5, 3], [0, 0, 1, 0]], [0, 0, 1])
+
+
+@pytest.mark.parametrize('pricing', PRICING_RULES)
+def test_pricing(pricing):
+    rng = random.Random(3)
+    for _ in range(10):
+        n = rng.randrange(2, 12)
+        c = [-rng.randrange(1, 20) for _ in range(n)]
+        A = [[rng.randrange(0, 10) for _ in range(n)] for _ in range(rng.randrange(2, 12))]
+        b = [rng.randrange(10, 100) for _ in A]
+        expected = simplex(c, A, b, pricing='dantzig')
+        assert simplex(c, A, b, pricing=pricing)['z'] == pytest.approx(expected['z'])
+    assert simplex(*BEALE, pricing=pricing)['z'] == pytest.approx(-1.25)
+
+
+def test_pricing_pivots():
+    rng = random.Random(100)
+    c = [-rng.randint(1, 20) for _ in range(60)]
+    A = [[rng.randint(1, 9) for _ in c] for _ in c]
+    b = [rng.randint(50, 100) for _ in c]
+    pivots = {}
+    for pricing in ('dantzig', 'steepest-edge'):
+        stats = SolveStats()
+        simplex(c, A, b, stats=stats, pricing=pricing)
+        pivots[pricing] = stats.pivots
+    assert pivots['steepest-edge'] < pivots['dantzig']
+
+
+def test_anticycling():
+    with pytest.raises(IterationLimit):
+        simplex(*BEALE, pricing='dantzig', degenerate_limit=0, max_iterations=100)
+    stats = SolveStats()
+    solution = simplex(*BEALE, stats=stats, pricing='dantzig', degenerate_limit=5)
+    assert solution['z'] == pytest.approx(-1.25)
+    assert stats.fallback_pivots > 0
+
+
+def test_iteration_limit():
+    c = [1, 1, -4]
+    A = [[1, 1, 2], [1, 1, -1], [-1, 1, 1]]
+    b = [9, 2, 4]
+    with pytest.raises(IterationLimit):
+        simplex(c, A, b, max_iterations=1)
+    # phase 1 does not turn it into an infeasible problem
+    with pytest.raises(IterationLimit):
+        simplex([4, 2, 1], [[2, 3, 4], [3, 1, 5], [1, 4, 3]], [14, -4, -6], max_iterations=1)
+    with pytest.raises(ValueError):
+        simplex(c, A, b, pricing='fastest')
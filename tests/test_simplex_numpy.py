@@ -0,0 +1,52 @@
+import json
+import math
+import os
+import random
+
+import pytest
+
+from pcc import bounded, simplex as reference
+from pcc.simplex_numpy import distribute_load, simplex
+
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), '..', 'doc', 'example_payloads')
+
+
+PROBLEMS = [
+    # c, A, b, minimize
+    ([1, 1, -4], [[1, 1, 2], [1, 1, -1], [-1, 1, 1]], [9, 2, 4], True),
+    ([4, 6], [[-1, 1], [1, 1], [2, 5]], [11, 27, 90], False),
+    ([2, 5], [[1, 1], [0, 1], [1, 2]], [6, 3, 9], False),
+    ([2, -1, 2], [[2, 1, 0], [1, 2, -2], [0, 1, 2]], [10, 20, 5], False),
+    ([1, -2], [[1, 1], [-1, 1], [0, 1]], [-2, -1, 3], True),
+    ([4, 2, 1], [[2, 3, 4], [3, 1, 5], [1, 4, 3]], [14, -4, -6], True),
+]
+
+
+@pytest.mark.parametrize('c, A, b, minimize', PROBLEMS)
+def test_same_as_reference(c, A, b, minimize):
+    expected = reference.simplex(c, A, b, minimize=minimize, pricing='dantzig')
+    solution = simplex(c, A, b, minimize=minimize)
+    assert solution == expected
+
+
+def test_random_problems():
+    rng = random.Random(7)
+    for _ in range(20):
+        n = rng.randrange(2, 8)
+        m = rng.randrange(2, 8)
+        c = [rng.randrange(-5, 10) for _ in range(n)]
+        A = [[rng.randrange(0, 10) for _ in range(n)] for _ in range(m)]
+        b = [rng.randrange(10, 100) for _ in range(m)]
+        expected = reference.simplex(c, A, b)
+        solution = simplex(c, A, b)
+        assert math.isclose(solution['z'], expected['z'], abs_tol=1e-9)
+
+
+@pytest.mark.parametrize('name', ['payload1.json', 'payload2.json', 'payload3.json'])
+def test_distribute_load(name):
+    with open(os.path.join(PAYLOADS, name)) as f:
+        config = json.load(f)
+    load_plan = distribute_load(config)
+    assert math.isclose(sum(p['p'] for p in load_plan), config['load'])
+    assert load_plan == bounded.distribute_load(config)